@@ -0,0 +1,314 @@
+"""
+And-inverter graph optimizer for LogicGateManager circuits.  The circuit is converted
+into a graph of two-input AND nodes with optionally inverted edges, rewritten and
+balanced there, and mapped back onto the existing gate classes as a new manager.
+
+Literals follow the usual AIG encoding: node * 2, plus 1 when the edge is inverted.
+Node 0 is the constant, so literal 0 is false and literal 1 is true.  Every AND node
+is structurally hashed and run through a set of two-level rewriting rules as it is
+created, and balancing rebuilds each multi-input AND cone as a tree ordered by depth.
+"""
+import collections
+import heapq
+
+from gates.logic_gates import (ANDGate, GND, GatePin, LogicGateManager, LogicGateManagerException,
+                               NANDGate, NORGate, NOTGate, ORGate, Switch, VCC)
+
+AigReport = collections.namedtuple("AigReport", ('nodes_before', 'nodes_after', 'depth_before', 'depth_after',
+                                                 'gates_before', 'gates_after', 'levels_before', 'levels_after'))
+
+"""
+Class that stores an and-inverter graph.  Inputs are nodes without fanins and every
+other node is the AND of the two literals in left and right.
+"""
+class Aig:
+    def __init__(self, rewrite : bool = True) -> None:
+        self._rewrite = rewrite
+        self._table = {}
+        self.left = [-1]
+        self.right = [-1]
+        self.level = [0]
+        self.inputs = []
+        self.names = []
+
+    # Adds a named input and returns its literal
+    def add_input(self, name : str) -> int:
+        node = len(self.left)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.level.append(0)
+        self.inputs.append(node)
+        self.names.append(name)
+        return node * 2
+
+    def is_and(self, node : int) -> bool:
+        return self.left[node] >= 0
+
+    # Returns the literal of a AND b, reusing an existing node when there is one
+    def and_(self, a : int, b : int) -> int:
+        if a > b:
+            a, b = b, a
+        if a == 0 or a ^ 1 == b:
+            return 0
+        if a == 1 or a == b:
+            return b
+
+        if self._rewrite:
+            rewritten = self._two_level(a, b)
+            if rewritten is not None:
+                return rewritten
+
+        key = (a, b)
+        if key not in self._table:
+            node = len(self.left)
+            self.left.append(a)
+            self.right.append(b)
+            self.level.append(1 + max(self.level[a >> 1], self.level[b >> 1]))
+            self._table[key] = node * 2
+        return self._table[key]
+
+    def or_(self, a : int, b : int) -> int:
+        return self.and_(a ^ 1, b ^ 1) ^ 1
+
+    def xor_(self, a : int, b : int) -> int:
+        return self.or_(self.and_(a, b ^ 1), self.and_(a ^ 1, b))
+
+    # ANDs any number of literals together as a tree that combines the shallowest literals first
+    def and_many(self, literals : list) -> int:
+        literals = set(literals)
+        if any(literal ^ 1 in literals for literal in literals):
+            return 0
+        if not literals:
+            return 1
+
+        heap = [(self.level[literal >> 1], literal) for literal in literals]
+        heapq.heapify(heap)
+        while len(heap) > 1:
+            _, a = heapq.heappop(heap)
+            _, b = heapq.heappop(heap)
+            literal = self.and_(a, b)
+            heapq.heappush(heap, (self.level[literal >> 1], literal))
+        return heap[0][1]
+
+    # Two-level rules for a AND b where one side is itself an AND node:
+    #   a & (a & x) = a & x        idempotence
+    #   a & (~a & x) = 0           contradiction
+    #   a & ~(~a & x) = a          subsumption
+    #   a & ~(a & x) = a & ~x      substitution
+    #   (a & x) & (~a & y) = 0     contradiction across both sides
+    def _two_level(self, a : int, b : int):
+        for x, y in ((a, b), (b, a)):
+            node = y >> 1
+            if not self.is_and(node):
+                continue
+            fanins = (self.left[node], self.right[node])
+
+            if not y & 1:
+                if x in fanins:
+                    return y
+                if x ^ 1 in fanins:
+                    return 0
+                if not x & 1 and self.is_and(x >> 1):
+                    if any(fanin ^ 1 in fanins for fanin in (self.left[x >> 1], self.right[x >> 1])):
+                        return 0
+            else:
+                if x ^ 1 in fanins:
+                    return x
+                if x in fanins:
+                    other = fanins[1] if fanins[0] == x else fanins[0]
+                    return self.and_(x, other ^ 1)
+        return None
+
+    # Returns the number of AND nodes and the depth of the cones feeding the given literals
+    def measure(self, literals : list) -> tuple:
+        seen = set()
+        stack = [literal >> 1 for literal in literals]
+        while stack:
+            node = stack.pop()
+            if node in seen or not self.is_and(node):
+                continue
+            seen.add(node)
+            stack.append(self.left[node] >> 1)
+            stack.append(self.right[node] >> 1)
+
+        depth = max((self.level[literal >> 1] for literal in literals), default=0)
+        return (len(seen), depth)
+
+# Converts the scheduled gates of a manager into an AIG.  Switches become inputs and VCC/GND
+# become constants.  Returns the AIG and the literal of every output.
+def from_manager(manager : LogicGateManager, outputs : list, rewrite : bool = True) -> tuple:
+    aig = Aig(rewrite)
+    literals = {}
+
+    for name, op, fanin in manager._get_netlist():
+        values = [literals[pin] for pin in fanin]
+        if op == "SWITCH":
+            literal = aig.add_input(name)
+        elif op == "VCC":
+            literal = 1
+        elif op == "GND":
+            literal = 0
+        elif op == "AND" or op == "NAND":
+            literal = aig.and_many(values)
+        elif op == "OR" or op == "NOR":
+            literal = aig.and_many([value ^ 1 for value in values]) ^ 1
+        elif op == "XOR" or op == "XNOR":
+            literal = 0
+            for value in values:
+                literal = aig.xor_(literal, value)
+        elif op == "NOT":
+            literal = values[0] ^ 1
+        else:
+            raise LogicGateManagerException(f"Gate {name} ({op}) cannot be converted to an and-inverter graph")
+
+        if op == "NAND" or op == "NOR" or op == "XNOR":
+            literal ^= 1
+        literals[name] = literal
+
+    for name in outputs:
+        if name not in literals:
+            raise LogicGateManagerException(f"Gate {name} is not a scheduled gate of this circuit")
+    return (aig, [literals[name] for name in outputs])
+
+# Rebuilds an AIG with every AND cone balanced.  A cone grows through non-inverted edges into
+# nodes that have no other fanout, and its leaves are ANDed shallowest first.  Only the logic
+# feeding the outputs is copied.  Returns the new AIG and the new output literals.
+def balance(aig : Aig, outputs : list) -> tuple:
+    fanout = [0] * len(aig.left)
+    for node in range(len(aig.left)):
+        if aig.is_and(node):
+            fanout[aig.left[node] >> 1] += 1
+            fanout[aig.right[node] >> 1] += 1
+    for literal in outputs:
+        fanout[literal >> 1] += 1
+
+    # Find the cone roots from the outputs down, roots always having a higher id than their leaves
+    leaves = {}
+    heap = [-node for node in {literal >> 1 for literal in outputs} if aig.is_and(node)]
+    heapq.heapify(heap)
+    queued = {-node for node in heap}
+    while heap:
+        root = -heapq.heappop(heap)
+        stack = [aig.left[root], aig.right[root]]
+        leaves[root] = []
+        while stack:
+            literal = stack.pop()
+            node = literal >> 1
+            if not literal & 1 and aig.is_and(node) and fanout[node] == 1:
+                stack.append(aig.left[node])
+                stack.append(aig.right[node])
+                continue
+            leaves[root].append(literal)
+            if aig.is_and(node) and node not in queued:
+                queued.add(node)
+                heapq.heappush(heap, -node)
+
+    balanced = Aig(aig._rewrite)
+    mapping = {0: 0}
+    for node, name in zip(aig.inputs, aig.names):
+        mapping[node] = balanced.add_input(name)
+    for root in sorted(leaves):
+        mapping[root] = balanced.and_many([mapping[literal >> 1] ^ (literal & 1) for literal in leaves[root]])
+
+    return (balanced, [mapping[literal >> 1] ^ (literal & 1) for literal in outputs])
+
+# Maps an AIG back onto gates in a new manager.  AND nodes become AND or NAND gates, or NOR and
+# OR gates when both of their inputs are inverted, and NOT gates are only added for inverted
+# inputs.  The gate computing each output takes the output's name.
+def to_manager(aig : Aig, outputs : list, names : list, switches : dict = None, engine : str = "sweep") -> LogicGateManager:
+    manager = LogicGateManager(engine=engine)
+    switches = {} if switches is None else switches
+    input_names = dict(zip(aig.inputs, aig.names))
+
+    # Work out which polarity of which node is needed, keyed as (node, inverted)
+    needed = set()
+    stack = [(literal >> 1, literal & 1) for literal in outputs if literal > 1]
+    while stack:
+        signal = stack.pop()
+        if signal in needed:
+            continue
+        needed.add(signal)
+        node, inverted = signal
+        if not aig.is_and(node):
+            if inverted:
+                stack.append((node, 0))
+        elif aig.left[node] & aig.right[node] & 1:
+            stack.extend(((aig.left[node] >> 1, 0), (aig.right[node] >> 1, 0)))
+        else:
+            stack.extend(((aig.left[node] >> 1, aig.left[node] & 1), (aig.right[node] >> 1, aig.right[node] & 1)))
+
+    used = set(aig.names) | set(names)
+    def unique(name):
+        while name in used:
+            name = "_" + name
+        used.add(name)
+        return name
+
+    # Outputs take over the name of the gate computing them, inputs always keep their own name
+    gate_names = {}
+    for name, literal in zip(names, outputs):
+        signal = (literal >> 1, literal & 1)
+        if literal > 1 and signal not in gate_names and not (signal[0] in input_names and not signal[1]):
+            gate_names[signal] = name
+    for node, name in input_names.items():
+        gate_names[(node, 0)] = name
+
+    for node, name in input_names.items():
+        manager.add_gate(Switch("SWITCH", name, value=switches.get(name, 0)))
+
+    for signal in sorted(needed):
+        node, inverted = signal
+        if not aig.is_and(node):
+            if inverted:
+                name = gate_names.get(signal) or unique(f"{input_names[node]}_not")
+                gate_names[signal] = name
+                manager.add_gate(NOTGate("NOT", name))
+                manager.add_connection(GatePin(gate_names[(node, 0)], 'O'), GatePin(name, 'A'))
+            continue
+
+        left, right = aig.left[node], aig.right[node]
+        if left & right & 1:
+            gate_class = ORGate if inverted else NORGate
+            fanins = ((left >> 1, 0), (right >> 1, 0))
+        else:
+            gate_class = NANDGate if inverted else ANDGate
+            fanins = ((left >> 1, left & 1), (right >> 1, right & 1))
+
+        name = gate_names.get(signal) or unique(f"n{node}{'_not' if inverted else ''}")
+        gate_names[signal] = name
+        manager.add_gate(gate_class(gate_class.op, name))
+        for pin, fanin in zip(('A', 'B'), fanins):
+            manager.add_connection(GatePin(gate_names[fanin], 'O'), GatePin(name, pin))
+
+    # Outputs that are constants, inputs or a copy of another output need a gate of their own
+    for name, literal in zip(names, outputs):
+        if name in manager.connections:
+            continue
+        if literal <= 1:
+            manager.add_gate(VCC("VCC", name) if literal else GND("GND", name))
+        else:
+            manager.add_gate(ANDGate("AND", name, ['A']))
+            manager.add_connection(GatePin(gate_names[(literal >> 1, literal & 1)], 'O'), GatePin(name, 'A'))
+
+    return manager
+
+# Optimizes a circuit through an AIG: converts it with rewriting enabled, balances it the given
+# number of times and maps it back onto gates.  Returns the new manager and an AigReport
+# comparing the plain AIG of the original circuit and the gate-level result before and after.
+def optimize(manager : LogicGateManager, outputs : list = None, passes : int = 2) -> tuple:
+    outputs = manager.sinks() if outputs is None else list(outputs)
+
+    plain, plain_outputs = from_manager(manager, outputs, rewrite=False)
+    aig, literals = from_manager(manager, outputs)
+    for _ in range(passes):
+        aig, literals = balance(aig, literals)
+
+    switches = {name: manager[name].value for name in aig.names}
+    result = to_manager(aig, literals, outputs, switches, manager.engine)
+
+    nodes_before, depth_before = plain.measure(plain_outputs)
+    nodes_after, depth_after = aig.measure(literals)
+    report = AigReport(nodes_before, nodes_after, depth_before, depth_after,
+                       len(manager.connections), len(result.connections),
+                       len(manager.levelize()), len(result.levelize()))
+    return (result, report)
@@ -0,0 +1,331 @@
+"""
+Benchmark suite of generated circuits.  Every circuit is built from the ordinary gate
+classes through add_gate and add_connection, in sizes given by a parameter:
+
+    adder       N-bit ripple-carry adder chained from the full adder used in the tests
+    multiplier  N x N-bit array multiplier, rows of partial products added with ripple adders
+    parity      XOR tree over N inputs
+    random      random DAG of N gates over 32 inputs, the same for the same seed
+
+For every circuit the suite measures the time to build it, the memory it holds per gate,
+the time per pulse of every engine and how many vectors per second simulate_batch gets
+through.  The results are written as JSON along with the Python version and platform, and
+compare() lists the measurements that got worse between two result files, so regressions
+are visible from one release to the next.
+
+Run it from the directory holding manage.py:
+
+    python -m gates.benchmarks --output results.json --baseline previous.json
+"""
+import argparse
+import collections
+import datetime
+import gc
+import inspect
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from gates.logic_gates import (ANDGate, GatePin, LogicGateManager, NANDGate, NORGate, NOTGate, ORGate,
+                               Switch, XNORGate, XORGate)
+
+BenchmarkResult = collections.namedtuple("BenchmarkResult", ('circuit', 'size', 'gates', 'build_seconds',
+                                                             'bytes_per_gate', 'pulse_seconds', 'vectors_per_second'))
+GeneratedCircuit = collections.namedtuple("GeneratedCircuit", ('manager', 'inputs', 'outputs'))
+Regression = collections.namedtuple("Regression", ('circuit', 'size', 'metric', 'baseline', 'current', 'change'))
+
+# Version of the result files written by write_results
+FORMAT_VERSION = 1
+
+# Sizes run when none are given on the command line
+DEFAULT_SIZES = {
+    "adder": [8, 32, 128],
+    "multiplier": [4, 8, 16],
+    "parity": [64, 1024],
+    "random": [1000, 10000],
+}
+
+# Metrics compare() checks, and whether a larger value is better
+METRICS = {
+    "build_seconds": False,
+    "bytes_per_gate": False,
+    "vectors_per_second": True,
+}
+
+_GATES = {"AND": ANDGate, "OR": ORGate, "XOR": XORGate, "NOT": NOTGate, "NAND": NANDGate, "NOR": NORGate, "XNOR": XNORGate}
+
+"""
+Helper that adds gates to a manager under numbered names and wires their inputs
+"""
+class _Builder:
+    def __init__(self, engine : str) -> None:
+        self.manager = LogicGateManager(engine=engine)
+        self._count = collections.Counter()
+
+    # Adds a switch and returns its output pin
+    def switch(self, name : str) -> GatePin:
+        self.manager.add_gate(Switch("SWITCH", name))
+        return GatePin(name, 'O')
+
+    # Adds a gate driven by the given output pins, in pin order A, B, and returns its output pin
+    def gate(self, op : str, *drivers : GatePin) -> GatePin:
+        name = f"{op}{self._count[op]}"
+        self._count[op] += 1
+        gate = _GATES[op](op, name)
+        self.manager.add_gate(gate)
+        for driver, pin in zip(drivers, gate.inputs.pins):
+            self.manager.add_connection(driver, GatePin(name, pin))
+        return GatePin(name, 'O')
+
+    # Adds the full adder from the tests (XOR1, XOR2, AND1, AND2, OR1) and returns the sum and carry pins
+    def full_adder(self, a : GatePin, b : GatePin, carry : GatePin) -> tuple:
+        half = self.gate("XOR", a, b)
+        total = self.gate("XOR", half, carry)
+        propagate = self.gate("AND", half, carry)
+        generate = self.gate("AND", a, b)
+        return total, self.gate("OR", propagate, generate)
+
+    def half_adder(self, a : GatePin, b : GatePin) -> tuple:
+        return self.gate("XOR", a, b), self.gate("AND", a, b)
+
+    # Returns the GeneratedCircuit with the names of the given input and output pins' gates
+    def result(self, inputs : list, outputs : list):
+        return GeneratedCircuit(self.manager, [pin.gate for pin in inputs], [pin.gate for pin in outputs])
+
+# Builds an N-bit ripple-carry adder.  The inputs are A0.., B0.. and CIN and the outputs the sum bits
+# followed by the carry out, least significant bit first.
+def ripple_carry_adder(bits : int, engine : str = "sweep") -> GeneratedCircuit:
+    builder = _Builder(engine)
+    a = [builder.switch(f"A{bit}") for bit in range(bits)]
+    b = [builder.switch(f"B{bit}") for bit in range(bits)]
+    carry_in = builder.switch("CIN")
+    carry = carry_in
+    total = []
+    for bit in range(bits):
+        value, carry = builder.full_adder(a[bit], b[bit], carry)
+        total.append(value)
+    return builder.result(a + b + [carry_in], total + [carry])
+
+# Builds an N x N-bit array multiplier with inputs A0.., B0.. and the 2N product bits as outputs, least
+# significant bit first.  Row j of partial products (A AND Bj) is added to the running sum with a
+# ripple adder, one row after the other.
+def array_multiplier(bits : int, engine : str = "sweep") -> GeneratedCircuit:
+    builder = _Builder(engine)
+    a = [builder.switch(f"A{bit}") for bit in range(bits)]
+    b = [builder.switch(f"B{bit}") for bit in range(bits)]
+
+    # total holds the bits of the running sum from weight j upwards
+    total = [builder.gate("AND", a[bit], b[0]) for bit in range(bits)]
+    product = []
+    for row in range(1, bits):
+        partial = [builder.gate("AND", a[bit], b[row]) for bit in range(bits)]
+        upper = total[1:]
+        added = []
+        carry = None
+        for bit in range(bits):
+            if bit < len(upper):
+                if carry is None:
+                    value, carry = builder.half_adder(upper[bit], partial[bit])
+                else:
+                    value, carry = builder.full_adder(upper[bit], partial[bit], carry)
+            elif carry is None:
+                value = partial[bit]
+            else:
+                value, carry = builder.half_adder(partial[bit], carry)
+            added.append(value)
+        product.append(total[0])
+        total = added + ([carry] if carry is not None else [])
+    return builder.result(a + b, product + total)
+
+# Builds a balanced XOR tree over inputs I0.. with the parity as its one output
+def parity_tree(inputs : int, engine : str = "sweep") -> GeneratedCircuit:
+    builder = _Builder(engine)
+    switches = [builder.switch(f"I{index}") for index in range(inputs)]
+    layer = switches
+    while len(layer) > 1:
+        paired = [builder.gate("XOR", layer[index], layer[index + 1]) for index in range(0, len(layer) - 1, 2)]
+        layer = paired + layer[len(layer) & ~1:]
+    return builder.result(switches, layer)
+
+# Builds a random DAG of gates over inputs I0..I31 whose outputs are the gates nothing reads.  Every gate
+# reads nets among the last window added before it, which keeps the circuit deep instead of flat.
+def random_dag(gates : int, engine : str = "sweep", seed : int = 0, inputs : int = 32, window : int = 64) -> GeneratedCircuit:
+    generator = random.Random(seed)
+    builder = _Builder(engine)
+    switches = [builder.switch(f"I{index}") for index in range(inputs)]
+    nets = list(switches)
+    read = set()
+    ops = sorted(_GATES)
+    for _ in range(gates):
+        op = generator.choice(ops)
+        recent = nets[-window:]
+        drivers = [generator.choice(recent)] if op == "NOT" else generator.sample(recent, 2)
+        read.update(drivers)
+        nets.append(builder.gate(op, *drivers))
+    return builder.result(switches, [net for net in nets[inputs:] if net not in read])
+
+CIRCUITS = {
+    "adder": ripple_carry_adder,
+    "multiplier": array_multiplier,
+    "parity": parity_tree,
+    "random": random_dag,
+}
+
+# Builds and measures one circuit.  Pulses are timed after a first pulse that builds each engine's
+# schedule, each one with the inputs set to a random vector, and then vectors random vectors are
+# simulated with simulate_batch.  Every pulse is timed on its own and takes its best time over
+# repeat runs, so noise has to hit the same pulse in every run to show up.  The build and the
+# batch take the best of repeat runs.  Like timeit, the garbage collector is off while measuring
+# so that its pauses do not land on random pulses.
+def measure(circuit : str, size : int, pulses : int = 20, vectors : int = 4096, seed : int = 0,
+            repeat : int = 5) -> BenchmarkResult:
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _measure(circuit, size, pulses, vectors, seed, repeat)
+    finally:
+        if enabled:
+            gc.enable()
+
+def _measure(circuit : str, size : int, pulses : int, vectors : int, seed : int, repeat : int) -> BenchmarkResult:
+    generate = CIRCUITS[circuit]
+    # Circuits that are generated randomly are generated from the same seed as the vectors
+    if 'seed' in inspect.signature(generate).parameters:
+        build = lambda size: generate(size, seed=seed)
+    else:
+        build = generate
+
+    build_seconds = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        generated = build(size)
+        build_seconds = min(build_seconds, time.perf_counter() - start)
+        gates = len(generated.manager.connections)
+        del generated
+
+    # Memory is traced on another build, since tracing slows the build down
+    gc.collect()
+    tracemalloc.start()
+    manager, inputs, outputs = build(size)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Every pulse sets the inputs to a new random vector, so the event engine has changes to follow
+    generator = random.Random(seed)
+    stimulus = [[generator.getrandbits(1) for _ in inputs] for _ in range(pulses)]
+    pulse_seconds = {}
+    clock = time.perf_counter
+    for engine in LogicGateManager.ENGINES:
+        manager.engine = engine
+        manager.step()
+        best = [float('inf')] * pulses
+        for _ in range(repeat):
+            for index, vector in enumerate(stimulus):
+                start = clock()
+                for name, value in zip(inputs, vector):
+                    manager.set_switch(name, value)
+                manager.step()
+                best[index] = min(best[index], clock() - start)
+        pulse_seconds[engine] = sum(best) / pulses if pulses else 0.0
+
+    batch = [tuple(generator.getrandbits(1) for _ in inputs) for _ in range(vectors)]
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        manager.simulate_batch(inputs, batch, outputs)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    return BenchmarkResult(circuit, size, gates, build_seconds, held / gates,
+                           pulse_seconds, vectors / elapsed if elapsed > 0 else float('inf'))
+
+# Measures every size of every circuit in sizes, which defaults to DEFAULT_SIZES
+def run(sizes : dict = None, pulses : int = 20, vectors : int = 4096, seed : int = 0, repeat : int = 5) -> list:
+    sizes = DEFAULT_SIZES if sizes is None else sizes
+    return [measure(circuit, size, pulses, vectors, seed, repeat) for circuit, values in sizes.items() for size in values]
+
+# Writes results as JSON, along with where they were measured
+def write_results(results : list, file) -> None:
+    document = {
+        "version": FORMAT_VERSION,
+        "date": datetime.datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [result._asdict() for result in results],
+    }
+    json.dump(document, file, indent=2)
+    file.write('\n')
+
+# Reads the results written by write_results
+def read_results(file) -> list:
+    document = json.load(file)
+    if document.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported benchmark result version {document.get('version')}")
+    return [BenchmarkResult(**result) for result in document["results"]]
+
+# Lists the measurements of circuits found in both result lists that got worse by more than tolerance,
+# as a fraction of the baseline.  Pulse times are compared per engine as pulse_seconds.<engine>.  Even
+# best times of the same tree drift by tens of percent between runs on a busy machine, so the default
+# only reports measurements that got more than 50% worse.
+def compare(baseline : list, current : list, tolerance : float = 0.5) -> list:
+    previous = {(result.circuit, result.size): result for result in baseline}
+    regressions = []
+    for result in current:
+        old = previous.get((result.circuit, result.size))
+        if old is None:
+            continue
+
+        pairs = [(metric, getattr(old, metric), getattr(result, metric), larger) for metric, larger in METRICS.items()]
+        pairs.extend((f"pulse_seconds.{engine}", old.pulse_seconds[engine], seconds, False)
+                     for engine, seconds in result.pulse_seconds.items() if engine in old.pulse_seconds)
+        for metric, before, after, larger in pairs:
+            if not before:
+                continue
+            change = (after - before) / before
+            if (-change if larger else change) > tolerance:
+                regressions.append(Regression(result.circuit, result.size, metric, before, after, change))
+    return regressions
+
+def _format(result : BenchmarkResult) -> str:
+    pulses = ' '.join(f"{engine} {seconds * 1e3:.3f}ms" for engine, seconds in result.pulse_seconds.items())
+    return (f"{result.circuit:<10} {result.size:>6} {result.gates:>7} gates  build {result.build_seconds * 1e3:.1f}ms  "
+            f"{result.bytes_per_gate:.0f} B/gate  {pulses}  {result.vectors_per_second:,.0f} vectors/s")
+
+def main(args : list = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m gates.benchmarks", description="Benchmarks generated circuits")
+    parser.add_argument("--circuit", action="append", choices=sorted(CIRCUITS), help="circuit to run, repeatable (default: all)")
+    parser.add_argument("--size", action="append", type=int, help="size to run, repeatable (default: the circuit's default sizes)")
+    parser.add_argument("--pulses", type=int, default=20, help="pulses timed per engine")
+    parser.add_argument("--vectors", type=int, default=4096, help="vectors simulated in a batch")
+    parser.add_argument("--repeat", type=int, default=5, help="runs each timing is the best of")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random vectors and circuits")
+    parser.add_argument("--output", help="file to write the JSON results to")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="fraction a measurement may get worse before it is reported")
+    options = parser.parse_args(args)
+
+    sizes = {circuit: options.size or DEFAULT_SIZES[circuit] for circuit in (options.circuit or DEFAULT_SIZES)}
+    results = []
+    for circuit, values in sizes.items():
+        for size in values:
+            results.append(measure(circuit, size, options.pulses, options.vectors, options.seed, options.repeat))
+            print(_format(results[-1]))
+
+    if options.output:
+        with open(options.output, 'w') as file:
+            write_results(results, file)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare(read_results(file), results, options.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression.circuit} {regression.size} {regression.metric}: "
+                  f"{regression.baseline:.6g} -> {regression.current:.6g} ({regression.change:+.0%})")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Bit-parallel evaluation of a flattened circuit.  Every net carries a word where bit i
+is the value of that net for input vector i, so one pass over the netlist simulates
+every vector in the batch.  Words can be Python ints, which are arbitrary precision and
+hold any number of vectors, or NumPy uint64 arrays holding 64 vectors per element.
+
+The netlist is a list of (name, op, fanin) records in topological order, as built by
+LogicGateManager._get_netlist().  The only operations the words need to support are
+&, | and ^, with NOT done as an xor against the all-ones mask.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Width of a single machine word in the NumPy backend
+WORD_BITS = 64
+
+# Runs the netlist over a set of words.  Gates named in words have their output forced to
+# that word instead of being evaluated, which is how circuit inputs are fed in.
+def evaluate(netlist : list, words : dict, mask) -> dict:
+    values = {}
+    zero = mask ^ mask
+
+    for name, op, fanin in netlist:
+        if name in words:
+            values[name] = words[name]
+            continue
+
+        if op == "AND" or op == "NAND":
+            value = mask
+            for pin in fanin:
+                value = value & values[pin]
+        elif op == "OR" or op == "NOR":
+            value = zero
+            for pin in fanin:
+                value = value | values[pin]
+        elif op == "XOR" or op == "XNOR":
+            value = zero
+            for pin in fanin:
+                value = value ^ values[pin]
+        elif op == "NOT":
+            value = values[fanin[0]] ^ mask
+        elif op == "VCC":
+            value = mask
+        elif op == "GND":
+            value = zero
+        else:
+            raise ValueError(f"No word given for gate {name} ({op})")
+
+        if op == "NAND" or op == "NOR" or op == "XNOR":
+            value = value ^ mask
+
+        values[name] = value
+
+    return values
+
+# Returns a word with every vector bit set
+def ones(count : int, use_numpy : bool = False):
+    if use_numpy:
+        return numpy.full(-(-count // WORD_BITS), 0xFFFFFFFFFFFFFFFF, dtype=numpy.uint64)
+    return (1 << count) - 1
+
+# Packs a sequence of input vectors into one word per input.  Returns the words, the
+# all-ones mask and the number of vectors packed.
+def pack(vectors, width : int, use_numpy : bool = False) -> tuple:
+    if use_numpy and numpy is None:
+        raise ImportError("NumPy is required for the numpy backend")
+
+    vectors = [tuple(vector) for vector in vectors]
+    for vector in vectors:
+        if len(vector) != width:
+            raise ValueError(f"Vector {vector} does not have {width} values")
+
+    count = len(vectors)
+    mask = ones(count, use_numpy)
+
+    if use_numpy:
+        bits = numpy.zeros((len(mask) * WORD_BITS, width), dtype=numpy.uint8)
+        bits[:count] = numpy.asarray(vectors, dtype=numpy.uint8).reshape(count, width)
+        words = [numpy.packbits(bits[:, i], bitorder='little').view('<u8').astype(numpy.uint64) for i in range(width)]
+    else:
+        # Vector 0 is the least significant bit, so the string is built last vector first
+        words = [int('0' + ''.join('1' if vector[i] else '0' for vector in reversed(vectors)), 2) for i in range(width)]
+
+    return (words, mask, count)
+
+# Unpacks output words back into one tuple of output values per vector
+def unpack(words : list, count : int) -> list:
+    if count == 0:
+        return []
+
+    columns = []
+    for word in words:
+        if numpy is not None and isinstance(word, numpy.ndarray):
+            columns.append(numpy.unpackbits(word.astype('<u8').view(numpy.uint8), bitorder='little')[:count].tolist())
+        else:
+            columns.append(map(int, format(word & ((1 << count) - 1), f'0{count}b')[::-1]))
+
+    if not columns:
+        return [()] * count
+    return list(zip(*columns))
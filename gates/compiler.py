@@ -0,0 +1,96 @@
+"""
+Compiles a flattened circuit into one generated Python function.  Every net becomes a
+local variable assigned once in topological order, so evaluating the circuit is a run of
+straight-line bitwise operations with no gate objects, pin dictionaries or method calls.
+Gates that compute the same operation over the same nets are structurally hashed into a
+single expression, so duplicated logic only costs one assignment.
+
+The generated function takes the all-ones mask and a sequence holding the word of every
+source gate (switches, VCC and GND), and returns a tuple with the word of every gate in
+netlist order.  Like the bitsim module it only relies on &, | and ^, so it works with a
+mask of 1 for a single vector as well as with bit-parallel Python int or NumPy words.
+"""
+import collections
+
+CompiledCircuit = collections.namedtuple("CompiledCircuit", ('function', 'source', 'sources', 'names', 'index'))
+
+# Operations that read no inputs and are fed to the generated function as arguments
+SOURCE_OPS = ("SWITCH", "VCC", "GND")
+
+# Operator joining the inputs of each operation, and the value when the gate has no inputs
+_JOINS = {
+    "AND": (" & ", "mask"),
+    "NAND": (" & ", "mask"),
+    "OR": (" | ", "zero"),
+    "NOR": (" | ", "zero"),
+    "XOR": (" ^ ", "zero"),
+    "XNOR": (" ^ ", "zero"),
+    "NOT": (" ^ ", "mask"),
+}
+
+# Generates the source of the circuit function for a netlist of (name, op, fanin) records
+def generate_source(netlist : list, function_name : str = "circuit") -> str:
+    index = {gate.name: position for position, gate in enumerate(netlist)}
+    sources = [f"n{index[name]}" for name, op, _ in netlist if op in SOURCE_OPS]
+
+    # Every gate's variable, which is the variable of the first structurally identical gate
+    variables = {}
+    hashed = {}
+
+    lines = [f"def {function_name}(mask, sources):", "    zero = mask ^ mask"]
+    if sources:
+        lines.append(f"    {', '.join(sources)}, = sources")
+
+    for name, op, fanin in netlist:
+        if op in SOURCE_OPS:
+            continue
+        if op not in _JOINS:
+            raise ValueError(f"Cannot compile gate {name} with operation {op}")
+
+        terms = sorted(variables.get(pin, f"n{index[pin]}") for pin in fanin)
+        key = (op, tuple(terms))
+        if key in hashed:
+            variables[name] = hashed[key]
+            continue
+        hashed[key] = variables[name] = f"n{index[name]}"
+
+        expression = generate_expression(op, terms)
+        lines.append(f"    n{index[name]} = {expression}  # {name!r}")
+
+    values = ''.join(f"{variables.get(gate.name, f'n{position}')}, " for position, gate in enumerate(netlist))
+    lines.append(f"    return ({values})")
+
+    return '\n'.join(lines) + '\n'
+
+# Generates the expression computing an operation over the variables in terms, which are
+# expected to be sorted.  mask and zero must be defined where the expression is used.
+def generate_expression(op : str, terms : list) -> str:
+    join, empty = _JOINS[op]
+    if op == "NOT":
+        terms = terms[:1] + ["mask"]
+    expression = join.join(terms) if terms else empty
+    if op == "NAND" or op == "NOR" or op == "XNOR":
+        expression = f"({expression}) ^ mask"
+    return expression
+
+# Returns the input pins an operation reads: XOR and XNOR read A and B, NOT reads A and every
+# other operation reads all of the gate's input pins
+def operand_pins(op : str, pins) -> tuple:
+    if op == "XOR" or op == "XNOR":
+        return ('A', 'B')
+    if op == "NOT":
+        return ('A',)
+    return tuple(pins)
+
+# Compiles a netlist into a CompiledCircuit holding the generated function, its source,
+# the names of the source gates in argument order and the position of every gate's value
+def compile_netlist(netlist : list) -> CompiledCircuit:
+    source = generate_source(netlist)
+    namespace = {}
+    exec(compile(source, "<circuit>", "exec"), namespace)
+
+    names = [gate.name for gate in netlist]
+    sources = [name for name, op, _ in netlist if op in SOURCE_OPS]
+    index = {name: position for position, name in enumerate(names)}
+
+    return CompiledCircuit(namespace["circuit"], source, sources, names, index)
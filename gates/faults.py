@@ -0,0 +1,164 @@
+"""
+Stuck-at fault simulation for grading test vectors.  Every pin of every scheduled gate
+can be stuck at 0 or at 1.  A fault on an input pin only changes the value that gate
+reads, while a fault on an output pin changes the value every gate reading it sees.
+
+Faults are simulated bit-parallel, many to a word: bit 0 of every word is the fault-free
+circuit and bit i is the circuit with the i-th fault of the shard injected, so one pass
+over the circuit per vector simulates the whole shard.  Each shard is compiled into its
+own straight-line function with the stuck bits masked in as constants.  Shards are spread
+over a ProcessPoolExecutor, and every worker receives the flattened circuit and the
+vectors once when it starts instead of with every shard.
+"""
+import collections
+import concurrent.futures
+
+from gates import compiler
+from gates.logic_gates import LogicGateManager, LogicGateManagerException
+
+Fault = collections.namedtuple("Fault", ('gate', 'pin', 'output', 'value'))
+FaultReport = collections.namedtuple("FaultReport", ('faults', 'detected', 'undetected', 'coverage'))
+
+# Bits in the word of one shard, including bit 0 for the fault-free circuit
+WORD_BITS = 64
+
+# Circuit, vectors and outputs of a pool worker, set when the worker starts
+_shared = None
+
+# Lists the stuck-at-0 and stuck-at-1 fault of every input pin each scheduled gate reads and
+# of every one of its output pins
+def enumerate_faults(manager : LogicGateManager) -> list:
+    faults = []
+    for name, op, _ in manager._get_netlist():
+        gate = manager[name]
+        for pin in compiler.operand_pins(op, gate.inputs.pins):
+            faults.extend((Fault(name, pin, False, 0), Fault(name, pin, False, 1)))
+        for pin in gate.outputs.pins:
+            faults.extend((Fault(name, pin, True, 0), Fault(name, pin, True, 1)))
+    return faults
+
+# Fault simulates a set of test vectors.  inputs names the source gates (usually switches) each
+# vector position drives and the other switches keep their current value.  A fault is detected
+# when one of the outputs differs from the fault-free circuit for at least one vector.  faults
+# defaults to every fault from enumerate_faults, and each shard holds word_bits - 1 of them.
+# processes is the number of worker processes, with 1 simulating every shard in this process.
+# Returns a FaultReport with the faults, the detected and undetected faults and the coverage.
+def simulate(manager : LogicGateManager, inputs : list, vectors, outputs : list = None, faults : list = None,
+             word_bits : int = WORD_BITS, processes : int = None) -> FaultReport:
+    outputs = manager.sinks() if outputs is None else list(outputs)
+    faults = enumerate_faults(manager) if faults is None else list(faults)
+    if word_bits < 2:
+        raise LogicGateManagerException(f"A word needs at least 2 bits to hold a fault, not {word_bits}")
+
+    shared = _prepare(manager, inputs, vectors, outputs, faults)
+    size = word_bits - 1
+    shards = [faults[start:start + size] for start in range(0, len(faults), size)]
+
+    if processes == 1 or len(shards) <= 1:
+        results = [_simulate_shard(shared, shard) for shard in shards]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker,
+                                                    initargs=(shared,)) as executor:
+            results = list(executor.map(_run_shard, shards))
+
+    detected = []
+    undetected = []
+    for shard, flags in zip(shards, results):
+        for fault, flag in zip(shard, flags):
+            (detected if flag else undetected).append(fault)
+
+    coverage = len(detected) / len(faults) if faults else 1.0
+    return FaultReport(faults, detected, undetected, coverage)
+
+# Flattens the circuit into (name, op, fanin, pins) records, where pins names the input pin each
+# fanin entry drives, and turns every vector into the values of the circuit's source gates
+def _prepare(manager : LogicGateManager, inputs : list, vectors, outputs : list, faults : list) -> tuple:
+    netlist = manager._get_netlist()
+    index = {gate.name: position for position, gate in enumerate(netlist)}
+
+    for name in list(inputs) + outputs:
+        if name not in index:
+            raise LogicGateManagerException(f"Gate {name} is not a scheduled gate of this circuit")
+    for name in inputs:
+        if manager[name].op not in compiler.SOURCE_OPS:
+            raise LogicGateManagerException(f"Gate {name} is not a switch, VCC or GND gate and cannot be driven by a vector")
+    for fault in faults:
+        gate = manager[fault.gate] if fault.gate in index else None
+        pins = None if gate is None else (gate.outputs.pins if fault.output else compiler.operand_pins(gate.op, gate.inputs.pins))
+        if pins is None or fault.pin not in pins or fault.value not in (0, 1):
+            raise LogicGateManagerException(f"{fault} is not a fault of a scheduled gate of this circuit")
+
+    circuit = [(name, op, fanin, compiler.operand_pins(op, manager[name].inputs.pins)) for name, op, fanin in netlist]
+    sources = [name for name, op, _ in netlist if op in compiler.SOURCE_OPS]
+    position = {name: inputs.index(name) for name in sources if name in inputs}
+    defaults = {name: int(manager[name].op == "VCC" or (manager[name].op == "SWITCH" and manager[name].value)) for name in sources}
+
+    values = []
+    for vector in vectors:
+        vector = tuple(vector)
+        if len(vector) != len(inputs):
+            raise ValueError(f"Vector {vector} does not have {len(inputs)} values")
+        values.append(tuple(vector[position[name]] if name in position else defaults[name] for name in sources))
+
+    return (circuit, values, outputs)
+
+# Generates the function of one shard, returning the word of every output.  The fault in
+# position i of the shard is injected into bit i + 1.
+def _generate_source(circuit : list, outputs : list, shard : list) -> str:
+    stuck = collections.defaultdict(lambda: [0, 0])
+    for bit, fault in enumerate(shard, 1):
+        stuck[(fault.gate, fault.output, fault.pin if not fault.output else None)][fault.value] |= 1 << bit
+    full = (1 << (len(shard) + 1)) - 1
+
+    def inject(term, key):
+        if key not in stuck:
+            return term
+        low, high = stuck[key]
+        return f"(({term} & {full ^ (low | high)}) | {high})"
+
+    index = {record[0]: position for position, record in enumerate(circuit)}
+    sources = [f"n{index[name]}" for name, op, _, _ in circuit if op in compiler.SOURCE_OPS]
+    lines = ["def circuit(mask, sources):", "    zero = mask ^ mask"]
+    if sources:
+        lines.append(f"    {', '.join(sources)}, = sources")
+
+    for name, op, fanin, pins in circuit:
+        variable = f"n{index[name]}"
+        if op in compiler.SOURCE_OPS:
+            expression = variable
+        else:
+            terms = [inject(f"n{index[driver]}", (name, False, pin)) for driver, pin in zip(fanin, pins)]
+            expression = compiler.generate_expression(op, terms)
+        expression = inject(f"({expression})" if (name, True, None) in stuck else expression, (name, True, None))
+        if expression != variable:
+            lines.append(f"    {variable} = {expression}  # {name!r}")
+
+    lines.append(f"    return ({''.join(f'n{index[name]}, ' for name in outputs)})")
+    return '\n'.join(lines) + '\n'
+
+# Simulates one shard over every vector and returns whether each of its faults was detected.
+# Simulation stops early once every fault in the shard has been detected.
+def _simulate_shard(shared : tuple, shard : list) -> list:
+    circuit, vectors, outputs = shared
+    namespace = {}
+    exec(compile(_generate_source(circuit, outputs, shard), "<faults>", "exec"), namespace)
+    function = namespace["circuit"]
+
+    mask = (1 << (len(shard) + 1)) - 1
+    faulty = mask ^ 1
+    detected = 0
+    for values in vectors:
+        for word in function(mask, [mask if value else 0 for value in values]):
+            detected |= word ^ (mask if word & 1 else 0)
+        if detected & faulty == faulty:
+            break
+
+    return [bool((detected >> bit) & 1) for bit in range(1, len(shard) + 1)]
+
+# Pool initializer keeping the circuit, vectors and outputs for every shard the worker runs
+def _initialize_worker(shared : tuple) -> None:
+    global _shared
+    _shared = shared
+
+def _run_shard(shard : list) -> list:
+    return _simulate_shard(_shared, shard)
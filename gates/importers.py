@@ -0,0 +1,285 @@
+"""
+Importers for the netlist formats used by the standard benchmark circuits: the ISCAS-85/89
+.bench format and Berkeley's BLIF.  Files are read line by line, each line becoming gates
+as it is parsed, and the whole circuit is handed to LogicGateManager.add_netlist at the end
+in a single call, so none of the per-connection work of add_connection is done and the
+schedule is built once.
+
+Every net becomes a gate named after it.  Gates with more inputs than the gate classes take
+are split up: AND, OR, NAND and NOR take any number of inputs, while a wide XOR or XNOR
+becomes a chain of two-input gates.  BLIF's .names covers are turned into AND, OR and NOT
+gates, with the common single-gate covers recognized directly.  The gates made up for
+these are named after the net with a "#" and a number, like "n5#1".  Both formats start a
+comment at "#", so no net in a file can have one of these names.
+
+Flip-flops (.bench DFF and BLIF .latch) are cut the way test generation treats a full-scan
+circuit: the flip-flop's output becomes a Switch and the pair of nets is listed in the
+circuit's latches, outputs only holding the declared outputs.  advance_latches copies every
+flip-flop's input onto its output switch, so calling it after every step simulates the
+sequential circuit one clock at a time.
+"""
+import collections
+import re
+
+from gates.logic_gates import (ANDGate, GND, LogicGateManager, LogicGateManagerException, NANDGate, NORGate,
+                               NOTGate, ORGate, PinConnection, Switch, VCC, XNORGate, XORGate)
+
+ImportedCircuit = collections.namedtuple("ImportedCircuit", ('manager', 'inputs', 'outputs', 'latches'))
+Latch = collections.namedtuple("Latch", ('d', 'q'))
+
+_GATES = {"AND": ANDGate, "OR": ORGate, "XOR": XORGate, "NOT": NOTGate, "NAND": NANDGate, "NOR": NORGate, "XNOR": XNORGate}
+_BENCH_OPS = {"AND": "AND", "NAND": "NAND", "OR": "OR", "NOR": "NOR", "XOR": "XOR", "XNOR": "XNOR",
+              "NOT": "NOT", "INV": "NOT", "BUFF": "BUFF", "BUF": "BUFF", "DFF": "DFF"}
+
+_BENCH_PORT = re.compile(r"(INPUT|OUTPUT)\s*\(\s*([^\s()]+)\s*\)$", re.IGNORECASE)
+_BENCH_GATE = re.compile(r"([^\s=]+)\s*=\s*(\w+)\s*\(([^()]*)\)$")
+
+"""
+Custom exception type for netlists that cannot be imported.  line is the number of the
+line the problem was found on, or None when it concerns the whole file.
+"""
+class NetlistImportException(LogicGateManagerException):
+    def __init__(self, message : str, line : int = None) -> None:
+        self.line = line
+        super().__init__(message if line is None else f"Line {line}: {message}")
+
+"""
+Collects the gates and connections of a circuit as it is parsed and builds the manager
+once every line has been read
+"""
+class _Netlist:
+    def __init__(self) -> None:
+        self.gates = {}
+        self.connections = collections.defaultdict(dict)
+        self.inputs = []
+        self.outputs = []
+        self.latches = []
+        self._count = collections.Counter()
+
+    # Adds a gate reading the given nets, pins named A, B, C...
+    def add(self, op : str, name : str, fanin : list, line : int) -> str:
+        if name in self.gates:
+            raise NetlistImportException(f"Net {name} is driven more than once", line)
+        pins = _pins(len(fanin))
+        if op == "SWITCH":
+            gate = Switch("SWITCH", name)
+        elif op == "VCC":
+            gate = VCC("VCC", name)
+        elif op == "GND":
+            gate = GND("GND", name)
+        else:
+            gate = _GATES[op](op, name, inputs=pins)
+        self.gates[name] = gate
+
+        for net, pin in zip(fanin, pins):
+            self.connections[net].setdefault(name, []).append(PinConnection('O', pin))
+        return name
+
+    # Adds an operation over any number of nets.  Buffers become one-input AND gates and wide XOR and
+    # XNOR gates a chain of two-input ones.
+    def add_operation(self, op : str, name : str, fanin : list, line : int) -> str:
+        if not fanin or (op == "NOT" or op == "BUFF") and len(fanin) != 1:
+            raise NetlistImportException(f"{op} gate {name} cannot take {len(fanin)} inputs", line)
+        if op == "BUFF":
+            op = "AND"
+        if op in ("XOR", "XNOR") and len(fanin) != 2:
+            if len(fanin) < 2:
+                raise NetlistImportException(f"{op} gate {name} needs at least 2 inputs", line)
+            chained = fanin[0]
+            for net in fanin[1:-1]:
+                chained = self.add("XOR", self.internal(name), [chained, net], line)
+            fanin = [chained, fanin[-1]]
+        return self.add(op, name, fanin, line)
+
+    # Returns a new name for a gate made up while importing the given net
+    def internal(self, name : str) -> str:
+        self._count[name] += 1
+        return f"{name}#{self._count[name]}"
+
+    # Cuts a flip-flop into a switch for its output and a latch entry remembering its input
+    def add_latch(self, d : str, q : str, value : int, line : int) -> None:
+        self.add("SWITCH", q, [], line)
+        self.gates[q].value = value
+        self.latches.append(Latch(d, q))
+
+    # Checks every net used was defined and builds the manager
+    def build(self, engine : str) -> ImportedCircuit:
+        for net in list(self.connections) + self.outputs + [latch.d for latch in self.latches]:
+            if net not in self.gates:
+                raise NetlistImportException(f"Net {net} is used but never driven")
+
+        manager = LogicGateManager(engine=engine)
+        manager.add_netlist(self.gates.values(), self.connections)
+        return ImportedCircuit(manager, self.inputs, self.outputs, self.latches)
+
+# Imports an ISCAS-85 or ISCAS-89 .bench netlist from a path or an open text file
+def load_bench(file, engine : str = "sweep") -> ImportedCircuit:
+    netlist = _Netlist()
+    for number, line in _lines(file):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+
+        port = _BENCH_PORT.match(line)
+        if port:
+            if port.group(1).upper() == "INPUT":
+                netlist.inputs.append(netlist.add("SWITCH", port.group(2), [], number))
+            else:
+                netlist.outputs.append(port.group(2))
+            continue
+
+        gate = _BENCH_GATE.match(line)
+        if not gate:
+            raise NetlistImportException(f"Cannot parse '{line}'", number)
+        name, op, fanin = gate.group(1), gate.group(2).upper(), [net.strip() for net in gate.group(3).split(',') if net.strip()]
+        if op not in _BENCH_OPS:
+            raise NetlistImportException(f"Unknown gate type {gate.group(2)}", number)
+
+        if _BENCH_OPS[op] == "DFF":
+            if len(fanin) != 1:
+                raise NetlistImportException(f"DFF {name} takes 1 input, not {len(fanin)}", number)
+            netlist.add_latch(fanin[0], name, 0, number)
+        else:
+            netlist.add_operation(_BENCH_OPS[op], name, fanin, number)
+
+    return netlist.build(engine)
+
+# Imports the first model of a BLIF netlist from a path or an open text file.  Only combinational
+# .names covers and .latch flip-flops are supported, not .subckt or library .gate instances.
+def load_blif(file, engine : str = "sweep") -> ImportedCircuit:
+    netlist = _Netlist()
+    cover = None
+    for number, tokens in _blif_statements(file):
+        if not tokens[0].startswith('.'):
+            if cover is None:
+                raise NetlistImportException(f"Cover row '{' '.join(tokens)}' outside of a .names", number)
+            cover[2].append((number, tokens))
+            continue
+
+        if cover is not None:
+            _add_cover(netlist, *cover)
+            cover = None
+
+        directive, arguments = tokens[0], tokens[1:]
+        if directive == ".model":
+            continue
+        elif directive == ".inputs":
+            netlist.inputs.extend(netlist.add("SWITCH", net, [], number) for net in arguments)
+        elif directive == ".outputs":
+            netlist.outputs.extend(arguments)
+        elif directive == ".names":
+            if not arguments:
+                raise NetlistImportException(".names needs at least an output net", number)
+            cover = (number, arguments, [])
+        elif directive == ".latch":
+            if len(arguments) < 2:
+                raise NetlistImportException(".latch needs an input and an output net", number)
+            initial = arguments[-1] if len(arguments) in (3, 5) else "0"
+            netlist.add_latch(arguments[0], arguments[1], 1 if initial == "1" else 0, number)
+        elif directive == ".end":
+            break
+        else:
+            raise NetlistImportException(f"Unsupported directive {directive}", number)
+
+    if cover is not None:
+        _add_cover(netlist, *cover)
+    return netlist.build(engine)
+
+# Imports a netlist, picking the format from the file name's extension
+def load_netlist(path : str, engine : str = "sweep") -> ImportedCircuit:
+    if path.lower().endswith(".bench"):
+        return load_bench(path, engine)
+    if path.lower().endswith(".blif"):
+        return load_blif(path, engine)
+    raise NetlistImportException(f"Cannot tell the format of {path}, expected a .bench or .blif file")
+
+# Clocks the flip-flops of an imported circuit, copying the value of every flip-flop's input net
+# onto its output switch.  The values are all read before any is written.
+def advance_latches(circuit : ImportedCircuit) -> None:
+    manager = circuit.manager
+    values = [manager[latch.d].outputs.pins['O'] for latch in circuit.latches]
+    for latch, value in zip(circuit.latches, values):
+        manager.set_switch(latch.q, value)
+
+# Turns a .names cover into gates driving its output net.  Rows are (line, [input plane, output]).
+def _add_cover(netlist : _Netlist, line : int, nets : list, rows : list) -> None:
+    *fanin, name = nets
+    cubes = []
+    polarity = None
+    for number, tokens in rows:
+        plane, value = (tokens[0], tokens[1]) if fanin else ("", tokens[0])
+        if len(tokens) != (2 if fanin else 1) or len(plane) != len(fanin) or value not in "01" or set(plane) - set("01-"):
+            raise NetlistImportException(f"Cover row '{' '.join(tokens)}' does not match .names with {len(fanin)} inputs", number)
+        if polarity is not None and value != polarity:
+            raise NetlistImportException(f"Cover of {name} mixes on-set and off-set rows", number)
+        polarity = value
+        cubes.append(plane)
+
+    inverted = polarity == "0"
+    if not cubes or any(set(cube) <= {'-'} for cube in cubes):
+        constant = bool(cubes) != inverted
+        netlist.add("VCC" if constant else "GND", name, [], line)
+        return
+
+    # Two-input covers that are exactly XOR or XNOR
+    if len(fanin) == 2 and sorted(cubes) in (["01", "10"], ["00", "11"]):
+        xor = (sorted(cubes) == ["01", "10"]) != inverted
+        netlist.add("XOR" if xor else "XNOR", name, fanin, line)
+        return
+
+    # A single cube is an AND of its literals and a cover of single positive literals an OR
+    literals = [[(net, bit) for net, bit in zip(fanin, cube) if bit != '-'] for cube in cubes]
+    if len(literals) == 1 and all(bit == '1' for _, bit in literals[0]):
+        netlist.add_operation("NAND" if inverted else "AND", name, [net for net, _ in literals[0]], line)
+        return
+    if len(literals) == 1 and len(literals[0]) == 1:
+        netlist.add_operation("AND" if inverted else "NOT", name, [literals[0][0][0]], line)
+        return
+    if all(len(cube) == 1 and cube[0][1] == '1' for cube in literals):
+        netlist.add_operation("NOR" if inverted else "OR", name, [cube[0][0] for cube in literals], line)
+        return
+
+    # Anything else becomes inverters for the negative literals, an AND per cube and an OR over the cubes
+    inverters = {}
+    terms = []
+    for cube in literals:
+        nets = []
+        for net, bit in cube:
+            if bit == '0':
+                if net not in inverters:
+                    inverters[net] = netlist.add("NOT", netlist.internal(name), [net], line)
+                net = inverters[net]
+            nets.append(net)
+        terms.append(nets[0] if len(nets) == 1 else netlist.add_operation("AND", netlist.internal(name), nets, line))
+    netlist.add_operation("NOR" if inverted else "OR", name, terms, line)
+
+# Yields the (line number, tokens) of every BLIF statement, joining lines continued with a backslash
+# and dropping comments
+def _blif_statements(file):
+    tokens = []
+    start = None
+    for number, line in _lines(file):
+        line = line.split('#', 1)[0].rstrip()
+        continued = line.endswith('\\')
+        tokens.extend(line.rstrip('\\').split())
+        if start is None:
+            start = number
+        if not continued:
+            if tokens:
+                yield start, tokens
+            tokens = []
+            start = None
+    if tokens:
+        yield start, tokens
+
+# Yields the numbered lines of a path or an open text file
+def _lines(file):
+    if isinstance(file, str):
+        with open(file) as opened:
+            yield from enumerate(opened, 1)
+    else:
+        yield from enumerate(file, 1)
+
+# Names of the input pins of a gate with count inputs: A, B, ... Z, then I26, I27, ...
+def _pins(count : int) -> list:
+    return [chr(ord('A') + index) if index < 26 else f"I{index}" for index in range(count)]
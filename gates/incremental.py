@@ -0,0 +1,270 @@
+"""
+Incremental maintenance of a circuit's schedule and compiled code.  Instead of rebuilding
+the levelization and regenerating the whole compiled function after every add_gate,
+add_connection or remove_gate, an IncrementalCircuit updates the topological levels, the
+fanout index and the compiled code of only the gates an edit can affect.
+
+An edit can only change the level of the gates in the fan-out cone of the gate whose
+inputs changed, so the levelization is rerun over that cone alone, reading the levels of
+the gates outside it as they are.  Connecting a gate to one on a higher level, the usual
+case when a circuit is built front to back, changes no levels at all.
+
+The compiled code is split into chunks of at most CHUNK_SIZE gates from the same level.
+Every scheduled gate has a fixed slot in a shared list of values and each chunk is a small
+generated function assigning the slots of its gates.  Gates on the same level never read
+each other, so the chunks of a level can be regenerated independently, and only the
+chunks holding a gate whose level, fan-in or fanout changed are regenerated.
+"""
+import collections
+
+from gates import compiler
+
+# Largest number of gates compiled into one chunk function
+CHUNK_SIZE = 256
+
+"""
+A run of gates from one level compiled into a single function, along with the
+(pins, pin, slot) entries copying their values back onto the gates.
+"""
+class Chunk:
+    __slots__ = ('level', 'names', 'function', 'source', 'writeback')
+
+    def __init__(self, level : int) -> None:
+        self.level = level
+        self.names = {}
+        self.function = None
+        self.source = None
+        self.writeback = None
+
+"""
+Class that keeps the levelization, fanout index and compiled chunks of a circuit up to
+date as it is edited.  gates and connections are the LogicGateManager's own gate and
+connection dictionaries; the edit methods are called after the manager has applied the
+edit to them.
+"""
+class IncrementalCircuit:
+    def __init__(self, gates : dict, connections : dict) -> None:
+        self._gates = gates
+        self._connections = connections
+        self.rank = {}
+        self.levels = []
+        self.fanout = {name: [] for name in gates}
+        self.incoming = {name: {} for name in gates}
+
+        self._chunks = []
+        self._chunk = {}
+        self._dirty = set()
+        self._program = None
+        self._slots = {}
+        self._free = []
+        self.values = []
+
+        for name, fanout in connections.items():
+            for gate, connection in fanout.items():
+                self.incoming[gate][name] = list(connection)
+                self.fanout[name].extend((gates[gate].inputs.pins, conn.o_pin, conn.i_pin, gate) for conn in connection)
+
+        self._update(list(gates))
+
+    # Called after a gate was added to the circuit
+    def add_gate(self, name : str) -> None:
+        self.fanout[name] = []
+        self.incoming[name] = {}
+        self._update([name])
+
+    # Called after a connection was added from a pin of source to a pin of gate
+    def add_connection(self, source : str, gate : str, connection) -> None:
+        self.incoming[gate].setdefault(source, []).append(connection)
+        self.fanout[source].append((self._gates[gate].inputs.pins, connection.o_pin, connection.i_pin, gate))
+        self._touch(source)
+
+        # A driver on a lower level leaves the level of the gate, and so the rest of the circuit, as it is
+        if source in self.rank and gate in self.rank and self.rank[source] < self.rank[gate]:
+            self._touch(gate)
+            return
+        self._update([gate])
+
+    # Called after a gate was removed along with its connections.  fanout names the gates it drove.
+    def remove_gate(self, name : str, fanout : list) -> None:
+        for source in self.incoming.pop(name):
+            if source in self.fanout and source != name:
+                self.fanout[source] = [entry for entry in self.fanout[source] if entry[3] != name]
+                self._touch(source)
+        self.fanout.pop(name)
+
+        self._place(name, None, set())
+        self._trim()
+
+        for gate in fanout:
+            if gate != name:
+                self.incoming[gate].pop(name, None)
+        self._update([gate for gate in fanout if gate != name])
+
+    # Levelizes the fan-out cone of the seed gates again.  A gate in the cone is placed once all of
+    # its input pins are driven, its drivers outside the cone are scheduled and its drivers inside
+    # the cone have been placed, one level above its deepest driver.
+    def _update(self, seeds : list) -> None:
+        region = {}
+        for seed in seeds:
+            stack = [seed]
+            while stack:
+                name = stack.pop()
+                if name not in region and name in self._gates:
+                    region[name] = None
+                    stack.extend(self._connections[name])
+
+        remaining = {name: sum(len(connection) for source, connection in self.incoming[name].items() if source in region)
+                     for name in region}
+
+        def ready(name):
+            driven = set()
+            for source, connection in self.incoming[name].items():
+                if source not in region and source not in self.rank:
+                    return False
+                driven.update(conn.i_pin for conn in connection)
+            return driven.issuperset(self._gates[name].inputs.pins)
+
+        ranks = {}
+        queue = collections.deque(name for name in region if remaining[name] == 0 and ready(name))
+        while queue:
+            name = queue.popleft()
+            ranks[name] = 1 + max((ranks[source] if source in region else self.rank[source] for source in self.incoming[name]), default=-1)
+            for gate, connection in self._connections[name].items():
+                if gate in region:
+                    remaining[gate] -= len(connection)
+                    if remaining[gate] == 0 and ready(gate):
+                        queue.append(gate)
+
+        # Place every gate first, in the order they were levelized, so that the gates reading a gate
+        # with a new slot are recompiled
+        slotted = set()
+        moved = [name for name in list(ranks) + [name for name in region if name not in ranks]
+                 if self._place(name, ranks.get(name), slotted)]
+        for name in list(seeds) + moved:
+            self._touch(name)
+        for name in region:
+            if name in self.rank and any(source in slotted for source in self.incoming[name]):
+                self._touch(name)
+        self._trim()
+
+    # Moves a gate to a new level, or off the schedule when level is None.  Gates that are scheduled
+    # again get a new slot and are added to slotted.  Returns whether the level changed.
+    def _place(self, name : str, level, slotted : set) -> bool:
+        old = self.rank.get(name)
+        if old == level:
+            return False
+
+        if old is not None:
+            del self.rank[name]
+            del self.levels[old][name]
+            chunk = self._chunk.pop(name)
+            del chunk.names[name]
+            if chunk.names:
+                self._dirty.add(chunk)
+            else:
+                self._chunks[old].remove(chunk)
+                self._dirty.discard(chunk)
+                self._program = None
+
+        if level is None:
+            self._free.append(self._slots.pop(name))
+            return True
+
+        if name not in self._slots:
+            if self._free:
+                self._slots[name] = self._free.pop()
+            else:
+                self._slots[name] = len(self.values)
+                self.values.append(0)
+            slotted.add(name)
+
+        while len(self.levels) <= level:
+            self.levels.append({})
+            self._chunks.append([])
+        self.rank[name] = level
+        self.levels[level][name] = None
+
+        chunks = self._chunks[level]
+        if not chunks or len(chunks[-1].names) >= CHUNK_SIZE:
+            chunks.append(Chunk(level))
+            self._program = None
+        chunks[-1].names[name] = None
+        self._chunk[name] = chunks[-1]
+        self._dirty.add(chunks[-1])
+        return True
+
+    # Drops the empty levels left at the top after gates moved down or off the schedule
+    def _trim(self) -> None:
+        while self.levels and not self.levels[-1]:
+            self.levels.pop()
+            self._chunks.pop()
+
+    # Marks the chunk holding a gate for recompilation
+    def _touch(self, name : str) -> None:
+        if name in self._chunk:
+            self._dirty.add(self._chunk[name])
+
+    # Generates and compiles the function of one chunk.  Switches are read straight from their gate
+    # and structurally identical gates in the chunk are assigned from the first one.
+    def _compile(self, chunk : Chunk) -> None:
+        namespace = {}
+        hashed = {}
+        writeback = []
+        lines = ["def chunk(mask, zero, v):"]
+
+        for name in chunk.names:
+            gate = self._gates[name]
+            slot = self._slots[name]
+
+            if gate.op == "SWITCH":
+                namespace[f"g{slot}"] = gate
+                expression = f"g{slot}.value"
+            elif gate.op == "VCC":
+                expression = "mask"
+            elif gate.op == "GND":
+                expression = "zero"
+            elif gate.op in ("AND", "OR", "XOR", "NOT", "NAND", "NOR", "XNOR"):
+                drivers = {conn.i_pin: source for source, connection in self.incoming[name].items() for conn in connection}
+                terms = sorted(f"v[{self._slots[drivers[pin]]}]" for pin in compiler.operand_pins(gate.op, gate.inputs.pins))
+                key = (gate.op, tuple(terms))
+                if key in hashed:
+                    expression = hashed[key]
+                else:
+                    hashed[key] = f"v[{slot}]"
+                    expression = compiler.generate_expression(gate.op, terms)
+            else:
+                raise ValueError(f"Cannot compile gate {name} with operation {gate.op}")
+
+            lines.append(f"    v[{slot}] = {expression}  # {name!r}")
+
+            outputs = gate.outputs.pins
+            writeback.extend((outputs, pin, slot) for pin in outputs)
+            writeback.extend((inputs, i_pin, slot) for inputs, _, i_pin, _ in self.fanout[name])
+
+        chunk.source = '\n'.join(lines) + '\n'
+        exec(compile(chunk.source, "<chunk>", "exec"), namespace)
+        chunk.function = namespace["chunk"]
+        chunk.writeback = writeback
+
+    # Recompiles the dirty chunks and returns the (function, writeback) of every chunk in level order
+    def program(self) -> list:
+        for chunk in list(self._dirty):
+            self._compile(chunk)
+            self._dirty.discard(chunk)
+            self._program = None
+
+        if self._program is None:
+            self._program = [(chunk.function, chunk.writeback) for chunks in self._chunks for chunk in chunks]
+        return self._program
+
+    # Evaluates every scheduled gate for a single vector and copies the values back onto the gates
+    def run(self) -> None:
+        values = self.values
+        for function, writeback in self.program():
+            function(1, 0, values)
+            for pins, pin, slot in writeback:
+                pins[pin] = values[slot]
+
+    # Returns the current value of a scheduled gate
+    def value(self, name : str) -> int:
+        return self.values[self._slots[name]]
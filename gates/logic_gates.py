@@ -1,41 +1,90 @@
 from cgi import test
+import asyncio
 import collections
 import threading
 import time
 from typing import Type
+from gates import bitsim
+from gates import compiler
+from gates import parallel
+from gates.incremental import IncrementalCircuit
+from gates.netlist import CompactNetlist
+from gates.profiling import Profiler
 
 Pin = collections.namedtuple("Pin", ('name', 'status'))
 GatePin = collections.namedtuple("GatePin", ('gate', 'pin'))
 PinConnection = collections.namedtuple("PinConnection", ('o_pin', 'i_pin'))
-
-tlock = threading.Lock()
-clock_cycles = -1;
-pulse_count = 0;
+Schedule = collections.namedtuple("Schedule", ('levels', 'order', 'rank', 'fanout', 'dead'))
+NetGate = collections.namedtuple("NetGate", ('name', 'op', 'fanin'))
+TruthTable = collections.namedtuple("TruthTable", ('inputs', 'outputs', 'columns'))
+RunStats = collections.namedtuple("RunStats", ('cycles', 'elapsed', 'cycles_per_second'))
+ClockStats = collections.namedtuple("ClockStats", ('pulses', 'elapsed', 'achieved_frequency', 'max_jitter', 'overruns', 'skipped'))
+ValidationReport = collections.namedtuple("ValidationReport", ('loops', 'undriven', 'blocked'))
 
 # TODO: Convert this to a django model
 
 """
 Clock class to send a pulse through the logic gates at a specified frequency.
+Pulses are handed to the scanner through a condition variable, so the scanner
+sleeps until a pulse arrives.  A pulse sent while the previous one has not been
+acknowledged yet is coalesced into it and counted as missed.
+
+All of the run state lives on the clock itself, so every LogicGateManager with
+its own clock can run at the same time as the others.  The clock can be run
+again once a run has finished.  It is not a thread itself: start_clock runs it
+on a new thread for every run, and a ClockScheduler only reads its frequency.
+
+Pulses are scheduled against absolute deadlines on time.monotonic_ns, so the time
+spent running the circuit does not add up as drift.  When the clock falls a whole
+period or more behind, the "catch_up" policy sends the late pulses back to back
+while the "skip" policy drops the deadlines that were missed and stays on the
+original beat.  Statistics for the last run are available from stats.
 
 Defaults to 1 Hz
 """
-class Clock(threading.Thread):
-    def __init__(self, frequency = 1) -> None:
-        super().__init__()
+class Clock:
+    POLICIES = ("catch_up", "skip")
+
+    def __init__(self, frequency = 1, policy : str = "catch_up") -> None:
         self._clock = None
-        self._frequency = frequency
+        self.frequency = frequency
+        self.policy = policy
+        self._stats = ClockStats(0, 0.0, 0.0, 0.0, 0, 0)
+        self._cycles = -1
         self._send_pulse = 0
+        self._missed_pulses = 0
+        self._finished = False
+        self._condition = threading.Condition(threading.Lock())
 
     @property
     def frequency(self):
         return self._frequency
 
     @frequency.setter
-    def frequency(self, frequency : int) -> None:
-        if(type(frequency) != int):
-            raise TypeError(f"Frequency can only be of type int, not {type(frequency)}")
+    def frequency(self, frequency : float) -> None:
+        if(type(frequency) not in (int, float)):
+            raise TypeError(f"Frequency can only be of type int or float, not {type(frequency)}")
+        if(frequency <= 0):
+            raise ValueError(f"Frequency must be positive, not {frequency}")
         self._frequency = frequency
 
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    @policy.setter
+    def policy(self, policy : str) -> None:
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown clock policy {policy}, must be one of {self.POLICIES}")
+        self._policy = policy
+
+    # Statistics of the last run: pulses sent, seconds from start to the last pulse, achieved
+    # frequency, the largest delay of a pulse past its deadline in seconds, the number of pulses
+    # that were a whole period or more late and the number of deadlines dropped by the skip policy
+    @property
+    def stats(self) -> ClockStats:
+        return self._stats
+
     @property
     def send_pulse(self) -> int:
         return self._send_pulse
@@ -44,15 +93,74 @@ class Clock(threading.Thread):
     def send_pulse(self, pulse):
         self._send_pulse = pulse
 
-    def run(self):
-        global clock_cycles
+    # Number of pulses that were coalesced because the previous pulse was still pending
+    @property
+    def missed_pulses(self) -> int:
+        return self._missed_pulses
+
+    # Number of cycles the clock still has to send
+    @property
+    def cycles(self) -> int:
+        return self._cycles
+
+    # Prepares the clock for a new run of the given number of cycles
+    def reset(self, cycles : int) -> None:
+        with self._condition:
+            self._cycles = cycles
+            self._send_pulse = 0
+            self._missed_pulses = 0
+            self._finished = False
+
+    # Blocks until a pulse is sent and acknowledges it.  Returns False once the clock has
+    # finished and there are no pulses left to acknowledge.
+    def wait_for_pulse(self) -> bool:
+        with self._condition:
+            while not self._send_pulse and not self._finished:
+                self._condition.wait()
+
+            if not self._send_pulse:
+                return False
+            self._send_pulse = 0
+            return True
 
-        while(clock_cycles > 0):
-            time.sleep(1/self._frequency)
-            with tlock:
+    def run(self):
+        period = max(1, round(1e9 / self._frequency))
+        start = time.monotonic_ns()
+        deadline = start + period
+        now = start
+        pulses = overruns = skipped = max_jitter = 0
+
+        while(self._cycles > 0):
+            now = time.monotonic_ns()
+            if now < deadline:
+                time.sleep((deadline - now) / 1e9)
+                now = time.monotonic_ns()
+
+            late = now - deadline
+            max_jitter = max(max_jitter, late)
+            if late >= period:
+                overruns += 1
+
+            with self._condition:
+                if self._send_pulse:
+                    self._missed_pulses += 1
                 self._send_pulse = 1;
-            if(clock_cycles >= 0):
-                clock_cycles -= 1
+                self._cycles -= 1
+                self._condition.notify_all()
+            pulses += 1
+
+            # Skipping keeps the next deadline on the original beat instead of replaying missed ones
+            if self._policy == "skip" and late >= period:
+                skipped += late // period
+                deadline += (late // period) * period
+            deadline += period
+
+        elapsed = (now - start) / 1e9
+        self._stats = ClockStats(pulses, elapsed, pulses / elapsed if elapsed > 0 else 0.0, max_jitter / 1e9, overruns, skipped)
+
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
 
         self._clock = None
         
@@ -138,6 +246,9 @@ Logic gates are only aware of their own inputs and produce the corresponding out
 An external manager will control signal and clock cycle management.
 '''
 class LogicGate:
+    # The primitive operation the gate implements, used by the bit-parallel simulators
+    op = None
+
     def __init__(self, type : str, name : str, inputs : list = [], outputs : list = []) -> None:
         self._type = type
         self._name = name
@@ -181,6 +292,11 @@ class LogicGate:
         for i in inputs:
             self._inputs += i
 
+    # Removes a set of pins from the input
+    def remove_inputs(self, inputs : list):
+        for i in inputs:
+            self._inputs -= i
+
     # Sets a pin in the input
     def set_input(self, name : str, val : int = 1):
         self._inputs[name] = val
@@ -204,6 +320,8 @@ Class to implement the AND gate.
 Can support an arbitrary number of inputs into 1 output.
 '''
 class ANDGate(LogicGate):
+    op = "AND"
+
     def __init__(self, type: str, name: str, inputs: list = ['A', 'B'], outputs: list = ['O']) -> None:
         super().__init__(type, name, inputs, outputs)
 
@@ -223,6 +341,8 @@ Class to implement the OR gate.
 Can support an arbitrary number of inputs into 1 output.
 '''
 class ORGate(LogicGate):
+    op = "OR"
+
     def __init__(self, type: str, name: str, inputs: list = ['A', 'B'], outputs: list = ['O']) -> None:
         super().__init__(type, name, inputs, outputs)
 
@@ -242,6 +362,8 @@ Class to implement the XOR gate.
 Can support 2 inputs into 1 output.
 '''
 class XORGate(LogicGate):
+    op = "XOR"
+
     def __init__(self, type: str, name: str, inputs: list = ['A', 'B'], outputs: list = ['O']) -> None:
         super().__init__(type, name, inputs, outputs)
 
@@ -254,6 +376,8 @@ Class to implement the NOT gate.
 Can support 1 input into 1 output.
 '''
 class NOTGate(LogicGate):
+    op = "NOT"
+
     def __init__(self, type: str, name: str, inputs: list = ['A'], outputs: list = ['O']) -> None:
         super().__init__(type, name, inputs, outputs)
 
@@ -267,6 +391,8 @@ Class to implement the NAND gate.
 Can support an arbitrary number of inputs into 1 output.
 '''
 class NANDGate(ANDGate, LogicGate):
+    op = "NAND"
+
     def __init__(self, type: str, name: str, inputs: list = ['A', 'B'], outputs: list = ['O']) -> None:
         super().__init__(type, name, inputs, outputs)
 
@@ -280,6 +406,8 @@ Class to implement the NOR gate.
 Can support an arbitrary number of inputs into 1 output.
 '''
 class NORGate(ORGate, LogicGate):
+    op = "NOR"
+
     def __init__(self, type: str, name: str, inputs: list = ['A', 'B'], outputs: list = ['O']) -> None:
         super().__init__(type, name, inputs, outputs)
 
@@ -293,6 +421,8 @@ Class to implement the XNOR gate.
 Can support 2 inputs into 1 output.
 '''
 class XNORGate(XORGate, LogicGate):
+    op = "XNOR"
+
     def __init__(self, type: str, name: str, inputs: list = ['A', 'B'], outputs: list = ['O']) -> None:
         super().__init__(type, name, inputs, outputs)
 
@@ -304,6 +434,8 @@ class XNORGate(XORGate, LogicGate):
 VCC source.  Always outputs a high signal
 """
 class VCC(LogicGate):
+    op = "VCC"
+
     def __init__(self, type: str, name: str, inputs: list = [], outputs: list = ['O']) -> None:
         if len(inputs) > 0:
             raise LogicGateManagerException(f"VCC gate does not take any inputs")
@@ -317,6 +449,8 @@ class VCC(LogicGate):
 GND source.  Always outputs a low signal
 """
 class GND(LogicGate):
+    op = "GND"
+
     def __init__(self, type: str, name: str, inputs: list = [], outputs: list = ['O']) -> None:
         if len(inputs) > 0:
             raise LogicGateManagerException(f"GND gate does not take any inputs")
@@ -326,6 +460,33 @@ class GND(LogicGate):
     def _logic(self, *args, **kwargs) -> None:
         self._outputs['O'] = 0
 
+"""
+Switch source.  Outputs whatever value it was last set to, which makes it the
+circuit's way of taking external input.  Defaults to a low signal
+"""
+class Switch(LogicGate):
+    op = "SWITCH"
+
+    def __init__(self, type: str, name: str, inputs: list = [], outputs: list = ['O'], value : int = 0) -> None:
+        if len(inputs) > 0:
+            raise LogicGateManagerException(f"Switch gate does not take any inputs")
+
+        super().__init__(type, name, inputs, outputs)
+        self.value = value
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    @value.setter
+    def value(self, value : int) -> None:
+        if value not in (0, 1):
+            raise LogicGateManagerException(f"A switch cannot be set to value {value}. Must be 0 or 1")
+        self._value = value
+
+    def _logic(self, *args, **kwargs) -> None:
+        self._outputs['O'] = self._value
+
 """
 Custom exception type for errors with PinCollections
 """
@@ -333,6 +494,15 @@ class LogicGateManagerException(Exception):
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
 
+"""
+Raised when a circuit has feedback loops or undriven input pins.  The ValidationReport
+describing every problem is kept in report.
+"""
+class CircuitValidationException(LogicGateManagerException):
+    def __init__(self, report : ValidationReport, *args: object) -> None:
+        self.report = report
+        super().__init__(*args)
+
 
 """
 Class that manages a collection of LogicGates.  LogicGate connections are stored
@@ -344,18 +514,43 @@ it in a database easier than the logical connections.  The connection mapping ca
 also be used to re-create the logical connections.
 """
 class LogicGateManager:
-    def __init__(self) -> None:
+    ENGINES = ("sweep", "levelized", "event", "compiled")
+
+    def __init__(self, engine : str = "sweep", strict : bool = False) -> None:
         self._gateMapper = {}
         self._gateKeeper = {}
         self._clock = None
+        self._schedule = None
+        self._netlist = None
+        self._compiled = None
+        self._incremental = None
+        self._pending = None
+        self._pulse_count = 0
+        self._cycle = 0
+        self._pulse_hooks = []
+        self._validation = None
+        self._profiler = None
+        self.engine = engine
+        self.strict = strict
 
     @property
     def connections(self) -> dict:
         return self._gateMapper
 
     @property
-    def clock(self) -> list:
-        return self._clocks
+    def engine(self) -> str:
+        return self._engine
+
+    @engine.setter
+    def engine(self, engine : str) -> None:
+        if engine not in self.ENGINES:
+            raise LogicGateManagerException(f"Unknown simulation engine {engine}, must be one of {self.ENGINES}")
+        self._engine = engine
+        self._pending = None
+
+    @property
+    def clock(self) -> Clock:
+        return self._clock
 
     @clock.setter
     def clock(self, clock : Clock):
@@ -363,21 +558,83 @@ class LogicGateManager:
             raise TypeError(f"A clock must be of type Clock, not {type(clock)}")
         self._clock = clock
 
-    # Method to run the circuit simulator. 
+    # Method to run the circuit simulator with the selected engine.  In strict mode a bad circuit
+    # raises instead of running; the validation is cached until the circuit changes.
     def _run_logic(self):
+        if self.strict:
+            self.validate()
+
+        profiler = self._profiler
+        if profiler is None:
+            self._run_engine()
+        else:
+            start = time.perf_counter()
+            passes = self._run_engine()
+            profiler._record_pulse(passes, time.perf_counter() - start)
+
+        cycle = self._cycle
+        self._cycle += 1
+        for hook in self._pulse_hooks:
+            hook(self, cycle)
+
+    # Runs one pulse with the selected engine and returns the number of passes it made over the circuit
+    def _run_engine(self) -> int:
+        if self._engine == "levelized":
+            self._run_levelized()
+        elif self._engine == "event":
+            self._run_event()
+        elif self._engine == "compiled":
+            self._run_compiled()
+        else:
+            return self._run_sweep()
+        return 1
+
+    # Starts profiling every pulse the manager runs, returning the Profiler.  Use it as a context
+    # manager or stop it, then read its report().  Only one profiler can run at a time.
+    def profile(self) -> Profiler:
+        if self._profiler is not None:
+            raise LogicGateManagerException(f"This LogicGateManager is already being profiled")
+        return Profiler(self)
+
+    # Adds a function called after every pulse with the manager and the number of the pulse,
+    # counting every pulse the manager has run from 0.  Used by recorders to sample the gates.
+    def add_pulse_hook(self, hook) -> None:
+        self._pulse_hooks = self._pulse_hooks + [hook]
+
+    def remove_pulse_hook(self, hook) -> None:
+        if hook not in self._pulse_hooks:
+            raise LogicGateManagerException(f"{hook} is not a pulse hook of this LogicGateManager")
+        self._pulse_hooks = [other for other in self._pulse_hooks if other != hook]
+
+    # Number of pulses the manager has run since it was created
+    @property
+    def cycle(self) -> int:
+        return self._cycle
+
+    # Runs the circuit by sweeping every gate until all of the gate inputs are satisfied.  Gates can
+    # only become ready when another gate runs for the first time, so the sweep stops as soon as a
+    # pass runs no new gates.  Circuits with loops or undriven pins stop after a pass over the gates
+    # that can run, instead of sweeping until a fixed limit.  Returns the number of passes.
+    def _run_sweep(self) -> int:
         complete = False
-        limiter = 1000
-        counter = 0
+        progress = True
+        fired = set()
+        passes = 0
 
         # Continue to run the circuit until all of the circuit inputs are satisfied
-        while not complete and counter < limiter:
+        while not complete and progress:
             complete = True
+            progress = False
+            passes += 1
 
             # Go through all of the gates in the circuit and run their logic if all input
             # pins were satisfied
             for name, gate in self._gateKeeper.items():
                 if all(gate.inputs.get_all_setpins()):
                     gate._logic()
+                    if name not in fired:
+                        fired.add(name)
+                        progress = True
 
                     # Gather the gate's output gate and pin connections and send the signal
                     # to those gates (either 0 or 1, depending on the output pin)
@@ -389,69 +646,505 @@ class LogicGateManager:
                 else:
                     complete = False
 
-            # "Runaway" limiter for circuits that will never satisfy all inputs
-            counter += 1
-
         # Clear all of the input and output satisfied flags
         for name, gate in self._gateKeeper.items():
             gate.inputs.clear_all_setpins()
             gate.outputs.clear_all_setpins()
 
-    # Method to scan for an active clock pulse. Should be put in a thread
+        return passes
+
+    # Runs the circuit by evaluating each gate exactly once in level order.  Gates that would
+    # never have their inputs satisfied (undriven pins or feedback loops) are skipped, the same
+    # as the sweep engine leaves them untouched.
+    def _run_levelized(self):
+        schedule = self._get_schedule()
+        gates = self._gateKeeper
+
+        for name in schedule.order:
+            gate = gates[name]
+            gate._logic()
+
+            outputs = gate.outputs.pins
+            for inputs, o_pin, i_pin, _ in schedule.fanout[name]:
+                inputs[i_pin] = outputs[o_pin]
+
+    # Runs only the gates whose inputs changed since the last pulse.  The first pulse after the
+    # circuit changes evaluates everything, after that a gate is queued when a switch feeding it
+    # is flipped or when a driving gate writes a different value into one of its input pins.
+    # Gates are drained level by level so each one is evaluated at most once per pulse.
+    # Returns the number of gates that were evaluated.
+    def _run_event(self) -> int:
+        schedule = self._get_schedule()
+        gates = self._gateKeeper
+        rank = schedule.rank
+
+        if self._pending is None:
+            pending = schedule.order
+        else:
+            pending = [name for name in self._pending if name in rank]
+        self._pending = set()
+
+        buckets = [[] for _ in schedule.levels]
+        queued = set(pending)
+        for name in pending:
+            buckets[rank[name]].append(name)
+
+        evaluated = 0
+        for bucket in buckets:
+            for name in bucket:
+                gate = gates[name]
+                gate._logic()
+                evaluated += 1
+
+                outputs = gate.outputs.pins
+                for inputs, o_pin, i_pin, fanout in schedule.fanout[name]:
+                    value = outputs[o_pin]
+                    if inputs[i_pin] != value:
+                        inputs[i_pin] = value
+                        # Gates with an undriven pin or in a loop have no rank and are never run
+                        if fanout not in queued and fanout in rank:
+                            queued.add(fanout)
+                            buckets[rank[fanout]].append(fanout)
+
+        return evaluated
+
+    # Runs the circuit through its incrementally compiled chunks, which copy the results back onto
+    # the gates' output pins and the input pins they drive, so the gates read the same as with the
+    # other engines.  Only the chunks an edit touched are recompiled before the pulse.
+    def _run_compiled(self):
+        try:
+            self._get_incremental().run()
+        except ValueError as e:
+            raise LogicGateManagerException(str(e))
+
+    # Returns the word for every source gate of the compiled function, taking forced words first
+    # and falling back to the gate's own value
+    def _source_words(self, compiled : compiler.CompiledCircuit, words : dict, mask) -> list:
+        sources = []
+        for name in compiled.sources:
+            if name in words:
+                sources.append(words[name])
+                continue
+
+            gate = self._gateKeeper[name]
+            if gate.op == "VCC" or (gate.op == "SWITCH" and gate.value):
+                sources.append(mask)
+            else:
+                sources.append(mask ^ mask)
+        return sources
+
+    # Returns the circuit compiled into a single generated Python function.  The function is cached
+    # until the next add_gate, add_connection or remove_gate.
+    def compile(self) -> compiler.CompiledCircuit:
+        if self._compiled is None:
+            try:
+                self._compiled = compiler.compile_netlist(self._get_netlist())
+            except ValueError as e:
+                raise LogicGateManagerException(str(e))
+        return self._compiled
+
+    # Returns the cached schedule, building it from the incrementally maintained levels if the
+    # circuit changed since it was last built
+    def _get_schedule(self) -> Schedule:
+        if self._schedule is None:
+            incremental = self._get_incremental()
+            levels = [list(level) for level in incremental.levels]
+            order = [name for level in levels for name in level]
+            dead = [name for name in self._gateKeeper if name not in incremental.rank]
+            self._schedule = Schedule(levels, order, incremental.rank, incremental.fanout, dead)
+        return self._schedule
+
+    # Returns the incremental levelization and compiled chunks, building them from scratch after
+    # the circuit was changed without going through add_gate, add_connection or remove_gate
+    def _get_incremental(self) -> IncrementalCircuit:
+        if self._incremental is None:
+            self._incremental = IncrementalCircuit(self._gateKeeper, self._gateMapper)
+        return self._incremental
+
+    # Drops everything that was derived from the current circuit layout
+    def _invalidate(self) -> None:
+        self._incremental = None
+        self._changed()
+
+    # Drops the caches that are rebuilt in full after an edit.  The incremental levelization and
+    # compiled chunks are kept, as the edit methods update them in place.
+    def _changed(self) -> None:
+        self._schedule = None
+        self._netlist = None
+        self._compiled = None
+        self._pending = None
+        self._validation = None
+
+    # Returns the gate names grouped by topological level, starting with the gates that have no inputs
+    def levelize(self) -> list:
+        return self._get_schedule().levels
+
+    # Returns the cached netlist, flattening the schedule if the circuit changed since it was last built
+    def _get_netlist(self) -> list:
+        if self._netlist is None:
+            self._netlist = self._build_netlist()
+        return self._netlist
+
+    # Flattens the scheduled gates into (name, op, fanin) records where fanin holds the name of the
+    # gate driving each pin the operation reads.  Every output pin of a gate carries the same value.
+    def _build_netlist(self) -> list:
+        drivers = {}
+        for name, connections in self._gateMapper.items():
+            for gate, connection in connections.items():
+                for conn in connection:
+                    drivers[(gate, conn.i_pin)] = name
+
+        netlist = []
+        for name in self._get_schedule().order:
+            gate = self._gateKeeper[name]
+            if gate.op is None:
+                raise LogicGateManagerException(f"Gate {name} ({gate.type}) has no primitive operation to simulate")
+
+            pins = compiler.operand_pins(gate.op, gate.inputs.pins)
+            netlist.append(NetGate(name, gate.op, tuple(drivers[(name, pin)] for pin in pins)))
+
+        return netlist
+
+    # Returns a struct-of-arrays copy of the scheduled gates, see gates.netlist
+    def compact(self) -> CompactNetlist:
+        return CompactNetlist.from_manager(self)
+
+    # Returns the names of the scheduled gates that do not drive any other gate
+    def sinks(self) -> list:
+        return [name for name in self._get_schedule().order if not self._gateMapper[name]]
+
+    # Checks the circuit for feedback loops and undriven input pins in O(V+E).  loops lists each
+    # strongly connected component of gates as a list of names, undriven lists the GatePins that
+    # nothing connects to and blocked lists the other gates that never run because of them.
+    # Raises a CircuitValidationException when raise_errors is set and anything is wrong,
+    # otherwise returns the ValidationReport.
+    def validate(self, raise_errors : bool = True) -> ValidationReport:
+        if self._validation is None:
+            loops = self._find_loops()
+            undriven = self._find_undriven()
+
+            causes = {name for loop in loops for name in loop} | {pin.gate for pin in undriven}
+            blocked = [name for name in self._get_schedule().dead if name not in causes]
+            self._validation = ValidationReport(loops, undriven, blocked)
+
+        report = self._validation
+        if raise_errors and (report.loops or report.undriven):
+            problems = [f"feedback loop through {', '.join(loop)}" for loop in report.loops]
+            problems += [f"input pin {pin.pin} of {pin.gate} is not driven" for pin in report.undriven]
+            raise CircuitValidationException(report, "Invalid circuit: " + "; ".join(problems))
+        return report
+
+    # Finds the strongly connected components of the connection mapping that form a loop, using an
+    # iterative version of Tarjan's algorithm so deep circuits do not hit the recursion limit
+    def _find_loops(self) -> list:
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        loops = []
+
+        for root in self._gateMapper:
+            if root in index:
+                continue
+
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._gateMapper[root]))]
+
+            while work:
+                name, fanout = work[-1]
+                for gate in fanout:
+                    if gate not in index:
+                        index[gate] = lowlink[gate] = len(index)
+                        stack.append(gate)
+                        on_stack.add(gate)
+                        work.append((gate, iter(self._gateMapper[gate])))
+                        break
+                    if gate in on_stack:
+                        lowlink[name] = min(lowlink[name], index[gate])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[name])
+
+                    # name is the root of a component, which is a loop if it has more than one gate
+                    # or a gate connected to itself
+                    if lowlink[name] == index[name]:
+                        component = []
+                        while True:
+                            gate = stack.pop()
+                            on_stack.discard(gate)
+                            component.append(gate)
+                            if gate == name:
+                                break
+                        if len(component) > 1 or name in self._gateMapper[name]:
+                            loops.append(component[::-1])
+
+        return loops
+
+    # Lists the GatePin of every input pin that no connection drives
+    def _find_undriven(self) -> list:
+        driven = set()
+        for connections in self._gateMapper.values():
+            for gate, connection in connections.items():
+                driven.update((gate, conn.i_pin) for conn in connection)
+
+        return [GatePin(name, pin) for name, gate in self._gateKeeper.items()
+                for pin in gate.inputs.pins if (name, pin) not in driven]
+
+    # Evaluates the circuit on bit-parallel words, one bit per input vector.  words maps gate names
+    # to the word their output is forced to and mask is the all-ones word.  Switches that are not
+    # forced keep their current value.  Returns the words of the requested output gates.
+    def simulate_words(self, words : dict, mask, outputs : list = None) -> dict:
+        netlist = self._get_netlist()
+        outputs = self.sinks() if outputs is None else outputs
+
+        for name in list(words) + list(outputs):
+            if name not in self._gateKeeper:
+                raise LogicGateManagerException(f"A gate with the name {name} does not exist")
+        schedule = self._get_schedule()
+        for name in outputs:
+            if name not in schedule.rank:
+                raise LogicGateManagerException(f"Gate {name} never has all of its inputs driven")
+
+        # Forcing a gate that is not a source needs the interpreter, everything else runs compiled
+        compiled = self.compile()
+        if all(self._gateKeeper[name].op in compiler.SOURCE_OPS for name in words):
+            values = compiled.function(mask, self._source_words(compiled, words, mask))
+            return {name: values[compiled.index[name]] for name in outputs}
+
+        words = dict(words)
+        for name, op, _ in netlist:
+            if op == "SWITCH" and name not in words:
+                words[name] = mask if self._gateKeeper[name].value else mask ^ mask
+
+        values = bitsim.evaluate(netlist, words, mask)
+        return {name: values[name] for name in outputs}
+
+    # Simulates a batch of input vectors in a single bit-parallel pass.  inputs names the gates
+    # (usually switches) whose output each vector position drives.  Returns one tuple of output
+    # values per vector.  With use_numpy the vectors are packed into NumPy uint64 arrays instead
+    # of Python ints.
+    def simulate_batch(self, inputs : list, vectors, outputs : list = None, use_numpy : bool = False) -> list:
+        outputs = self.sinks() if outputs is None else outputs
+        words, mask, count = bitsim.pack(vectors, len(inputs), use_numpy)
+        values = self.simulate_words(dict(zip(inputs, words)), mask, outputs)
+        return bitsim.unpack([values[name] for name in outputs], count)
+
+    # Simulates a large set of vectors across worker processes.  The circuit is compiled once and
+    # its generated source is sent to every worker, then the vectors, which can be any iterable,
+    # stream through the pool chunk_size at a time.  inputs names the source gates (usually
+    # switches) each vector position drives.  processes is the number of worker processes, with 1
+    # simulating in this process.  Returns one tuple of output values per vector in order, or when
+    # a sink is given, calls it with the list of output tuples of each chunk in order and returns
+    # the number of vectors simulated.
+    def simulate_many(self, inputs : list, vectors, outputs : list = None, chunk_size : int = 4096,
+                      processes : int = None, sink = None):
+        outputs = self.sinks() if outputs is None else outputs
+        compiled = self.compile()
+
+        for name in list(inputs) + list(outputs):
+            if name not in compiled.index:
+                raise LogicGateManagerException(f"Gate {name} is not a scheduled gate of this circuit")
+        for name in inputs:
+            if self._gateKeeper[name].op not in compiler.SOURCE_OPS:
+                raise LogicGateManagerException(f"Gate {name} is not a switch, VCC or GND gate and cannot be driven by a vector")
+        if chunk_size < 1:
+            raise LogicGateManagerException(f"Cannot simulate chunks of {chunk_size} vectors")
+
+        positions = [inputs.index(name) if name in inputs else None for name in compiled.sources]
+        defaults = self._source_words(compiled, {}, 1)
+        circuit = (compiled.source, len(inputs), positions, defaults, [compiled.index[name] for name in outputs])
+
+        results = parallel.simulate(circuit, vectors, chunk_size, processes)
+        if sink is None:
+            return [values for chunk in results for values in chunk]
+
+        count = 0
+        for chunk in results:
+            sink(chunk)
+            count += len(chunk)
+        return count
+
+    # Method to scan for an active clock pulse. Should be put in a thread.  Sleeps until the
+    # clock sends a pulse, acknowledges it and runs the circuit, until the clock finishes.
     def _scan_for_pulse(self):
-        global clock_cycles, pulse_count
-
-        # If a clock pulse is detected, set it back to 0 to acknowledge it
-        while clock_cycles > 0:
-            if self._clock.send_pulse:
-                with tlock:
-                    pulse_count += 1
-                    self._clock.send_pulse = 0
-                self._run_logic()
+        while self._clock.wait_for_pulse():
+            self._pulse_count += 1
+            self._run_logic()
 
     # Start the clock and the associated scanner to scan for clock pulses. These pulses will be sent into
-    # the circuit
+    # the circuit.  The clock runs on a thread of its own each time so it can be started again.
     def start_clock(self, max_cycles = -1):
-        global clock_cycles, pulse_count
-
         if not self._clock:
             raise LogicGateManagerException(f"No clock is attached to this LogicGateManager")
 
-        clock_cycles = max_cycles
-        pulse_count = 0
+        self._clock.reset(max_cycles)
+        self._pulse_count = 0
 
         scanner = threading.Thread(target=self._scan_for_pulse, args=())
+        ticker = threading.Thread(target=self._clock.run, args=())
         scanner.start()
-        self._clock.start()
+        ticker.start()
 
-        self._clock.join()
+        ticker.join()
         scanner.join()
 
-        return pulse_count
+        return self._pulse_count
+
+    # Flips a Switch gate in the circuit and queues it for the event engine if its value changed
+    def set_switch(self, name : str, value : int) -> None:
+        switch = self._gateKeeper.get(name)
+        if not isinstance(switch, Switch):
+            raise LogicGateManagerException(f"{name} is not a switch in this circuit")
+
+        if switch.value != value:
+            switch.value = value
+            if self._pending is not None:
+                self._pending.add(name)
+
+    # Returns the truth table of the circuit over every combination of the given input gates.  Rows
+    # are numbered so that inputs[0] is the most significant bit.  By default the rows are streamed
+    # from a generator as (input values..., output values...) tuples.  With packed the whole table is
+    # returned as a TruthTable whose columns hold one int per output where bit r is the row r value.
+    # Rows are evaluated 2^chunk_bits at a time by bit-slicing the row number across the inputs.
+    def truth_table(self, inputs : list, outputs : list = None, packed : bool = False, chunk_bits : int = 12):
+        outputs = self.sinks() if outputs is None else list(outputs)
+        if chunk_bits < 3:
+            raise LogicGateManagerException(f"Truth tables need at least 8 rows per chunk, not {1 << chunk_bits}")
+
+        chunks = self._truth_table_chunks(list(inputs), outputs, chunk_bits)
+        if not packed:
+            return self._truth_table_rows(len(inputs), chunks)
+
+        parts = [[] for _ in outputs]
+        for _, width, words in chunks:
+            for part, word in zip(parts, words):
+                part.append(word.to_bytes(-(-width // 8), 'little'))
+        columns = [int.from_bytes(b''.join(part), 'little') for part in parts]
+        return TruthTable(list(inputs), outputs, columns)
+
+    # Generates (first row, row count, output words) for each chunk of the truth table
+    def _truth_table_chunks(self, inputs : list, outputs : list, chunk_bits : int):
+        count = len(inputs)
+        rows = 1 << count
+        width = min(rows, 1 << chunk_bits)
+        mask = (1 << width) - 1
+
+        # Row bits below the chunk width follow the same pattern in every chunk
+        patterns = []
+        for bit in range(min(count, chunk_bits)):
+            period = ('0' * (1 << bit) + '1' * (1 << bit)) * (width >> (bit + 1))
+            patterns.append(int(period[::-1], 2))
+
+        for base in range(0, rows, width):
+            words = {}
+            for position, name in enumerate(inputs):
+                bit = count - 1 - position
+                if bit < len(patterns):
+                    words[name] = patterns[bit]
+                else:
+                    words[name] = mask if (base >> bit) & 1 else 0
+
+            values = self.simulate_words(words, mask, outputs)
+            yield (base, width, [values[name] for name in outputs])
+
+    # Expands truth table chunks into one row tuple per input combination
+    def _truth_table_rows(self, count : int, chunks):
+        for base, width, words in chunks:
+            columns = bitsim.unpack(words, width)
+            for offset, values in enumerate(columns):
+                row = base + offset
+                yield tuple((row >> bit) & 1 for bit in range(count - 1, -1, -1)) + values
+
+    # Sends a single clock pulse through the circuit
+    def step(self) -> None:
+        self._run_logic()
+
+    # Free-running clock mode.  Steps the circuit the given number of cycles back to back on the
+    # calling thread, with no clock thread, no sleeping and no shared state.  Returns the number of
+    # cycles run, the elapsed seconds and the achieved cycles per second.
+    def run_cycles(self, cycles : int) -> RunStats:
+        if cycles < 0:
+            raise LogicGateManagerException(f"Cannot run a negative number of cycles ({cycles})")
+
+        run = self._run_logic
+        start = time.perf_counter()
+        for _ in range(cycles):
+            run()
+        elapsed = time.perf_counter() - start
+
+        return RunStats(cycles, elapsed, cycles / elapsed if elapsed > 0 else float('inf'))
 
     # Returns a LogicGate with the specified name using the LogicGateManager[key] operation
     def __getitem__(self, name : str):
         return self._gateKeeper.get(name)
 
-    # Adds a gate to the manager
+    # Adds a gate to the manager.  Replacing a gate of the same name starts the incremental
+    # levelization over, as the replaced gate's outgoing connections are dropped.
     def add_gate(self, gate) -> None:
+        replaced = gate.name in self._gateKeeper
         self._gateKeeper.update({gate.name: gate})
         self._gateMapper.update({gate.name:{}})
 
-    # Removes a gate from the manager
+        if replaced:
+            self._invalidate()
+            return
+        if self._incremental is not None:
+            self._incremental.add_gate(gate.name)
+        self._changed()
+
+    # Removes a gate from the manager along with every connection going into it
     def remove_gate(self, name):
+        # The incremental index knows which gates drive this one, without it every gate is checked
+        drivers = self._gateMapper if self._incremental is None else list(self._incremental.incoming[name])
         self._gateKeeper.pop(name)
-        self._gateMapper.pop(name)
+        fanout = list(self._gateMapper.pop(name))
+        for source in drivers:
+            if source in self._gateMapper:
+                self._gateMapper[source].pop(name, None)
+
+        if self._incremental is not None:
+            self._incremental.remove_gate(name, fanout)
+        self._changed()
 
     # Adds a connection (both logical and mapping) between two pins on gates
     def add_connection(self, output_gate : GatePin, input_gate : GatePin):
         if output_gate.gate not in self._gateMapper or input_gate.gate not in self._gateMapper:
             raise LogicGateManagerException(f"Cannot create a conneection between {output_gate.gate} and {input_gate.gate} because at least one gate does not exist")
 
+        connection = PinConnection(output_gate.pin, input_gate.pin)
         connections = self._gateMapper.get(output_gate.gate).get(input_gate.gate, [])
-        connections.append(PinConnection(output_gate.pin, input_gate.pin))
+        connections.append(connection)
         self._gateMapper[output_gate.gate].update({input_gate.gate: connections})
 
+        if self._incremental is not None:
+            self._incremental.add_connection(output_gate.gate, input_gate.gate, connection)
+        self._changed()
+
+    # Adds many gates and the connections between them at once.  connections is laid out like the
+    # connection mapping, {source gate: {destination gate: [PinConnection, ...]}}, and can also connect
+    # gates already in the manager.  The fanout dictionaries of the new gates are taken over as they
+    # are rather than copied.  The schedule is rebuilt once on the next pulse instead of being updated
+    # after every gate and connection, which makes this much faster for large circuits.
+    def add_netlist(self, gates, connections : dict) -> None:
+        gates = {gate.name: gate for gate in gates}
+        known = gates.keys() | self._gateKeeper.keys()
+        missing = (connections.keys() | set().union(*connections.values())) - known
+        if missing:
+            raise LogicGateManagerException(f"Cannot create a connection with {next(iter(missing))} because the gate does not exist")
+
+        self._gateKeeper.update(gates)
+        for name in gates:
+            self._gateMapper[name] = connections.get(name) or {}
+        for source in connections.keys() - gates.keys():
+            mapping = self._gateMapper[source]
+            for gate, connection in connections[source].items():
+                mapping.setdefault(gate, []).extend(connection)
+        self._invalidate()
+
     # Called when a LogicGateManager is printed
     def __repr__(self):
         gate_string = ''
@@ -464,3 +1157,45 @@ class LogicGateManager:
 
             gate_string += "\n"
         return gate_string
+
+"""
+Drives many LogicGateManagers from a single asyncio event loop.  Each manager is
+clocked independently at its own frequency by a coroutine that sleeps until its
+next pulse is due, instead of a clock thread and a scanner thread per manager.
+"""
+class ClockScheduler:
+    def __init__(self) -> None:
+        self._jobs = []
+
+    # Adds a manager to be clocked for max_cycles pulses.  The frequency defaults to the
+    # frequency of the clock attached to the manager.
+    def add(self, manager : LogicGateManager, max_cycles : int, frequency = None) -> None:
+        if frequency is None:
+            if not manager.clock:
+                raise LogicGateManagerException(f"No clock is attached to this LogicGateManager and no frequency was given")
+            frequency = manager.clock.frequency
+        if frequency <= 0:
+            raise LogicGateManagerException(f"Frequency must be positive, not {frequency}")
+        self._jobs.append((manager, max_cycles, frequency))
+
+    # Clocks a single manager, returning the number of pulses it received
+    async def _drive(self, manager : LogicGateManager, max_cycles : int, frequency) -> int:
+        loop = asyncio.get_running_loop()
+        period = 1 / frequency
+        deadline = loop.time()
+
+        for _ in range(max_cycles):
+            deadline += period
+            await asyncio.sleep(max(0, deadline - loop.time()))
+            manager.step()
+
+        return max(max_cycles, 0)
+
+    # Clocks every manager concurrently on the running event loop.  Returns the pulse counts
+    # in the order the managers were added.
+    async def run_async(self) -> list:
+        return list(await asyncio.gather(*(self._drive(*job) for job in self._jobs)))
+
+    # Runs the scheduler on a new event loop until every manager has finished
+    def run(self) -> list:
+        return asyncio.run(self.run_async())
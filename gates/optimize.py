@@ -0,0 +1,221 @@
+"""
+Optimization passes over the circuit held by a LogicGateManager.  Every pass edits
+the manager in place and returns an OptimizationReport.  Gates that are rewritten
+keep their name, so connections and observed outputs still line up afterwards,
+but the gate object stored under that name may be replaced.
+"""
+import collections
+
+from gates.logic_gates import (ANDGate, GND, LogicGateManager, LogicGateManagerException,
+                               NOTGate, PinConnection, VCC)
+
+OptimizationReport = collections.namedtuple("OptimizationReport", ('gates_removed', 'connections_removed', 'gates_rewritten'))
+
+# Identity input value of the gates that can drop inputs tied to it
+_IDENTITY = {"AND": 1, "NAND": 1, "OR": 0, "NOR": 0}
+
+# Folds constants through the circuit and removes the logic that does not reach an observed output.
+#   * Gates whose output is constant are replaced by a VCC or GND gate of the same name
+#   * AND/OR/NAND/NOR inputs tied to the gate's identity value are dropped
+#   * XOR/XNOR gates with one constant input become a NOT gate or a buffer
+#   * Single input AND/OR buffers that are not observed are bypassed
+#   * Gates that do not reach one of the outputs are removed, apart from switches
+# outputs defaults to the gates that do not drive any other gate.
+def fold_constants(manager : LogicGateManager, outputs : list = None) -> OptimizationReport:
+    outputs = manager.sinks() if outputs is None else list(outputs)
+    gates_before, connections_before = len(manager._gateKeeper), count_connections(manager)
+
+    netlist = manager._get_netlist()
+    drivers = _drivers(manager)
+    constant = {}
+    rewritten = 0
+
+    for name, op, fanin in netlist:
+        value = _fold(op, [constant.get(pin) for pin in fanin])
+        if value is not None:
+            constant[name] = value
+            if op not in ("VCC", "GND"):
+                source = VCC("VCC", name) if value else GND("GND", name)
+                _replace_gate(manager, drivers, name, source, {})
+                rewritten += 1
+            continue
+
+        gate = manager[name]
+        known = {pin: constant[drivers[(name, pin)][0]] for pin in gate.inputs.pins if drivers[(name, pin)][0] in constant}
+        if not known:
+            continue
+
+        if op in _IDENTITY:
+            remaining = [pin for pin in gate.inputs.pins if pin not in known]
+            for pin in known:
+                _disconnect(manager, drivers, name, pin)
+            gate.remove_inputs(known)
+            if len(remaining) == 1 and op in ("NAND", "NOR"):
+                _replace_gate(manager, drivers, name, NOTGate("NOT", name), {remaining[0]: 'A'})
+        elif op in ("XOR", "XNOR"):
+            pin, = [pin for pin in ('A', 'B') if pin not in known]
+            if sum(known.values()) ^ (op == "XNOR"):
+                _replace_gate(manager, drivers, name, NOTGate("NOT", name), {pin: 'A'})
+            else:
+                _replace_gate(manager, drivers, name, ANDGate("AND", name, [pin]), {pin: pin})
+        rewritten += 1
+
+    manager._invalidate()
+    _bypass_buffers(manager, drivers, outputs)
+    remove_dead_gates(manager, outputs)
+    manager._invalidate()
+
+    return OptimizationReport(gates_before - len(manager._gateKeeper), connections_before - count_connections(manager), rewritten)
+
+# Structural hashing.  Canonicalizes every gate by its operation, the sorted gates driving it
+# and its output pins, then merges each gate into the first gate with the same key by moving its
+# fanout connections over and removing it.  Gates reading merged gates are keyed on the gate they
+# were merged into, so whole duplicated cones collapse in one topological pass.  Switches are
+# separate inputs and observed outputs keep their name, so neither is ever merged away.
+def merge_duplicates(manager : LogicGateManager, outputs : list = None) -> OptimizationReport:
+    observed = set(manager.sinks() if outputs is None else outputs)
+    gates_before, connections_before = len(manager._gateKeeper), count_connections(manager)
+
+    drivers = _drivers(manager)
+    representative = {}
+    table = {}
+
+    for name in manager._get_schedule().order:
+        gate = manager[name]
+        if gate.op is None or gate.op == "SWITCH":
+            continue
+
+        fanin = (drivers[(name, pin)] for pin in gate.inputs.pins)
+        key = (gate.op, tuple(sorted((representative.get(source, source), o_pin) for source, o_pin in fanin)), tuple(gate.outputs.pins))
+        if key not in table:
+            table[key] = name
+            continue
+        if name in observed:
+            continue
+
+        merged = table[key]
+        representative[name] = merged
+        for fanout, connection in manager._gateMapper[name].items():
+            manager._gateMapper[merged].setdefault(fanout, []).extend(connection)
+
+    for name in representative:
+        manager._gateKeeper.pop(name)
+        manager._gateMapper.pop(name)
+    for connections in manager._gateMapper.values():
+        for name in [gate for gate in connections if gate in representative]:
+            connections.pop(name)
+    manager._invalidate()
+
+    return OptimizationReport(gates_before - len(manager._gateKeeper), connections_before - count_connections(manager), 0)
+
+# Removes every gate that is not in the fan-in cone of one of the outputs.  Switches are the
+# circuit's inputs and are always kept, even when nothing reads them any more.
+def remove_dead_gates(manager : LogicGateManager, outputs : list) -> OptimizationReport:
+    gates_before, connections_before = len(manager._gateKeeper), count_connections(manager)
+    for name in outputs:
+        if name not in manager._gateKeeper:
+            raise LogicGateManagerException(f"A gate with the name {name} does not exist")
+
+    incoming = collections.defaultdict(list)
+    for name, connections in manager._gateMapper.items():
+        for gate in connections:
+            incoming[gate].append(name)
+
+    live = set(outputs) | {name for name, gate in manager._gateKeeper.items() if gate.op == "SWITCH"}
+    stack = list(outputs)
+    while stack:
+        for name in incoming[stack.pop()]:
+            if name not in live:
+                live.add(name)
+                stack.append(name)
+
+    dead = [name for name in manager._gateKeeper if name not in live]
+    for name in dead:
+        manager._gateKeeper.pop(name)
+        manager._gateMapper.pop(name)
+    for connections in manager._gateMapper.values():
+        for name in [gate for gate in connections if gate not in live]:
+            connections.pop(name)
+    manager._invalidate()
+
+    return OptimizationReport(gates_before - len(manager._gateKeeper), connections_before - count_connections(manager), 0)
+
+# Returns the number of pin to pin connections in the circuit
+def count_connections(manager : LogicGateManager) -> int:
+    return sum(len(connection) for connections in manager._gateMapper.values() for connection in connections.values())
+
+# Returns the constant output of an operation given the constant value of each input (None when
+# unknown), or None when the output is not constant
+def _fold(op : str, values : list):
+    if op == "VCC":
+        return 1
+    if op == "GND":
+        return 0
+    if op == "SWITCH":
+        return None
+
+    if op in ("AND", "NAND"):
+        value = 0 if 0 in values else (1 if None not in values else None)
+    elif op in ("OR", "NOR"):
+        value = 1 if 1 in values else (0 if None not in values else None)
+    elif None in values:
+        value = None
+    elif op in ("XOR", "XNOR"):
+        value = sum(values) & 1
+    else:
+        value = values[0] ^ 1
+
+    if value is not None and op in ("NAND", "NOR", "XNOR"):
+        value ^= 1
+    return value
+
+# Maps every (gate, input pin) to the (gate, output pin) driving it
+def _drivers(manager : LogicGateManager) -> dict:
+    drivers = {}
+    for name, connections in manager._gateMapper.items():
+        for gate, connection in connections.items():
+            for conn in connection:
+                drivers[(gate, conn.i_pin)] = (name, conn.o_pin)
+    return drivers
+
+# Removes the connection driving an input pin
+def _disconnect(manager : LogicGateManager, drivers : dict, name : str, pin : str) -> None:
+    source, o_pin = drivers.pop((name, pin))
+    connection = [conn for conn in manager._gateMapper[source][name] if conn.i_pin != pin]
+    if connection:
+        manager._gateMapper[source][name] = connection
+    else:
+        manager._gateMapper[source].pop(name)
+
+# Swaps the gate stored under a name for another gate.  Incoming connections on the pins in
+# pins are moved to the new pin names and every other incoming connection is dropped.  Outgoing
+# connections are kept as they are.
+def _replace_gate(manager : LogicGateManager, drivers : dict, name : str, gate, pins : dict) -> None:
+    moved = {}
+    for pin in list(manager[name].inputs.pins):
+        if (name, pin) in drivers:
+            if pin in pins:
+                moved[pins[pin]] = drivers[(name, pin)]
+            _disconnect(manager, drivers, name, pin)
+
+    manager._gateKeeper[name] = gate
+    for pin, (source, o_pin) in moved.items():
+        manager._gateMapper[source].setdefault(name, []).append(PinConnection(o_pin, pin))
+        drivers[(name, pin)] = (source, o_pin)
+
+# Connects the fanout of every single input AND/OR gate straight to the gate driving it, unless
+# the buffer is one of the observed outputs
+def _bypass_buffers(manager : LogicGateManager, drivers : dict, outputs : list) -> None:
+    observed = set(outputs)
+    for name in list(manager._get_schedule().order):
+        gate = manager[name]
+        if name in observed or gate.op not in ("AND", "OR") or len(gate.inputs.pins) != 1:
+            continue
+
+        pin, = gate.inputs.pins
+        source, o_pin = drivers[(name, pin)]
+        for fanout, connection in manager._gateMapper[name].items():
+            for conn in connection:
+                manager._gateMapper[source].setdefault(fanout, []).append(PinConnection(o_pin, conn.i_pin))
+                drivers[(fanout, conn.i_pin)] = (source, o_pin)
+        manager._gateMapper[name] = {}
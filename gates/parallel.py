@@ -0,0 +1,78 @@
+"""
+Multi-process simulation of large vector sets.  The circuit is compiled once and only
+the generated source, which is a plain string, is sent to the worker processes, each of
+which compiles it again when it starts.  Vectors are cut into chunks that stream through
+a ProcessPoolExecutor, every worker packing its chunk into bit-parallel words, running
+the compiled function and unpacking the outputs.  Results come back in vector order and
+only a bounded number of chunks is in flight, so the vectors can be a generator of any
+length.
+"""
+import collections
+import concurrent.futures
+import itertools
+import os
+
+from gates import bitsim
+
+# Worker of a pool process, set when the process starts
+_worker = None
+
+"""
+Class that simulates chunks of vectors with a compiled circuit.  circuit is the tuple
+built by the manager: the compiled source, the number of values in a vector, the vector
+position driving each source gate (None for the ones that keep their own value), the
+value of every source gate and the index of every output in the compiled function's result.
+"""
+class Worker:
+    def __init__(self, circuit : tuple) -> None:
+        source, self._width, self._positions, self._defaults, self._outputs = circuit
+        namespace = {}
+        exec(compile(source, "<circuit>", "exec"), namespace)
+        self._function = namespace["circuit"]
+
+    # Simulates a chunk of vectors, returning one tuple of output values per vector
+    def run(self, vectors : list) -> list:
+        words, mask, count = bitsim.pack(vectors, self._width)
+        sources = [(mask if default else 0) if position is None else words[position]
+                   for position, default in zip(self._positions, self._defaults)]
+        values = self._function(mask, sources)
+        return bitsim.unpack([values[index] for index in self._outputs], count)
+
+# Yields the output tuples of every chunk of vectors in order.  processes is the number of worker
+# processes, with 1 running every chunk in this process, and at most backlog chunks per process
+# are queued ahead of the one being returned.
+def simulate(circuit : tuple, vectors, chunk_size : int, processes : int = None, backlog : int = 2):
+    chunks = _chunks(vectors, chunk_size)
+    if processes == 1:
+        worker = Worker(circuit)
+        for chunk in chunks:
+            yield worker.run(chunk)
+        return
+
+    limit = backlog * (processes or os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker,
+                                                initargs=(circuit,)) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_run_chunk, chunk))
+            if len(pending) >= limit:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+# Cuts an iterable of vectors into lists of chunk_size vectors
+def _chunks(vectors, chunk_size : int):
+    vectors = iter(vectors)
+    while True:
+        chunk = list(itertools.islice(vectors, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+# Pool initializer compiling the circuit once per worker process
+def _initialize_worker(circuit : tuple) -> None:
+    global _worker
+    _worker = Worker(circuit)
+
+def _run_chunk(vectors : list) -> list:
+    return _worker.run(vectors)
@@ -0,0 +1,103 @@
+"""
+Opt-in profiling of a LogicGateManager.  A Profiler collects how often every gate was
+evaluated, how often its outputs toggled and how long its _logic took, along with the
+number of passes the engine made over the circuit on every pulse and the pulse rate,
+whether the pulses come from the clock, step or run_cycles.
+
+Nothing is collected, and nothing is paid, while no profiler is running.  The engines'
+per-gate loops are never touched: starting a profiler swaps a timing wrapper in for the
+_logic method of every gate as an instance attribute and stopping it removes them again,
+so the gates go back to the plain class method.  The manager itself only checks whether
+a profiler is attached once per pulse.
+
+The compiled engine evaluates its gates in generated code instead of calling _logic, so
+with it every scheduled gate counts one evaluation per pulse and no _logic time.  Toggles
+are counted after every pulse, comparing each output pin with its value after the previous
+pulse, so every engine counts them the same way.  Gates added while a profiler is running
+are not profiled.
+"""
+import collections
+import time
+
+GateProfile = collections.namedtuple("GateProfile", ('evaluations', 'toggles', 'logic_time'))
+ProfileReport = collections.namedtuple("ProfileReport", ('pulses', 'elapsed', 'pulses_per_second', 'engine_time',
+                                                         'passes', 'gates'))
+
+"""
+Class that profiles the pulses a LogicGateManager runs from when it is created until it is
+stopped.  It is usually created through LogicGateManager.profile and used as a context
+manager.  report() can be called at any time, during or after the run.
+"""
+class Profiler:
+    def __init__(self, manager) -> None:
+        self._manager = manager
+        self._evaluations = collections.Counter()
+        self._toggles = collections.Counter()
+        self._logic_time = collections.defaultdict(float)
+        self._passes = collections.Counter()
+        self._pulses = 0
+        self._engine_time = 0.0
+
+        self._gates = dict(manager._gateKeeper)
+        self._outputs = {name: tuple(gate.outputs.pins.values()) for name, gate in self._gates.items()}
+        for name, gate in self._gates.items():
+            gate._logic = self._wrap(name, gate._logic)
+
+        self._start = time.perf_counter()
+        self._stop = None
+        manager._profiler = self
+
+    # Returns a _logic that counts and times every call of the gate's own one
+    def _wrap(self, name : str, logic):
+        evaluations = self._evaluations
+        logic_time = self._logic_time
+        clock = time.perf_counter
+
+        def profiled(*args, **kwargs):
+            start = clock()
+            logic(*args, **kwargs)
+            logic_time[name] += clock() - start
+            evaluations[name] += 1
+        return profiled
+
+    # Called by the manager after the engine ran a pulse, with the number of passes it made over the
+    # circuit and the seconds it took
+    def _record_pulse(self, passes : int, elapsed : float) -> None:
+        self._pulses += 1
+        self._engine_time += elapsed
+        self._passes[passes] += 1
+
+        if self._manager.engine == "compiled":
+            self._evaluations.update(name for name in self._manager._get_schedule().order if name in self._gates)
+
+        for name, gate in self._gates.items():
+            outputs = tuple(gate.outputs.pins.values())
+            last = self._outputs[name]
+            if outputs != last:
+                self._toggles[name] += sum(value != previous for value, previous in zip(outputs, last))
+                self._outputs[name] = outputs
+
+    # Stops profiling and puts the gates' own _logic back.  The report keeps what was collected.
+    def stop(self) -> None:
+        if self._stop is not None:
+            return
+        self._stop = time.perf_counter()
+        self._manager._profiler = None
+        for gate in self._gates.values():
+            gate.__dict__.pop('_logic', None)
+
+    # Returns a ProfileReport: the pulses run, the seconds profiled, the pulses per second over that
+    # time, the seconds spent in the engine, how many pulses took each number of passes and a
+    # GateProfile per gate
+    def report(self) -> ProfileReport:
+        elapsed = (time.perf_counter() if self._stop is None else self._stop) - self._start
+        gates = {name: GateProfile(self._evaluations[name], self._toggles[name], self._logic_time[name])
+                 for name in self._gates}
+        return ProfileReport(self._pulses, elapsed, self._pulses / elapsed if elapsed > 0 else 0.0,
+                             self._engine_time, dict(self._passes), gates)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
@@ -0,0 +1,323 @@
+"""
+Saving and loading LogicGateManager circuits.  A circuit is its gates (_gateKeeper) and its
+connection mapping (_gateMapper), and both are stored in either of two versioned formats:
+
+    binary  a string table holding every name once, followed by flat arrays of integers that
+            refer to it: a table of gate kinds (class, type and pin names), then the name and
+            kind of every gate and the source, destination and pins of every connection
+    JSON    the same circuit as readable JSON, with the connections nested like the mapping
+
+to_records and from_records turn a circuit into rows and back, for storing it in tables.
+
+The switches' values and the manager's engine are stored along with the circuit.  Other pin
+values are not, as they are recomputed by the next pulse.  Only the gate classes of
+logic_gates can be stored.
+
+Loading builds everything in bulk.  Gates of the same kind are created from shared templates
+instead of through their constructors, connections are shared PinConnection tuples, the
+whole circuit goes into the manager in one add_netlist call and the garbage collector is
+paused while the objects are created, so loading avoids the per-gate and per-pin work of
+rebuilding a circuit with add_gate and add_connection.
+"""
+import collections
+import contextlib
+import gc
+import json
+import struct
+import sys
+from array import array
+
+from gates.logic_gates import (ANDGate, GND, LogicGateManager, LogicGateManagerException, NANDGate, NORGate,
+                               NOTGate, ORGate, PinCollection, PinConnection, Switch, VCC, XNORGate, XORGate)
+
+# Version written by this module.  Files from later versions are refused.
+VERSION = 1
+
+MAGIC = b"LGCIRCT\0"
+JSON_FORMAT = "digital_logic_simulator.circuit"
+
+# magic, version, engine string, and the number of strings, kind entries, gates, pin pairs and connections
+_HEADER = struct.Struct("<8sIIIIIII")
+_LENGTH = struct.Struct("<Q")
+
+GateRecord = collections.namedtuple("GateRecord", ('name', 'op', 'type', 'inputs', 'outputs', 'value'))
+ConnectionRecord = collections.namedtuple("ConnectionRecord", ('source', 'o_pin', 'gate', 'i_pin'))
+
+_CLASSES = {cls.op: cls for cls in (ANDGate, ORGate, XORGate, NOTGate, NANDGate, NORGate, XNORGate, VCC, GND, Switch)}
+
+"""
+Custom exception type for circuits that cannot be saved or loaded
+"""
+class SerializationException(LogicGateManagerException):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+# Returns the circuit in the binary format
+def dumps(manager : LogicGateManager) -> bytes:
+    strings = {}
+    def string(value : str) -> int:
+        if value not in strings:
+            if '\0' in value:
+                raise SerializationException(f"Cannot store {value!r}, names cannot contain NUL characters")
+            strings[value] = len(strings)
+        return strings[value]
+
+    kinds = {}
+    kind_table = array('I')
+    gate_index = {}
+    names = array('I')
+    gate_kinds = array('I')
+    values = bytearray()
+    for name, gate in manager._gateKeeper.items():
+        key = _kind(gate)
+        if key not in kinds:
+            kinds[key] = len(kinds)
+            op, type, inputs, outputs = key
+            kind_table.extend([string(op), string(type), len(inputs), len(outputs)])
+            kind_table.extend(string(pin) for pin in inputs + outputs)
+        gate_index[name] = len(gate_index)
+        names.append(string(str(name)))
+        gate_kinds.append(kinds[key])
+        values.append(gate.value if isinstance(gate, Switch) else 0)
+
+    # Connections are stored a column at a time, the pins of each one as an entry of a table of pin pairs
+    pairs = {}
+    pair_table = array('I')
+    sources = array('I')
+    destinations = array('I')
+    connections = array('I')
+    for source, fanout in manager._gateMapper.items():
+        for gate, connection in fanout.items():
+            for conn in connection:
+                if conn not in pairs:
+                    pairs[conn] = len(pairs)
+                    pair_table.extend((string(conn.o_pin), string(conn.i_pin)))
+                sources.append(gate_index[source])
+                destinations.append(gate_index[gate])
+                connections.append(pairs[conn])
+
+    engine = string(manager.engine)
+    blob = '\0'.join(strings).encode()
+    parts = [_HEADER.pack(MAGIC, VERSION, engine, len(strings), len(kind_table), len(names), len(pairs), len(sources)),
+             _LENGTH.pack(len(blob)), blob]
+    for table in (kind_table, names, gate_kinds, pair_table, sources, destinations, connections):
+        if sys.byteorder == "big":
+            table.byteswap()
+        parts.append(table.tobytes())
+    parts.append(bytes(values))
+    return b''.join(parts)
+
+# Restores a circuit from the binary format.  engine overrides the stored engine.
+def loads(data : bytes, engine : str = None) -> LogicGateManager:
+    data = memoryview(data)
+    if len(data) < _HEADER.size + _LENGTH.size:
+        raise SerializationException("The data is too short to be a saved circuit")
+    magic, version, engine_id, string_count, kind_size, gate_count, pair_count, connection_count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise SerializationException("The data is not a saved circuit")
+    if version > VERSION:
+        raise SerializationException(f"Saved circuit version {version} is newer than the supported version {VERSION}")
+
+    position = _HEADER.size
+    length, = _LENGTH.unpack_from(data, position)
+    position += _LENGTH.size
+    strings = bytes(data[position:position + length]).decode().split('\0')
+    position += length
+
+    tables = []
+    for count in (kind_size, gate_count, gate_count, pair_count * 2, connection_count, connection_count, connection_count):
+        table = array('I')
+        table.frombytes(data[position:position + count * table.itemsize])
+        if sys.byteorder == "big":
+            table.byteswap()
+        if len(table) != count:
+            raise SerializationException("The saved circuit is truncated")
+        tables.append(table)
+        position += count * table.itemsize
+    kind_table, names, gate_kinds, pair_table, sources, destinations, connections = tables
+    values = data[position:position + gate_count]
+    if len(strings) != string_count or len(values) != gate_count:
+        raise SerializationException("The saved circuit is truncated")
+
+    with _paused_gc():
+        try:
+            kinds = []
+            index = 0
+            while index < len(kind_table):
+                op, type, inputs, outputs = kind_table[index:index + 4]
+                pins = [strings[pin] for pin in kind_table[index + 4:index + 4 + inputs + outputs]]
+                kinds.append((strings[op], strings[type], pins[:inputs], pins[inputs:]))
+                index += 4 + inputs + outputs
+            names = [strings[name] for name in names]
+            pairs = [PinConnection(strings[o_pin], strings[i_pin]) for o_pin, i_pin in zip(pair_table[::2], pair_table[1::2])]
+            gates = _create_gates(names, kinds, gate_kinds, values)
+
+            # Connections come grouped by source gate, so a new fanout dictionary is only looked up
+            # when the source changes
+            mapping = {}
+            current = None
+            for source, gate, pair in zip(sources, destinations, connections):
+                if source != current:
+                    current = source
+                    fanout = mapping.setdefault(names[source], {})
+                gate = names[gate]
+                pins = fanout.get(gate)
+                if pins is None:
+                    fanout[gate] = [pairs[pair]]
+                else:
+                    pins.append(pairs[pair])
+            engine = engine or strings[engine_id]
+        except IndexError:
+            raise SerializationException("The saved circuit refers to a string, kind, gate or pin pair it does not hold")
+        return _manager(gates, mapping, engine)
+
+# Returns the circuit in the JSON format
+def dumps_json(manager : LogicGateManager, indent : int = None) -> str:
+    gates = []
+    for name, gate in manager._gateKeeper.items():
+        op, type, inputs, outputs = _kind(gate)
+        entry = {"name": name, "op": op, "type": type, "inputs": inputs, "outputs": outputs}
+        if isinstance(gate, Switch):
+            entry["value"] = gate.value
+        gates.append(entry)
+
+    connections = {source: {gate: [list(conn) for conn in connection] for gate, connection in fanout.items()}
+                   for source, fanout in manager._gateMapper.items() if fanout}
+    return json.dumps({"format": JSON_FORMAT, "version": VERSION, "engine": manager.engine,
+                       "gates": gates, "connections": connections}, indent=indent)
+
+# Restores a circuit from the JSON format.  engine overrides the stored engine.
+def loads_json(text : str, engine : str = None) -> LogicGateManager:
+    with _paused_gc():
+        document = json.loads(text)
+        if not isinstance(document, dict) or document.get("format") != JSON_FORMAT:
+            raise SerializationException("The JSON is not a saved circuit")
+        if document.get("version", 0) > VERSION:
+            raise SerializationException(f"Saved circuit version {document['version']} is newer than the supported version {VERSION}")
+
+        try:
+            gates = _create_gate_records((gate["name"], gate["op"], gate["type"], gate["inputs"], gate["outputs"], gate.get("value", 0))
+                                         for gate in document["gates"])
+
+            pairs = {}
+            mapping = {source: {gate: [pairs.setdefault((o_pin, i_pin), PinConnection(o_pin, i_pin)) for o_pin, i_pin in connection]
+                                for gate, connection in fanout.items()}
+                       for source, fanout in document["connections"].items()}
+            return _manager(gates, mapping, engine or document["engine"])
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise SerializationException(f"The saved circuit is malformed: {e!r}")
+
+# Returns the circuit as rows for tables: a GateRecord per gate and a ConnectionRecord per connection,
+# both in the manager's order
+def to_records(manager : LogicGateManager) -> tuple:
+    gates = [GateRecord(name, *_kind(gate), gate.value if isinstance(gate, Switch) else 0)
+             for name, gate in manager._gateKeeper.items()]
+    connections = [ConnectionRecord(source, conn.o_pin, gate, conn.i_pin)
+                   for source, fanout in manager._gateMapper.items()
+                   for gate, connection in fanout.items() for conn in connection]
+    return gates, connections
+
+# Restores a circuit from rows in the layout of GateRecord and ConnectionRecord, such as the ones from
+# to_records.  Connections are added in the order they are given.
+def from_records(gates, connections, engine : str = "sweep") -> LogicGateManager:
+    with _paused_gc():
+        gates = _create_gate_records(gates)
+        pairs = {}
+        mapping = {}
+        for source, o_pin, gate, i_pin in connections:
+            connection = pairs.get((o_pin, i_pin))
+            if connection is None:
+                connection = pairs[(o_pin, i_pin)] = PinConnection(o_pin, i_pin)
+            fanout = mapping.get(source)
+            if fanout is None:
+                fanout = mapping[source] = {}
+            pins = fanout.get(gate)
+            if pins is None:
+                fanout[gate] = [connection]
+            else:
+                pins.append(connection)
+        return _manager(gates, mapping, engine)
+
+# Writes the circuit to a path, in JSON when it ends with .json and in the binary format otherwise
+def save(manager : LogicGateManager, path : str) -> None:
+    if path.lower().endswith(".json"):
+        with open(path, 'w') as file:
+            file.write(dumps_json(manager))
+    else:
+        with open(path, 'wb') as file:
+            file.write(dumps(manager))
+
+# Reads a circuit saved by save
+def load(path : str, engine : str = None) -> LogicGateManager:
+    if path.lower().endswith(".json"):
+        with open(path) as file:
+            return loads_json(file.read(), engine)
+    with open(path, 'rb') as file:
+        return loads(file.read(), engine)
+
+# Returns the (op, type, input pins, output pins) of a gate that can be stored
+def _kind(gate) -> tuple:
+    if _CLASSES.get(gate.op) is not type(gate):
+        raise SerializationException(f"Cannot store gate {gate.name} of class {type(gate).__name__}")
+    return (gate.op, gate.type, tuple(gate.inputs.pins), tuple(gate.outputs.pins))
+
+# Pauses the garbage collector, which would otherwise run over and over while the many small objects
+# of a circuit are created
+@contextlib.contextmanager
+def _paused_gc():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+# Creates the gates of (name, op, type, input pins, output pins, switch value) rows
+def _create_gate_records(rows) -> list:
+    kinds = {}
+    names = []
+    gate_kinds = []
+    values = []
+    for name, op, type, inputs, outputs, value in rows:
+        kind = (op, type, tuple(inputs), tuple(outputs))
+        names.append(name)
+        gate_kinds.append(kinds.setdefault(kind, len(kinds)))
+        values.append(value)
+    return _create_gates(names, list(kinds), gate_kinds, values)
+
+# Creates the gates.  kinds holds (op, type, input pins, output pins) entries and gate i is named
+# names[i], is of kind kinds[gate_kinds[i]] and has the switch value values[i].  Gates are created
+# without running their constructors, with copies of their kind's pin dictionaries.
+def _create_gates(names : list, kinds : list, gate_kinds, values) -> list:
+    templates = []
+    for op, type, inputs, outputs in kinds:
+        if op not in _CLASSES:
+            raise SerializationException(f"Unknown gate operation {op}")
+        templates.append((_CLASSES[op], type, dict.fromkeys(inputs, 0), dict.fromkeys(outputs, 0)))
+
+    new = object.__new__
+    gates = []
+    for name, kind, value in zip(names, gate_kinds, values):
+        cls, type, inputs, outputs = templates[kind]
+        gate = new(cls)
+        gate._type = type
+        gate._name = name
+        gate._inputs = collection = new(PinCollection)
+        collection._pins = inputs.copy()
+        collection._setpins = inputs.copy()
+        gate._outputs = collection = new(PinCollection)
+        collection._pins = outputs.copy()
+        collection._setpins = outputs.copy()
+        if cls is Switch:
+            gate.value = value
+        gates.append(gate)
+    return gates
+
+# Returns a new manager running the given gates and connection mapping
+def _manager(gates : list, mapping : dict, engine : str) -> LogicGateManager:
+    if engine not in LogicGateManager.ENGINES:
+        raise SerializationException(f"Unknown simulation engine {engine}")
+    manager = LogicGateManager(engine=engine)
+    manager.add_netlist(gates, mapping)
+    return manager
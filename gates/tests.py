@@ -1,7 +1,19 @@
 from statistics import NormalDist
+from unittest import mock, skipIf
 from django.test import TestCase
+from gates import aig, benchmarks, bitsim, faults, importers, optimize, serialization, trace, waveform
+from gates.incremental import IncrementalCircuit
+from gates.netlist import CompactNetlist, CompactNetlistException, XOR
 from gates.logic_gates import *
+import io
+import itertools
+import json
+import os
 import pprint
+import struct
+import tempfile
+import threading
+import time
 
 class TestGenericLogicGate(TestCase):
     def test_generic_gate_creation(self):
@@ -287,6 +299,196 @@ class TestClock(TestCase):
 
         self.assertEqual(pulse_count, 10)
 
+    def test_scanner_sleeps_between_pulses(self):
+        manager = LogicGateManager()
+        clock = Clock(frequency=10)
+        manager.clock = clock
+        waits = []
+        wait = clock._condition.wait
+
+        def counting_wait(*args):
+            waits.append(args)
+            return wait(*args)
+        clock._condition.wait = counting_wait
+
+        pulse_count = manager.start_clock(max_cycles=5)
+
+        # The scanner blocks without a timeout and is only woken by the pulses and the end of the run
+        self.assertEqual(pulse_count, 5)
+        self.assertLessEqual(len(waits), 6)
+        self.assertTrue(all(args == () for args in waits))
+
+    def test_coalesced_pulses_counted(self):
+        manager = LogicGateManager()
+        clock = Clock(frequency=100)
+        manager.clock = clock
+        manager._run_logic = lambda: time.sleep(0.025)
+
+        pulse_count = manager.start_clock(max_cycles=20)
+
+        self.assertGreater(clock.missed_pulses, 0)
+        self.assertEqual(pulse_count + clock.missed_pulses, 20)
+
+class TestClockScheduling(TestCase):
+    # Runs the clock on the current thread against a fake monotonic clock.  Sleeping moves the fake
+    # clock on by the time slept and every pulse by work seconds, as if a scanner handled it.  The
+    # first sleep takes stall seconds instead when it is given.
+    def run_on_fake_time(self, clock, cycles, work = 0.0, stall = None):
+        now = [0]
+        notify = clock._condition.notify_all
+        stalls = [] if stall is None else [stall]
+
+        def sleep(seconds):
+            now[0] += round((stalls.pop() if stalls else seconds) * 1e9)
+
+        def handle_pulse():
+            notify()
+            clock.send_pulse = 0
+            now[0] += round(work * 1e9)
+
+        clock._condition.notify_all = handle_pulse
+        clock.reset(cycles)
+        with mock.patch.object(time, 'monotonic_ns', lambda: now[0]), mock.patch.object(time, 'sleep', sleep):
+            clock.run()
+
+    def test_no_drift_from_slow_logic(self):
+        clock = Clock(frequency=50)
+        self.run_on_fake_time(clock, 25, 0.01)
+
+        # Sleeping a fixed period after each pulse would take 25 * (0.02 + 0.01) seconds
+        self.assertAlmostEqual(clock.stats.elapsed, 0.5)
+        self.assertEqual(clock.stats.pulses, 25)
+        self.assertAlmostEqual(clock.stats.achieved_frequency, 50)
+        self.assertEqual(clock.stats.max_jitter, 0)
+        self.assertEqual(clock.missed_pulses, 0)
+
+    def test_float_and_sub_hz_frequencies(self):
+        clock = Clock(frequency=0.5)
+        clock.frequency = 2500.5
+
+        self.assertEqual(clock.frequency, 2500.5)
+        with self.assertRaises(TypeError):
+            clock.frequency = "fast"
+        with self.assertRaises(ValueError):
+            clock.frequency = 0
+
+    def test_catch_up_policy(self):
+        clock = Clock(frequency=200)
+        self.run_on_fake_time(clock, 10, stall=5 / clock.frequency)
+
+        self.assertEqual(clock.stats.pulses, 10)
+        self.assertGreaterEqual(clock.stats.overruns, 1)
+        self.assertGreaterEqual(clock.stats.max_jitter, 0.02)
+        self.assertEqual(clock.stats.skipped, 0)
+
+    def test_skip_policy(self):
+        clock = Clock(frequency=200, policy="skip")
+        self.run_on_fake_time(clock, 10, stall=5 / clock.frequency)
+
+        self.assertEqual(clock.stats.pulses, 10)
+        self.assertEqual(clock.stats.overruns, 1)
+        self.assertEqual(clock.stats.skipped, 4)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            Clock(policy="rewind")
+
+class TestConcurrentClocks(TestCase):
+    def test_managers_do_not_share_cycle_counts(self):
+        managers = [LogicGateManager(), LogicGateManager()]
+        managers[0].clock = Clock(frequency=50)
+        managers[1].clock = Clock(frequency=40)
+        counts = {}
+
+        threads = [threading.Thread(target=lambda m=m, n=n: counts.update({n: m.start_clock(max_cycles=n)}))
+                   for m, n in zip(managers, (10, 15))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # A pulse the scanner was late for is merged into the next one and counted as missed, so
+        # only the pulses each clock sent are exact
+        for manager, cycles in zip(managers, (10, 15)):
+            self.assertEqual(manager.clock.stats.pulses, cycles)
+            self.assertEqual(counts[cycles] + manager.clock.missed_pulses, cycles)
+
+    def test_clock_can_be_restarted(self):
+        manager = LogicGateManager()
+        manager.clock = Clock(frequency=100)
+
+        for cycles in (3, 4):
+            pulse_count = manager.start_clock(max_cycles=cycles)
+            self.assertEqual(manager.clock.stats.pulses, cycles)
+            self.assertEqual(pulse_count + manager.clock.missed_pulses, cycles)
+        self.assertIs(manager.clock.__class__, Clock)
+        self.assertNotIsInstance(manager.clock, threading.Thread)
+
+    def test_scheduler_drives_many_managers(self):
+        scheduler = ClockScheduler()
+        managers = []
+        for index in range(200):
+            manager = create_switch_adder("event")
+            manager.clock = Clock(frequency=100 + index)
+            scheduler.add(manager, max_cycles=5)
+            managers.append(manager)
+
+        counts = scheduler.run()
+
+        self.assertEqual(counts, [5] * 200)
+        self.assertEqual(managers[0]["XOR1"].outputs.pins, {'O': 0})
+
+    def test_scheduler_steps_circuit(self):
+        scheduler = ClockScheduler()
+        manager = create_switch_adder("levelized")
+        manager.set_switch("A", 1)
+        scheduler.add(manager, max_cycles=1, frequency=1000)
+        scheduler.run()
+
+        self.assertEqual(manager["XOR2"].outputs.pins, {'O': 1})
+
+    def test_scheduler_needs_frequency(self):
+        scheduler = ClockScheduler()
+
+        with self.assertRaises(LogicGateManagerException):
+            scheduler.add(LogicGateManager(), max_cycles=1)
+
+class TestRunCycles(TestCase):
+    def test_free_running(self):
+        manager = create_switch_adder("event")
+
+        stats = manager.run_cycles(10000)
+
+        self.assertEqual(stats.cycles, 10000)
+        self.assertGreater(stats.elapsed, 0)
+        self.assertAlmostEqual(stats.cycles_per_second, stats.cycles / stats.elapsed)
+
+    def test_each_cycle_is_a_pulse(self):
+        manager = create_switch_adder("levelized")
+        manager._run_logic = lambda: manager.set_switch("A", 1 - manager["A"].value)
+
+        manager.run_cycles(3)
+
+        self.assertEqual(manager["A"].value, 1)
+
+    def test_step(self):
+        manager = create_switch_adder()
+        manager.set_switch("B", 1)
+        manager.step()
+
+        self.assertEqual(manager["XOR2"].outputs.pins, {'O': 1})
+
+    def test_negative_cycles(self):
+        manager = LogicGateManager()
+
+        with self.assertRaises(LogicGateManagerException):
+            manager.run_cycles(-1)
+
+    def test_no_clock_needed(self):
+        manager = LogicGateManager()
+
+        self.assertEqual(manager.run_cycles(0).cycles, 0)
+
 class TestCircuit(TestCase):
     def test_simple_circuit(self):
         manager = LogicGateManager()
@@ -442,3 +644,1360 @@ class TestAdder(TestCase):
         self.assertEqual(or1.outputs.pins, {'O': 1})
 
         
+class TestLevelizedEngine(TestCase):
+    def test_levels(self):
+        manager = create_switch_adder("levelized", (1, 0, 1))
+
+        self.assertEqual(manager.levelize(), [["A", "B", "C"], ["XOR1", "AND2"], ["XOR2", "AND1"], ["OR1"]])
+
+    def test_matches_sweep(self):
+        for value in range(8):
+            a, b, c = (value >> 2) & 1, (value >> 1) & 1, value & 1
+            sweep = create_switch_adder("sweep", (a, b, c))
+            levelized = create_switch_adder("levelized", (a, b, c))
+            sweep._run_logic()
+            levelized._run_logic()
+
+            for name in ("XOR1", "XOR2", "AND1", "AND2", "OR1"):
+                self.assertEqual(levelized[name].outputs.pins, sweep[name].outputs.pins)
+            self.assertEqual(levelized["XOR2"].outputs['O'] + 2 * levelized["OR1"].outputs['O'], a + b + c)
+
+    def test_schedule_invalidated(self):
+        manager = create_switch_adder("levelized", (1, 1, 0))
+        manager.levelize()
+        manager.add_gate(NOTGate("NOT", "NOT1"))
+        manager.add_connection(GatePin("OR1", 'O'), GatePin("NOT1", 'A'))
+        manager._run_logic()
+
+        self.assertEqual(manager.levelize()[-1], ["NOT1"])
+        self.assertEqual(manager["NOT1"].outputs.pins, {'O': 0})
+
+    def test_undriven_gate_skipped(self):
+        manager = create_switch_adder("levelized", (1, 1, 1))
+        manager.add_gate(ANDGate("AND", "FLOATING"))
+        manager.add_connection(GatePin("A", 'O'), GatePin("FLOATING", 'A'))
+        manager._run_logic()
+
+        self.assertEqual(manager._get_schedule().dead, ["FLOATING"])
+        self.assertEqual(manager["FLOATING"].outputs.pins, {'O': 0})
+
+    def test_unknown_engine(self):
+        with self.assertRaises(LogicGateManagerException):
+            LogicGateManager(engine="warp")
+
+class TestSwitch(TestCase):
+    def testDefaultLow(self):
+        gate = Switch("SWITCH", "S1")
+
+        expected_output = {'O': 0}
+        gate._logic()
+
+        self.assertEqual(gate.outputs.pins, expected_output)
+
+    def testHigh(self):
+        gate = Switch("SWITCH", "S1", value=1)
+
+        expected_output = {'O': 1}
+        gate._logic()
+
+        self.assertEqual(gate.outputs.pins, expected_output)
+
+    def testInvalidValue(self):
+        gate = Switch("SWITCH", "S1")
+
+        with self.assertRaises(LogicGateManagerException):
+            gate.value = 2
+
+class TestEventEngine(TestCase):
+    # Builds a chain of NOT gates hanging off a full adder driven by three switches
+    def create_circuit(self):
+        manager = create_switch_adder("event")
+        manager.add_gate(NOTGate("NOT", "NOT1"))
+        manager.add_gate(NOTGate("NOT", "NOT2"))
+        manager.add_connection(GatePin("OR1", 'O'), GatePin("NOT1", 'A'))
+        manager.add_connection(GatePin("NOT1", 'O'), GatePin("NOT2", 'A'))
+
+        return manager
+
+    def test_first_pulse_evaluates_everything(self):
+        manager = self.create_circuit()
+
+        self.assertEqual(manager._run_event(), 10)
+        self.assertEqual(manager._run_event(), 0)
+        self.assertEqual(manager["NOT1"].outputs.pins, {'O': 1})
+
+    def test_only_changed_gates_evaluated(self):
+        manager = self.create_circuit()
+        manager._run_event()
+
+        # C only reaches XOR2 and AND1, and AND1 stays low because XOR1 is low
+        manager.set_switch("C", 1)
+        self.assertEqual(manager._run_event(), 3)
+        self.assertEqual(manager["XOR2"].outputs.pins, {'O': 1})
+        self.assertEqual(manager["OR1"].outputs.pins, {'O': 0})
+
+        # Setting a switch to the value it already has queues nothing
+        manager.set_switch("C", 1)
+        self.assertEqual(manager._run_event(), 0)
+
+    def test_matches_levelized(self):
+        event = self.create_circuit()
+        levelized = self.create_circuit()
+        levelized.engine = "levelized"
+
+        for value in (5, 7, 2, 0, 3, 6, 1, 4):
+            for bit, name in enumerate(("C", "B", "A")):
+                event.set_switch(name, (value >> bit) & 1)
+                levelized.set_switch(name, (value >> bit) & 1)
+            event._run_logic()
+            levelized._run_logic()
+
+            for name in ("XOR2", "OR1", "NOT1", "NOT2"):
+                self.assertEqual(event[name].outputs.pins, levelized[name].outputs.pins)
+
+    def test_edit_reevaluates_everything(self):
+        manager = self.create_circuit()
+        manager._run_event()
+        manager.add_gate(NOTGate("NOT", "NOT3"))
+        manager.add_connection(GatePin("NOT2", 'O'), GatePin("NOT3", 'A'))
+
+        self.assertEqual(manager._run_event(), 11)
+        self.assertEqual(manager["NOT3"].outputs.pins, {'O': 1})
+
+    def test_set_switch_requires_switch(self):
+        manager = self.create_circuit()
+
+        with self.assertRaises(LogicGateManagerException):
+            manager.set_switch("XOR1", 1)
+
+    def test_partly_wired_gate(self):
+        manager = LogicGateManager(engine="event")
+        manager.add_gate(Switch("SWITCH", "A"))
+        manager.add_gate(ANDGate("AND", "X"))
+        manager.add_connection(GatePin("A", 'O'), GatePin("X", 'A'))
+        manager.step()
+
+        manager.set_switch("A", 1)
+        manager.step()
+
+        self.assertEqual(manager["X"].inputs.pins, {'A': 1, 'B': 0})
+
+    def test_loop(self):
+        manager = LogicGateManager(engine="event")
+        manager.add_gate(Switch("SWITCH", "A"))
+        manager.add_gate(ANDGate("AND", "X"))
+        manager.add_gate(NOTGate("NOT", "Y"))
+        manager.add_connection(GatePin("A", 'O'), GatePin("X", 'A'))
+        manager.add_connection(GatePin("X", 'O'), GatePin("Y", 'A'))
+        manager.add_connection(GatePin("Y", 'O'), GatePin("X", 'B'))
+        manager.step()
+
+        manager.set_switch("A", 1)
+        manager.step()
+
+        self.assertEqual(manager["X"].inputs.pins['A'], 1)
+
+# Builds a full adder driven by three switches, set to the given values
+def create_switch_adder(engine = "sweep", values = (0, 0, 0)):
+    manager = LogicGateManager(engine=engine)
+
+    for name, value in zip(("A", "B", "C"), values):
+        manager.add_gate(Switch("SWITCH", name, value=value))
+    for gate in (XORGate("XOR", "XOR1"), XORGate("XOR", "XOR2"), ANDGate("AND", "AND1"),
+                 ANDGate("AND", "AND2"), ORGate("OR", "OR1")):
+        manager.add_gate(gate)
+
+    manager.add_connection(GatePin("A", 'O'), GatePin("XOR1", 'A'))
+    manager.add_connection(GatePin("A", 'O'), GatePin("AND2", 'A'))
+    manager.add_connection(GatePin("B", 'O'), GatePin("XOR1", 'B'))
+    manager.add_connection(GatePin("B", 'O'), GatePin("AND2", 'B'))
+    manager.add_connection(GatePin("C", 'O'), GatePin("XOR2", 'B'))
+    manager.add_connection(GatePin("C", 'O'), GatePin("AND1", 'B'))
+    manager.add_connection(GatePin("XOR1", 'O'), GatePin("XOR2", 'A'))
+    manager.add_connection(GatePin("XOR1", 'O'), GatePin("AND1", 'A'))
+    manager.add_connection(GatePin("AND1", 'O'), GatePin("OR1", 'A'))
+    manager.add_connection(GatePin("AND2", 'O'), GatePin("OR1", 'B'))
+
+    return manager
+
+class TestBatchSimulation(TestCase):
+    def test_full_adder(self):
+        manager = create_switch_adder()
+        vectors = [((value >> 2) & 1, (value >> 1) & 1, value & 1) for value in range(8)]
+
+        results = manager.simulate_batch(["A", "B", "C"], vectors, ["XOR2", "OR1"])
+
+        self.assertEqual(results, [(sum(vector) & 1, sum(vector) >> 1) for vector in vectors])
+
+    def test_default_outputs_are_sinks(self):
+        manager = create_switch_adder()
+
+        self.assertEqual(manager.sinks(), ["XOR2", "OR1"])
+        self.assertEqual(manager.simulate_batch(["A", "B", "C"], [(1, 1, 1), (0, 1, 0)]), [(1, 1), (1, 0)])
+
+    def test_unforced_switch_keeps_value(self):
+        manager = create_switch_adder()
+        manager.set_switch("C", 1)
+
+        self.assertEqual(manager.simulate_batch(["A", "B"], [(0, 0), (1, 1)]), [(1, 0), (1, 1)])
+
+    def test_matches_levelized(self):
+        manager = create_switch_adder()
+        manager.engine = "levelized"
+        manager.add_gate(NANDGate("NAND", "NAND1"))
+        manager.add_gate(NORGate("NOR", "NOR1"))
+        manager.add_gate(XNORGate("XNOR", "XNOR1"))
+        manager.add_gate(NOTGate("NOT", "NOT1"))
+        manager.add_connection(GatePin("XOR2", 'O'), GatePin("NAND1", 'A'))
+        manager.add_connection(GatePin("OR1", 'O'), GatePin("NAND1", 'B'))
+        manager.add_connection(GatePin("NAND1", 'O'), GatePin("NOR1", 'A'))
+        manager.add_connection(GatePin("A", 'O'), GatePin("NOR1", 'B'))
+        manager.add_connection(GatePin("NOR1", 'O'), GatePin("XNOR1", 'A'))
+        manager.add_connection(GatePin("B", 'O'), GatePin("XNOR1", 'B'))
+        manager.add_connection(GatePin("XNOR1", 'O'), GatePin("NOT1", 'A'))
+
+        vectors = [((value >> 2) & 1, (value >> 1) & 1, value & 1) for value in range(8)]
+        outputs = ["NAND1", "NOR1", "XNOR1", "NOT1"]
+        results = manager.simulate_batch(["A", "B", "C"], vectors, outputs)
+
+        for vector, result in zip(vectors, results):
+            for name, value in zip(("A", "B", "C"), vector):
+                manager.set_switch(name, value)
+            manager._run_logic()
+            self.assertEqual(result, tuple(manager[name].outputs['O'] for name in outputs))
+
+    @skipIf(bitsim.numpy is None, "NumPy is not installed")
+    def test_numpy_backend(self):
+        manager = create_switch_adder()
+        vectors = [((value >> 2) & 1, (value >> 1) & 1, value & 1) for value in range(8)] * 20
+
+        self.assertEqual(manager.simulate_batch(["A", "B", "C"], vectors, use_numpy=True),
+                         manager.simulate_batch(["A", "B", "C"], vectors))
+
+    def test_parity_tree(self):
+        manager = LogicGateManager()
+        names = [f"S{i}" for i in range(12)]
+        for name in names:
+            manager.add_gate(Switch("SWITCH", name))
+
+        while len(names) > 1:
+            a, b = names.pop(0), names.pop(0)
+            gate = XORGate("XOR", f"X{len(manager.connections)}")
+            manager.add_gate(gate)
+            manager.add_connection(GatePin(a, 'O'), GatePin(gate.name, 'A'))
+            manager.add_connection(GatePin(b, 'O'), GatePin(gate.name, 'B'))
+            names.append(gate.name)
+
+        vectors = [tuple((value >> bit) & 1 for bit in range(12)) for value in range(1 << 12)]
+        results = manager.simulate_batch([f"S{i}" for i in range(12)], vectors)
+
+        self.assertEqual(results, [(sum(vector) & 1,) for vector in vectors])
+
+    def test_unknown_gate(self):
+        manager = create_switch_adder()
+
+        with self.assertRaises(LogicGateManagerException):
+            manager.simulate_batch(["A", "B", "D"], [(0, 0, 0)])
+
+class TestCompiler(TestCase):
+    def test_source_is_straight_line(self):
+        manager = create_switch_adder("compiled")
+        compiled = manager.compile()
+
+        self.assertEqual(compiled.sources, ["A", "B", "C"])
+        self.assertIn("n3 = n0 ^ n1  # 'XOR1'", compiled.source)
+        self.assertNotIn("for ", compiled.source)
+        self.assertEqual(compiled.function(1, [1, 1, 0])[compiled.index["OR1"]], 1)
+
+    def test_inverting_gates(self):
+        manager = LogicGateManager(engine="compiled")
+        for gate in (VCC("VCC", "VCC1"), GND("GND", "GND1"), NANDGate("NAND", "NAND1"), NORGate("NOR", "NOR1"),
+                     XNORGate("XNOR", "XNOR1"), NOTGate("NOT", "NOT1")):
+            manager.add_gate(gate)
+        for name in ("NAND1", "NOR1", "XNOR1"):
+            manager.add_connection(GatePin("VCC1", 'O'), GatePin(name, 'A'))
+            manager.add_connection(GatePin("GND1", 'O'), GatePin(name, 'B'))
+        manager.add_connection(GatePin("GND1", 'O'), GatePin("NOT1", 'A'))
+        manager._run_logic()
+
+        self.assertEqual(manager["NAND1"].outputs.pins, {'O': 1})
+        self.assertEqual(manager["NOR1"].outputs.pins, {'O': 0})
+        self.assertEqual(manager["XNOR1"].outputs.pins, {'O': 0})
+        self.assertEqual(manager["NOT1"].outputs.pins, {'O': 1})
+
+    def test_matches_levelized(self):
+        compiled = create_switch_adder("compiled")
+        levelized = create_switch_adder("levelized")
+
+        for value in range(8):
+            for bit, name in enumerate(("C", "B", "A")):
+                compiled.set_switch(name, (value >> bit) & 1)
+                levelized.set_switch(name, (value >> bit) & 1)
+            compiled._run_logic()
+            levelized._run_logic()
+
+            for name in ("XOR1", "XOR2", "AND1", "AND2", "OR1"):
+                self.assertEqual(compiled[name].outputs.pins, levelized[name].outputs.pins)
+                self.assertEqual(compiled[name].inputs.pins, levelized[name].inputs.pins)
+
+    def test_cache_invalidated(self):
+        manager = create_switch_adder("compiled")
+        compiled = manager.compile()
+        self.assertIs(manager.compile(), compiled)
+
+        manager.add_gate(NOTGate("NOT", "NOT1"))
+        self.assertIsNot(manager.compile(), compiled)
+        compiled = manager.compile()
+
+        manager.add_connection(GatePin("OR1", 'O'), GatePin("NOT1", 'A'))
+        self.assertIsNot(manager.compile(), compiled)
+        self.assertIn("NOT1", manager.compile().index)
+        compiled = manager.compile()
+
+        manager.remove_gate("NOT1")
+        self.assertIsNot(manager.compile(), compiled)
+        self.assertNotIn("NOT1", manager.compile().index)
+
+    def test_forcing_internal_gate_uses_interpreter(self):
+        manager = create_switch_adder("compiled")
+
+        self.assertEqual(manager.simulate_batch(["XOR1", "C"], [(1, 1), (0, 1)], ["XOR2", "AND1"]), [(0, 1), (1, 0)])
+
+    def test_generic_gate_cannot_compile(self):
+        manager = LogicGateManager()
+        manager.add_gate(LogicGate("GATE", "G1"))
+
+        with self.assertRaises(LogicGateManagerException):
+            manager.compile()
+
+class TestCompactNetlist(TestCase):
+    def test_from_manager(self):
+        manager = create_switch_adder()
+        manager.set_switch("A", 1)
+        manager.set_switch("C", 1)
+        netlist = manager.compact()
+        netlist.evaluate()
+
+        self.assertEqual(len(netlist), 8)
+        self.assertEqual(netlist["OR1"].type, "OR")
+        self.assertEqual(netlist["OR1"].outputs.pins, {'O': 1})
+        self.assertEqual(netlist["OR1"].inputs.pins, {'A': 1, 'B': 0})
+        self.assertEqual(netlist["XOR2"].get_output('O'), 0)
+
+    def test_matches_compiled(self):
+        manager = create_switch_adder("compiled")
+        netlist = manager.compact()
+
+        for value in range(8):
+            for bit, name in enumerate(("C", "B", "A")):
+                manager.set_switch(name, (value >> bit) & 1)
+                netlist.set_switch(name, (value >> bit) & 1)
+            manager._run_logic()
+            netlist.evaluate()
+
+            for name in ("XOR1", "XOR2", "AND1", "AND2", "OR1"):
+                self.assertEqual(netlist[name].outputs.pins, manager[name].outputs.pins)
+
+    def test_inverting_gates(self):
+        netlist = CompactNetlist()
+        vcc = netlist.add_gate("VCC")
+        gnd = netlist.add_gate("GND")
+        nand = netlist.add_gate("NAND", [vcc, gnd])
+        nor = netlist.add_gate("NOR", [vcc, gnd])
+        xnor = netlist.add_gate("XNOR", [vcc, gnd])
+        inverter = netlist.add_gate("NOT", [xnor])
+        netlist.evaluate()
+
+        self.assertEqual([netlist.values[gate] for gate in (nand, nor, xnor, inverter)], [1, 0, 0, 1])
+        self.assertEqual(netlist[inverter].name, str(inverter))
+
+    def test_must_be_topological(self):
+        netlist = CompactNetlist()
+        netlist.add_gate("SWITCH", name="S1")
+
+        with self.assertRaises(CompactNetlistException):
+            netlist.add_gate("AND", [0, 1])
+        with self.assertRaises(CompactNetlistException):
+            netlist.add_gate("SWITCH", name="S1")
+        with self.assertRaises(CompactNetlistException):
+            netlist.add_gate("MUX", [0])
+
+    def test_fanin_count(self):
+        netlist = CompactNetlist()
+        netlist.add_gate("SWITCH", name="S1")
+        netlist.add_gate("SWITCH", name="S2")
+
+        with self.assertRaises(CompactNetlistException):
+            netlist.add_gate("NOT", [])
+        with self.assertRaises(CompactNetlistException):
+            netlist.add_gate("NOT", [0, 1])
+        with self.assertRaises(CompactNetlistException):
+            netlist.add_gate("AND", [])
+        with self.assertRaises(CompactNetlistException):
+            netlist.add_gate("VCC", [0])
+        self.assertEqual(len(netlist), 2)
+
+    def test_memory_per_gate(self):
+        netlist = CompactNetlist()
+        netlist.add_gate("SWITCH")
+        netlist.add_gate("SWITCH")
+        for gate in range(2, 100000):
+            netlist.add_gate(XOR, [gate - 2, gate - 1])
+
+        self.assertLess(netlist.nbytes / len(netlist), 16)
+
+class TestTruthTable(TestCase):
+    def test_full_adder_rows(self):
+        manager = create_switch_adder()
+        rows = list(manager.truth_table(["A", "B", "C"], ["OR1", "XOR2"]))
+
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[0], (0, 0, 0, 0, 0))
+        self.assertEqual(rows[6], (1, 1, 0, 1, 0))
+        for a, b, c, carry, total in rows:
+            self.assertEqual(2 * carry + total, a + b + c)
+
+    def test_packed(self):
+        manager = create_switch_adder()
+        table = manager.truth_table(["A", "B", "C"], packed=True)
+
+        self.assertEqual(table.outputs, ["XOR2", "OR1"])
+        self.assertEqual(table.columns, [0b10010110, 0b11101000])
+
+    def test_rows_match_packed_across_chunks(self):
+        manager = create_switch_adder()
+        rows = list(manager.truth_table(["B", "C"], ["OR1"], chunk_bits=3))
+        manager.set_switch("A", 1)
+        table = manager.truth_table(["C", "B"], ["OR1"], packed=True, chunk_bits=3)
+
+        self.assertEqual(rows, [(0, 0, 0), (0, 1, 0), (1, 0, 0), (1, 1, 1)])
+        self.assertEqual(table.columns, [0b1110])
+
+    def test_wide_parity(self):
+        manager = LogicGateManager()
+        previous = None
+        for index in range(16):
+            manager.add_gate(Switch("SWITCH", f"S{index}"))
+            if previous is None:
+                previous = f"S{index}"
+                continue
+            manager.add_gate(XORGate("XOR", f"X{index}"))
+            manager.add_connection(GatePin(previous, 'O'), GatePin(f"X{index}", 'A'))
+            manager.add_connection(GatePin(f"S{index}", 'O'), GatePin(f"X{index}", 'B'))
+            previous = f"X{index}"
+
+        table = manager.truth_table([f"S{index}" for index in range(16)], packed=True, chunk_bits=8)
+        column = table.columns[0]
+
+        for row in (0, 1, 3, 0x8000, 0xFFFF, 0x1234):
+            self.assertEqual((column >> row) & 1, bin(row).count('1') & 1)
+        self.assertEqual(bin(column).count('1'), 1 << 15)
+
+class TestConstantFolding(TestCase):
+    # Builds a circuit where half of the logic is tied to VCC/GND:
+    #   CARRY = OR(AND(A, VCC), AND(B, GND)), INV = XOR(NAND(A, B), VCC), SUM = XNOR(NOR(B, GND), GND)
+    def create_circuit(self):
+        manager = LogicGateManager()
+        for gate in (Switch("SWITCH", "A"), Switch("SWITCH", "B"), VCC("VCC", "VCC1"), GND("GND", "GND1"),
+                     ANDGate("AND", "AND1"), ANDGate("AND", "AND2"), ORGate("OR", "CARRY"),
+                     NANDGate("NAND", "NAND1"), XORGate("XOR", "INV"), NORGate("NOR", "NOR1"), XNORGate("XNOR", "SUM")):
+            manager.add_gate(gate)
+
+        for source, target in (("A", "AND1.A"), ("VCC1", "AND1.B"), ("B", "AND2.A"), ("GND1", "AND2.B"),
+                               ("AND1", "CARRY.A"), ("AND2", "CARRY.B"), ("A", "NAND1.A"), ("B", "NAND1.B"),
+                               ("NAND1", "INV.A"), ("VCC1", "INV.B"), ("B", "NOR1.A"), ("GND1", "NOR1.B"),
+                               ("NOR1", "SUM.A"), ("GND1", "SUM.B")):
+            gate, pin = target.split('.')
+            manager.add_connection(GatePin(source, 'O'), GatePin(gate, pin))
+
+        return manager
+
+    def test_equivalent(self):
+        manager = self.create_circuit()
+        outputs = ["CARRY", "INV", "SUM"]
+        before = manager.truth_table(["A", "B"], outputs, packed=True).columns
+
+        optimize.fold_constants(manager, outputs)
+
+        self.assertEqual(manager.truth_table(["A", "B"], outputs, packed=True).columns, before)
+        self.assertEqual(manager.sinks(), outputs)
+
+    def test_report(self):
+        manager = self.create_circuit()
+
+        report = optimize.fold_constants(manager, ["CARRY", "INV", "SUM"])
+
+        # AND2 folds to GND, AND1 becomes a bypassed buffer and VCC1/GND1/AND1/AND2 end up unused
+        self.assertEqual(report.gates_removed, 4)
+        self.assertEqual(report.connections_removed, 8)
+        self.assertEqual(report.gates_rewritten, 6)
+        self.assertEqual(sorted(manager.connections), ["A", "B", "CARRY", "INV", "NAND1", "NOR1", "SUM"])
+        self.assertIsInstance(manager["CARRY"], ORGate)
+        self.assertEqual(manager["CARRY"].inputs.pins, {'A': 0})
+        self.assertIsInstance(manager["INV"], NOTGate)
+        self.assertIsInstance(manager["NOR1"], NOTGate)
+
+    def test_constant_output(self):
+        manager = LogicGateManager()
+        for gate in (Switch("SWITCH", "A"), GND("GND", "GND1"), ANDGate("AND", "AND1"), NOTGate("NOT", "NOT1")):
+            manager.add_gate(gate)
+        manager.add_connection(GatePin("A", 'O'), GatePin("AND1", 'A'))
+        manager.add_connection(GatePin("GND1", 'O'), GatePin("AND1", 'B'))
+        manager.add_connection(GatePin("AND1", 'O'), GatePin("NOT1", 'A'))
+
+        report = optimize.fold_constants(manager)
+
+        self.assertEqual(list(manager.connections), ["A", "NOT1"])
+        self.assertIsInstance(manager["NOT1"], VCC)
+        self.assertEqual(report.gates_removed, 2)
+        manager.step()
+        self.assertEqual(manager["NOT1"].outputs.pins, {'O': 1})
+
+    def test_dead_gates_removed(self):
+        manager = create_switch_adder()
+
+        report = optimize.remove_dead_gates(manager, ["XOR2"])
+
+        self.assertEqual(sorted(manager.connections), ["A", "B", "C", "XOR1", "XOR2"])
+        self.assertEqual(report.gates_removed, 3)
+        self.assertEqual(report.connections_removed, 6)
+
+    def test_unread_switch_kept(self):
+        manager = create_switch_adder()
+        manager.add_gate(Switch("SWITCH", "D"))
+
+        report = optimize.remove_dead_gates(manager, ["XOR2"])
+        manager.set_switch("D", 1)
+        manager.step()
+
+        self.assertIn("D", manager.connections)
+        self.assertEqual(report.gates_removed, 3)
+        self.assertEqual(manager["D"].outputs.pins, {'O': 1})
+
+class TestStructuralHashing(TestCase):
+    # Builds two copies of the full adder's sum logic on the same switches, with one copy's
+    # XOR inputs swapped, and ANDs the two sums together
+    def create_circuit(self):
+        manager = LogicGateManager()
+        for gate in (Switch("SWITCH", "A"), Switch("SWITCH", "B"), Switch("SWITCH", "C"),
+                     XORGate("XOR", "X1"), XORGate("XOR", "X2"), XORGate("XOR", "Y1"), XORGate("XOR", "Y2"),
+                     VCC("VCC", "VCC1"), VCC("VCC", "VCC2"), ANDGate("AND", "AND1"), ANDGate("AND", "OUT")):
+            manager.add_gate(gate)
+
+        for source, target in (("A", "X1.A"), ("B", "X1.B"), ("X1", "X2.A"), ("C", "X2.B"),
+                               ("B", "Y1.A"), ("A", "Y1.B"), ("C", "Y2.A"), ("Y1", "Y2.B"),
+                               ("X2", "AND1.A"), ("VCC1", "AND1.B"), ("AND1", "OUT.A"), ("Y2", "OUT.B"),
+                               ("VCC2", "OUT.C")):
+            gate, pin = target.split('.')
+            manager.add_connection(GatePin(source, 'O'), GatePin(gate, pin))
+        manager["OUT"].add_inputs(['C'])
+
+        return manager
+
+    def test_merges_duplicate_cones(self):
+        manager = self.create_circuit()
+        before = manager.truth_table(["A", "B", "C"], ["OUT"], packed=True).columns
+
+        report = optimize.merge_duplicates(manager)
+
+        self.assertEqual(sorted(manager.connections), ["A", "AND1", "B", "C", "OUT", "VCC1", "X1", "X2"])
+        self.assertEqual(report.gates_removed, 3)
+        self.assertEqual(report.connections_removed, 4)
+        self.assertEqual(manager.connections["X2"], {"AND1": [PinConnection('O', 'A')], "OUT": [PinConnection('O', 'B')]})
+        self.assertEqual(manager.truth_table(["A", "B", "C"], ["OUT"], packed=True).columns, before)
+
+    def test_observed_outputs_kept(self):
+        manager = self.create_circuit()
+
+        optimize.merge_duplicates(manager, ["OUT", "Y2"])
+
+        self.assertIn("Y2", manager.connections)
+        self.assertNotIn("Y1", manager.connections)
+        self.assertEqual(manager.connections["X1"], {"X2": [PinConnection('O', 'A')], "Y2": [PinConnection('O', 'B')]})
+
+    def test_compiler_hashes_duplicates(self):
+        manager = self.create_circuit()
+        compiled = manager.compile()
+
+        self.assertNotIn("'Y1'", compiled.source)
+        self.assertNotIn("'Y2'", compiled.source)
+        values = compiled.function(1, manager._source_words(compiled, {"A": 1, "B": 0, "C": 0}, 1))
+        self.assertEqual(values[compiled.index["Y2"]], values[compiled.index["X2"]])
+        self.assertEqual(values[compiled.index["OUT"]], 1)
+
+class TestAigOptimizer(TestCase):
+    # Builds an 8 input AND chain, a redundant a & (a | b) term and a full adder
+    def create_circuit(self):
+        manager = create_switch_adder()
+        names = [f"S{index}" for index in range(8)]
+        for name in names:
+            manager.add_gate(Switch("SWITCH", name))
+
+        previous = names[0]
+        for index, name in enumerate(names[1:]):
+            manager.add_gate(ANDGate("AND", f"CHAIN{index}"))
+            manager.add_connection(GatePin(previous, 'O'), GatePin(f"CHAIN{index}", 'A'))
+            manager.add_connection(GatePin(name, 'O'), GatePin(f"CHAIN{index}", 'B'))
+            previous = f"CHAIN{index}"
+
+        manager.add_gate(ORGate("OR", "EITHER"))
+        manager.add_gate(ANDGate("AND", "ABSORB"))
+        manager.add_connection(GatePin("A", 'O'), GatePin("EITHER", 'A'))
+        manager.add_connection(GatePin("B", 'O'), GatePin("EITHER", 'B'))
+        manager.add_connection(GatePin("A", 'O'), GatePin("ABSORB", 'A'))
+        manager.add_connection(GatePin("EITHER", 'O'), GatePin("ABSORB", 'B'))
+
+        return manager
+
+    def test_equivalent(self):
+        manager = self.create_circuit()
+        inputs = ["A", "B", "C"] + [f"S{index}" for index in range(8)]
+        outputs = ["XOR2", "OR1", "CHAIN6", "ABSORB"]
+
+        optimized, _ = aig.optimize(manager, outputs)
+
+        self.assertEqual(optimized.truth_table(inputs, outputs, packed=True).columns,
+                         manager.truth_table(inputs, outputs, packed=True).columns)
+
+    def test_report(self):
+        manager = self.create_circuit()
+
+        optimized, report = aig.optimize(manager, ["CHAIN6", "ABSORB"])
+
+        # The chain is 7 deep and gets balanced to 3, and a & (a | b) is just a
+        self.assertEqual(report.depth_before, 7)
+        self.assertEqual(report.depth_after, 3)
+        self.assertEqual(report.nodes_before, 9)
+        self.assertEqual(report.nodes_after, 7)
+        self.assertEqual(report.levels_after, 4)
+        self.assertIsInstance(optimized["ABSORB"], ANDGate)
+        self.assertEqual(optimized.connections["A"]["ABSORB"], [PinConnection('O', 'A')])
+
+    def test_rewriting_rules(self):
+        graph = aig.Aig()
+        a = graph.add_input("a")
+        b = graph.add_input("b")
+        ab = graph.and_(a, b)
+
+        self.assertEqual(graph.and_(a, ab), ab)
+        self.assertEqual(graph.and_(a ^ 1, ab), 0)
+        self.assertEqual(graph.and_(a, graph.and_(a ^ 1, b) ^ 1), a)
+        self.assertEqual(graph.and_(a, ab ^ 1), graph.and_(a, b ^ 1))
+        self.assertEqual(graph.and_(b, a), ab)
+
+    def test_constant_and_input_outputs(self):
+        manager = LogicGateManager()
+        for gate in (Switch("SWITCH", "A"), Switch("SWITCH", "B"), NOTGate("NOT", "NOT1"), ANDGate("AND", "ZERO"),
+                     ORGate("OR", "COPY")):
+            manager.add_gate(gate)
+        manager.add_connection(GatePin("A", 'O'), GatePin("NOT1", 'A'))
+        manager.add_connection(GatePin("A", 'O'), GatePin("ZERO", 'A'))
+        manager.add_connection(GatePin("NOT1", 'O'), GatePin("ZERO", 'B'))
+        manager.add_connection(GatePin("B", 'O'), GatePin("COPY", 'A'))
+        manager.add_connection(GatePin("B", 'O'), GatePin("COPY", 'B'))
+
+        optimized, _ = aig.optimize(manager)
+
+        self.assertIsInstance(optimized["ZERO"], GND)
+        self.assertEqual(optimized.truth_table(["A", "B"], ["ZERO", "COPY"], packed=True).columns, [0b0000, 0b1010])
+
+class TestValidation(TestCase):
+    # Adds a NOT1 -> AND3 -> NOT1 loop and a floating AND4 reading it to the switch adder
+    def create_bad_adder(self, engine = "sweep", strict = False):
+        manager = create_switch_adder(engine)
+        manager.strict = strict
+        for gate in (NOTGate("NOT", "NOT1"), ANDGate("AND", "AND3"), ANDGate("AND", "AND4")):
+            manager.add_gate(gate)
+
+        manager.add_connection(GatePin("OR1", 'O'), GatePin("AND3", 'A'))
+        manager.add_connection(GatePin("AND3", 'O'), GatePin("NOT1", 'A'))
+        manager.add_connection(GatePin("NOT1", 'O'), GatePin("AND3", 'B'))
+        manager.add_connection(GatePin("NOT1", 'O'), GatePin("AND4", 'A'))
+        return manager
+
+    def test_valid_circuit(self):
+        report = create_switch_adder().validate()
+
+        self.assertEqual(report, ValidationReport([], [], []))
+
+    def test_report(self):
+        report = self.create_bad_adder().validate(raise_errors=False)
+
+        self.assertEqual(report.loops, [["AND3", "NOT1"]])
+        self.assertEqual(report.undriven, [GatePin("AND4", 'B')])
+        self.assertEqual(report.blocked, [])
+
+    def test_raises(self):
+        manager = self.create_bad_adder()
+
+        with self.assertRaises(CircuitValidationException) as context:
+            manager.validate()
+        self.assertIsInstance(context.exception, LogicGateManagerException)
+        self.assertEqual(context.exception.report.undriven, [GatePin("AND4", 'B')])
+        self.assertIn("AND3, NOT1", str(context.exception))
+
+    def test_self_loop_and_blocked_gates(self):
+        manager = create_switch_adder()
+        manager.add_gate(ANDGate("AND", "LATCH", ['A']))
+        manager.add_gate(NOTGate("NOT", "NOT1"))
+        manager.add_connection(GatePin("LATCH", 'O'), GatePin("LATCH", 'A'))
+        manager.add_connection(GatePin("LATCH", 'O'), GatePin("NOT1", 'A'))
+        report = manager.validate(raise_errors=False)
+
+        self.assertEqual(report.loops, [["LATCH"]])
+        self.assertEqual(report.blocked, ["NOT1"])
+
+    def test_revalidated_after_change(self):
+        manager = self.create_bad_adder()
+        self.assertTrue(manager.validate(raise_errors=False).loops)
+        manager.remove_gate("NOT1")
+
+        self.assertEqual(manager.validate(raise_errors=False).loops, [])
+        self.assertEqual(manager.validate(raise_errors=False).undriven, [GatePin("AND3", 'B'), GatePin("AND4", 'A'), GatePin("AND4", 'B')])
+
+    def test_strict_mode(self):
+        for engine in LogicGateManager.ENGINES:
+            manager = self.create_bad_adder(engine, strict=True)
+            with self.assertRaises(CircuitValidationException):
+                manager.step()
+            with self.assertRaises(CircuitValidationException):
+                manager.step()
+
+    def test_long_chain(self):
+        manager = LogicGateManager()
+        manager.add_gate(Switch("SWITCH", "S"))
+        previous = "S"
+        for index in range(5000):
+            manager.add_gate(NOTGate("NOT", f"NOT{index}"))
+            manager.add_connection(GatePin(previous, 'O'), GatePin(f"NOT{index}", 'A'))
+            previous = f"NOT{index}"
+        manager.add_connection(GatePin(previous, 'O'), GatePin("NOT0", 'A'))
+        manager.connections["S"].clear()
+
+        self.assertEqual(len(manager.validate(raise_errors=False).loops[0]), 5000)
+
+    # The sweep engine stops once a pass runs no new gates instead of sweeping 1000 times
+    def test_sweep_stops_without_progress(self):
+        manager = self.create_bad_adder()
+        manager["A"].value = 1
+        manager["B"].value = 1
+        with mock.patch.object(ANDGate, "_logic", autospec=True, side_effect=ANDGate._logic) as logic:
+            manager.step()
+
+        self.assertEqual(manager["OR1"].outputs['O'], 1)
+        self.assertLess(logic.call_count, 20)
+
+class TestIncrementalSchedule(TestCase):
+    # Compares the incrementally maintained levels with a levelization built from scratch
+    def assertMatchesRebuild(self, manager):
+        levels = [set(level) for level in manager.levelize()]
+        dead = manager._get_schedule().dead
+        manager._invalidate()
+
+        self.assertEqual(levels, [set(level) for level in manager.levelize()])
+        self.assertEqual(dead, manager._get_schedule().dead)
+
+    def test_edits_match_rebuild(self):
+        manager = create_switch_adder("compiled")
+        manager.levelize()
+        manager.add_gate(NOTGate("NOT", "NOT1"))
+        manager.add_connection(GatePin("OR1", 'O'), GatePin("NOT1", 'A'))
+        self.assertEqual(manager.levelize()[-1], ["NOT1"])
+        self.assertMatchesRebuild(manager)
+
+        manager.remove_gate("XOR1")
+        self.assertEqual(manager._get_schedule().dead, ["XOR2", "AND1", "OR1", "NOT1"])
+        self.assertMatchesRebuild(manager)
+
+    def test_forward_connection_keeps_levels(self):
+        manager = create_switch_adder("compiled")
+        manager.add_gate(ANDGate("AND", "AND3", ['A']))
+        manager.step()
+        rank = dict(manager._get_schedule().rank)
+
+        with mock.patch.object(IncrementalCircuit, "_update", autospec=True) as update:
+            manager.add_connection(GatePin("A", 'O'), GatePin("OR1", 'A'))
+        update.assert_not_called()
+        self.assertEqual(manager._get_schedule().rank, rank)
+
+    def test_only_touched_chunks_recompiled(self):
+        manager = create_switch_adder("compiled")
+        manager.step()
+        manager.add_gate(NOTGate("NOT", "NOT1"))
+        manager.add_connection(GatePin("AND2", 'O'), GatePin("NOT1", 'A'))
+
+        with mock.patch.object(IncrementalCircuit, "_compile", autospec=True, side_effect=IncrementalCircuit._compile) as compile:
+            manager.step()
+        self.assertEqual(sorted(tuple(call.args[1].names) for call in compile.call_args_list), [("XOR1", "AND2"), ("XOR2", "AND1", "NOT1")])
+        self.assertEqual(manager["NOT1"].outputs['O'], 1)
+
+    def test_loop_and_undo(self):
+        manager = create_switch_adder("levelized")
+        manager.levelize()
+        manager.add_gate(ANDGate("AND", "AND3", ['A']))
+        manager.add_connection(GatePin("OR1", 'O'), GatePin("AND3", 'A'))
+        manager.add_connection(GatePin("AND3", 'O'), GatePin("AND1", 'A'))
+        self.assertEqual(manager._get_schedule().dead, ["AND1", "OR1", "AND3"])
+        self.assertMatchesRebuild(manager)
+
+        manager.remove_gate("AND3")
+        self.assertEqual(manager.levelize(), [["A", "B", "C"], ["XOR1", "AND2"], ["XOR2", "AND1"], ["OR1"]])
+
+    def test_compiled_engine_after_edits(self):
+        compiled = create_switch_adder("compiled")
+        levelized = create_switch_adder("levelized")
+        for manager in (compiled, levelized):
+            manager.step()
+            manager.remove_gate("OR1")
+            manager.add_gate(NORGate("NOR", "NOR1"))
+            manager.add_connection(GatePin("AND1", 'O'), GatePin("NOR1", 'A'))
+            manager.add_connection(GatePin("AND2", 'O'), GatePin("NOR1", 'B'))
+
+        for value in range(8):
+            for bit, name in enumerate(("C", "B", "A")):
+                compiled.set_switch(name, (value >> bit) & 1)
+                levelized.set_switch(name, (value >> bit) & 1)
+            compiled.step()
+            levelized.step()
+
+            for name in ("XOR2", "NOR1"):
+                self.assertEqual(compiled[name].outputs.pins, levelized[name].outputs.pins)
+
+    def test_replacing_gate_rebuilds(self):
+        manager = create_switch_adder("compiled")
+        manager.levelize()
+        manager.add_gate(ORGate("OR", "AND2"))
+
+        self.assertEqual(manager._get_schedule().rank["AND2"], 1)
+        self.assertNotIn("OR1", manager._get_schedule().rank)
+
+class TestFaultSimulation(TestCase):
+    EXHAUSTIVE = [((value >> 2) & 1, (value >> 1) & 1, value & 1) for value in range(8)]
+
+    def test_enumerate_faults(self):
+        fault_list = faults.enumerate_faults(create_switch_adder())
+
+        self.assertEqual(len(fault_list), 36)
+        self.assertEqual(fault_list[:2], [faults.Fault("A", 'O', True, 0), faults.Fault("A", 'O', True, 1)])
+        self.assertIn(faults.Fault("XOR2", 'B', False, 1), fault_list)
+
+    def test_exhaustive_vectors_detect_everything(self):
+        report = faults.simulate(create_switch_adder(), ["A", "B", "C"], self.EXHAUSTIVE, processes=1)
+
+        self.assertEqual(report.coverage, 1.0)
+        self.assertEqual(report.undetected, [])
+
+    def test_single_vector(self):
+        report = faults.simulate(create_switch_adder(), ["A", "B", "C"], [(1, 1, 0)], processes=1)
+
+        self.assertEqual(len(report.detected), 14)
+        self.assertAlmostEqual(report.coverage, 14 / 36)
+        self.assertIn(faults.Fault("A", 'O', True, 0), report.detected)
+        self.assertIn(faults.Fault("OR1", 'B', False, 0), report.detected)
+        self.assertIn(faults.Fault("A", 'O', True, 1), report.undetected)
+        self.assertIn(faults.Fault("XOR2", 'A', False, 0), report.undetected)
+
+    # An input pin fault only affects the gate reading it, not the other gates on the same net
+    def test_input_and_output_pin_faults(self):
+        manager = create_switch_adder()
+        fault_list = [faults.Fault("XOR1", 'O', True, 1), faults.Fault("XOR2", 'A', False, 1)]
+        report = faults.simulate(manager, ["A", "B", "C"], [(0, 0, 1)], ["OR1"], fault_list, processes=1)
+
+        self.assertEqual(report.detected, [faults.Fault("XOR1", 'O', True, 1)])
+
+    def test_process_pool_matches(self):
+        manager = create_switch_adder()
+        vectors = [(1, 1, 0), (0, 0, 1)]
+
+        self.assertEqual(faults.simulate(manager, ["A", "B", "C"], vectors, word_bits=8, processes=2),
+                         faults.simulate(manager, ["A", "B", "C"], vectors, processes=1))
+
+    def test_invalid_arguments(self):
+        manager = create_switch_adder()
+        with self.assertRaises(LogicGateManagerException):
+            faults.simulate(manager, ["XOR1"], [(1,)])
+        with self.assertRaises(LogicGateManagerException):
+            faults.simulate(manager, ["A"], [(1,)], faults=[faults.Fault("XOR1", 'C', False, 0)])
+        with self.assertRaises(ValueError):
+            faults.simulate(manager, ["A", "B"], [(1,)])
+
+class TestSimulateMany(TestCase):
+    VECTORS = [((value >> 2) & 1, (value >> 1) & 1, value & 1) for value in range(8)] * 5
+
+    def test_matches_batch(self):
+        manager = create_switch_adder()
+        expected = manager.simulate_batch(["A", "B", "C"], self.VECTORS, ["XOR2", "OR1"])
+
+        self.assertEqual(manager.simulate_many(["A", "B", "C"], self.VECTORS, ["XOR2", "OR1"], chunk_size=3, processes=1), expected)
+        self.assertEqual(manager.simulate_many(["A", "B", "C"], iter(self.VECTORS), ["XOR2", "OR1"], chunk_size=7, processes=2), expected)
+
+    def test_sink(self):
+        manager = create_switch_adder()
+        chunks = []
+        count = manager.simulate_many(["A", "C"], ((a, c) for a in (0, 1) for c in (0, 1)), ["XOR2"],
+                                      chunk_size=3, processes=1, sink=chunks.append)
+
+        self.assertEqual(count, 4)
+        self.assertEqual(chunks, [[(0,), (1,), (1,)], [(0,)]])
+
+    def test_undriven_switches_keep_value(self):
+        manager = create_switch_adder()
+        manager.set_switch("B", 1)
+
+        self.assertEqual(manager.simulate_many(["A"], [(0,), (1,)], ["XOR1", "AND2"], processes=1), [(1, 0), (0, 1)])
+
+    def test_invalid_inputs(self):
+        manager = create_switch_adder()
+        with self.assertRaises(LogicGateManagerException):
+            manager.simulate_many(["XOR1"], [(1,)], processes=1)
+        with self.assertRaises(LogicGateManagerException):
+            manager.simulate_many(["A"], [(1,)], chunk_size=0, processes=1)
+
+class TestVcdRecorder(TestCase):
+    def test_pulse_hooks(self):
+        manager = create_switch_adder()
+        calls = []
+        hook = lambda manager, cycle: calls.append(cycle)
+        manager.add_pulse_hook(hook)
+        manager.step()
+        manager.run_cycles(2)
+        manager.remove_pulse_hook(hook)
+        manager.step()
+
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertEqual(manager.cycle, 4)
+        with self.assertRaises(LogicGateManagerException):
+            manager.remove_pulse_hook(hook)
+
+    def test_records_changes_only(self):
+        manager = create_switch_adder("compiled")
+        file = io.StringIO()
+        with waveform.VcdRecorder(manager, file, ["A", "XOR2", GatePin("OR1", 'B')], period=10):
+            manager.step()
+            manager.set_switch("A", 1)
+            manager.step()
+            manager.step()
+            manager.set_switch("B", 1)
+            manager.step()
+        lines = file.getvalue().splitlines()
+
+        self.assertIn("$timescale 1 ns $end", lines)
+        self.assertEqual(lines[lines.index("$scope module XOR2 $end") + 1], '$var wire 1 " O $end')
+        self.assertEqual(lines[lines.index("$scope module OR1 $end") + 1], "$var wire 1 # B $end")
+        self.assertEqual(lines[lines.index("$enddefinitions $end") + 1:],
+                         ["#0", "$dumpvars", "0!", '0"', "0#", "$end", "#10", "1!", '1"', "#30", '0"', "1#", "#40"])
+        self.assertEqual(manager._pulse_hooks, [])
+
+    def test_buffered_writes(self):
+        manager = create_switch_adder()
+        file = io.StringIO()
+        recorder = waveform.VcdRecorder(manager, file, buffer_size=1 << 20)
+        manager.run_cycles(3)
+        self.assertEqual(file.getvalue(), "")
+
+        recorder.close()
+        self.assertIn("$dumpvars", file.getvalue())
+        recorder.close()
+
+    def test_invalid_signals(self):
+        manager = create_switch_adder()
+        with self.assertRaises(LogicGateManagerException):
+            waveform.VcdRecorder(manager, io.StringIO(), ["MISSING"])
+        with self.assertRaises(LogicGateManagerException):
+            waveform.VcdRecorder(manager, io.StringIO(), [GatePin("XOR1", 'C')])
+
+    def test_identifiers(self):
+        self.assertEqual([waveform.identifier(index) for index in (0, 93, 94, 95)], ["!", "~", "!!", '"!'])
+        self.assertEqual(len({waveform.identifier(index) for index in range(20000)}), 20000)
+
+class TestTrace(TestCase):
+    # Records the switch adder while counting A, B and C up from 0 to 7, one count per pulse
+    def record(self, path, **kwargs):
+        manager = create_switch_adder("compiled")
+        with trace.TraceRecorder(manager, path, ["A", "XOR2", GatePin("OR1", 'O'), GatePin("OR1", 'B')], **kwargs):
+            for value in range(8):
+                for bit, name in enumerate(("C", "B", "A")):
+                    manager.set_switch(name, (value >> bit) & 1)
+                manager.step()
+        return manager
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "adder.trace")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_values(self):
+        for segment_cycles in (1 << 16, 3, 1):
+            self.record(self.path, segment_cycles=segment_cycles)
+            with trace.TraceReader(self.path) as reader:
+                self.assertEqual(reader.cycles, range(0, 8))
+                self.assertEqual(reader.nets[1], GatePin("XOR2", 'O'))
+                for value in range(8):
+                    a, b, c = (value >> 2) & 1, (value >> 1) & 1, value & 1
+                    self.assertEqual(reader.value("A", value), a)
+                    self.assertEqual(reader.value(GatePin("XOR2", 'O'), value), a ^ b ^ c)
+                    self.assertEqual(reader.value(2, value), int(a + b + c >= 2))
+                    self.assertEqual(reader.value(GatePin("OR1", 'B'), value), a & b)
+
+    def test_changes(self):
+        self.record(self.path, segment_cycles=2)
+        with trace.TraceReader(self.path) as reader:
+            self.assertEqual(reader.changes("XOR2", 0, 8), [(1, 1), (3, 0), (4, 1), (5, 0), (7, 1)])
+            self.assertEqual(reader.changes("XOR2", 2, 5), [(3, 0), (4, 1)])
+            self.assertEqual(reader.changes("A", 0, 4), [])
+            self.assertEqual(reader.toggle_count("XOR2"), 5)
+
+    def test_only_closed_trace_files_open(self):
+        manager = create_switch_adder()
+        recorder = trace.TraceRecorder(manager, self.path)
+        manager.step()
+        recorder._file.flush()
+
+        with self.assertRaises(trace.TraceException):
+            trace.TraceReader(self.path)
+        recorder.close()
+        with trace.TraceReader(self.path) as reader:
+            self.assertEqual(reader.value("XOR1", 0), 0)
+            with self.assertRaises(trace.TraceException):
+                reader.value("XOR1", 1)
+            with self.assertRaises(trace.TraceException):
+                reader.value("MISSING", 0)
+
+    def test_delta_encoding(self):
+        cycles = [3, 4, 200, 70000, 70001]
+
+        self.assertEqual(trace.encode_deltas(cycles, 3), bytes([0, 1, 196, 1, 0xA8, 0xA1, 0x04, 1]))
+        self.assertEqual(trace.decode_deltas(trace.encode_deltas(cycles, 3), 3), cycles)
+
+class TestProfiler(TestCase):
+    # Steps the switch adder with A off, then on, then off again
+    def run_adder(self, manager):
+        for value in (0, 1, 0):
+            manager.set_switch("A", value)
+            manager.step()
+
+    def test_sweep_profile(self):
+        manager = create_switch_adder()
+        with manager.profile() as profiler:
+            self.run_adder(manager)
+        report = profiler.report()
+
+        self.assertEqual(report.pulses, 3)
+        self.assertEqual(report.passes, {1: 3})
+        self.assertEqual(report.gates["OR1"].evaluations, 3)
+        self.assertEqual(report.gates["A"].toggles, 2)
+        self.assertEqual(report.gates["XOR2"].toggles, 2)
+        self.assertEqual(report.gates["OR1"].toggles, 0)
+        self.assertGreater(report.gates["XOR1"].logic_time, 0)
+        self.assertGreaterEqual(report.elapsed, report.engine_time)
+        self.assertGreater(report.pulses_per_second, 0)
+
+    def test_sweep_passes(self):
+        # The inverter is swept before the switch driving it, so it only runs on the second pass
+        manager = LogicGateManager()
+        manager.add_gate(NOTGate("NOT", "NOT1"))
+        manager.add_gate(Switch("SWITCH", "A"))
+        manager.add_connection(GatePin("A", 'O'), GatePin("NOT1", 'A'))
+
+        with manager.profile() as profiler:
+            manager.run_cycles(4)
+
+        self.assertEqual(profiler.report().passes, {2: 4})
+        self.assertEqual(profiler.report().gates["A"].evaluations, 8)
+        self.assertEqual(profiler.report().gates["NOT1"].evaluations, 4)
+
+    def test_engines_count_the_same_toggles(self):
+        reports = []
+        for engine in LogicGateManager.ENGINES:
+            manager = create_switch_adder(engine)
+            with manager.profile() as profiler:
+                self.run_adder(manager)
+            reports.append(profiler.report())
+
+        for report in reports:
+            self.assertEqual({name: gate.toggles for name, gate in report.gates.items()},
+                             {name: gate.toggles for name, gate in reports[0].gates.items()})
+        levelized, event, compiled = reports[1:]
+        self.assertEqual(levelized.passes, {1: 3})
+        self.assertEqual(levelized.gates["OR1"].evaluations, 3)
+        self.assertEqual(event.gates["OR1"].evaluations, 1)
+        self.assertEqual(compiled.gates["OR1"].evaluations, 3)
+        self.assertEqual(compiled.gates["OR1"].logic_time, 0)
+
+    def test_stopping_restores_the_gates(self):
+        manager = create_switch_adder("levelized")
+        profiler = manager.profile()
+        self.assertIn('_logic', vars(manager["XOR1"]))
+        with self.assertRaises(LogicGateManagerException):
+            manager.profile()
+
+        manager.step()
+        profiler.stop()
+        manager.step()
+
+        self.assertNotIn('_logic', vars(manager["XOR1"]))
+        self.assertIsNone(manager._profiler)
+        self.assertEqual(profiler.report().pulses, 1)
+        self.assertEqual(profiler.report().gates["XOR1"].evaluations, 1)
+
+    def test_clock_pulses(self):
+        manager = create_switch_adder()
+        manager.clock = Clock(frequency=200)
+        with manager.profile() as profiler:
+            pulses = manager.start_clock(max_cycles=10)
+
+        self.assertEqual(profiler.report().pulses, pulses)
+        self.assertLess(profiler.report().pulses_per_second, 400)
+
+class TestBenchmarks(TestCase):
+    # Simulates every combination of the circuit's inputs and returns the outputs read as numbers
+    def outputs(self, generated):
+        manager, inputs, outputs = generated
+        vectors = [tuple((value >> bit) & 1 for bit in range(len(inputs))) for value in range(1 << len(inputs))]
+        return [sum(bit << position for position, bit in enumerate(row))
+                for row in manager.simulate_batch(inputs, vectors, outputs)]
+
+    def test_adder(self):
+        results = self.outputs(benchmarks.ripple_carry_adder(3))
+        self.assertEqual(results, [(value & 7) + ((value >> 3) & 7) + (value >> 6) for value in range(128)])
+
+    def test_multiplier(self):
+        for bits in (1, 2, 3):
+            results = self.outputs(benchmarks.array_multiplier(bits))
+            mask = (1 << bits) - 1
+            self.assertEqual(results, [(value & mask) * (value >> bits) for value in range(1 << 2 * bits)])
+
+    def test_parity_and_random_circuits(self):
+        self.assertEqual(self.outputs(benchmarks.parity_tree(5)), [bin(value).count('1') & 1 for value in range(32)])
+
+        first = benchmarks.random_dag(300, seed=4)
+        second = benchmarks.random_dag(300, seed=4)
+        self.assertEqual(first.manager.connections, second.manager.connections)
+        self.assertEqual(first.manager.validate(), ValidationReport([], [], []))
+        self.assertEqual(sorted(first.outputs), sorted(name for name in first.manager.sinks() if name not in first.inputs))
+
+    def test_results_round_trip_and_compare(self):
+        results = benchmarks.run({"adder": [2], "parity": [4]}, pulses=2, vectors=16, repeat=1)
+        self.assertEqual([(result.circuit, result.size, result.gates) for result in results], [("adder", 2, 15), ("parity", 4, 7)])
+        self.assertEqual(set(results[0].pulse_seconds), set(LogicGateManager.ENGINES))
+
+        file = io.StringIO()
+        benchmarks.write_results(results, file)
+        file.seek(0)
+        self.assertEqual(benchmarks.read_results(file), results)
+
+        slower = [result._replace(build_seconds=result.build_seconds * 3,
+                                  vectors_per_second=result.vectors_per_second / 3) for result in results]
+        regressions = benchmarks.compare(results, slower)
+        self.assertEqual({(regression.circuit, regression.metric) for regression in regressions},
+                         {(circuit, metric) for circuit in ("adder", "parity") for metric in ("build_seconds", "vectors_per_second")})
+        self.assertEqual(benchmarks.compare(slower, results), [])
+
+class TestImporters(TestCase):
+    C17 = """# c17
+INPUT(G1)
+INPUT(G2)
+INPUT(G3)
+INPUT(G6)
+INPUT(G7)
+OUTPUT(G22)
+OUTPUT(G23)
+
+G10 = NAND(G1, G3)
+G11 = NAND(G3, G6)
+G16 = NAND(G2, G11)
+G19 = NAND(G11, G7)
+G22 = NAND(G10, G16)
+G23 = NAND(G16, G19)
+"""
+
+    # Simulates every combination of the circuit's inputs
+    def simulate(self, circuit):
+        vectors = list(itertools.product((0, 1), repeat=len(circuit.inputs)))
+        return vectors, circuit.manager.simulate_batch(circuit.inputs, vectors, circuit.outputs)
+
+    def test_bench(self):
+        circuit = importers.load_bench(io.StringIO(self.C17))
+        nand = lambda a, b: 1 - (a & b)
+
+        self.assertEqual(circuit.inputs, ["G1", "G2", "G3", "G6", "G7"])
+        self.assertEqual(circuit.outputs, ["G22", "G23"])
+        vectors, results = self.simulate(circuit)
+        for (g1, g2, g3, g6, g7), result in zip(vectors, results):
+            g11 = nand(g3, g6)
+            g16 = nand(g2, g11)
+            self.assertEqual(result, (nand(nand(g1, g3), g16), nand(g16, nand(g11, g7))))
+
+    def test_bench_wide_gates_and_buffers(self):
+        circuit = importers.load_bench(io.StringIO(
+            "INPUT(a)\nINPUT(b)\nINPUT(c)\nINPUT(d)\nOUTPUT(x)\nOUTPUT(y)\nOUTPUT(z)\n"
+            "x = XNOR(a, b, c, d)\ny = nor(a, b, c)\nz = BUFF(d)  # trailing comment\n"))
+
+        self.assertEqual(set(circuit.manager.connections) - set("abcdxyz"), {"x#1", "x#2"})
+        vectors, results = self.simulate(circuit)
+        self.assertEqual(results, [(1 - (a ^ b ^ c ^ d), 1 - (a | b | c), d) for a, b, c, d in vectors])
+
+        # Every engine reads the chain and the one-input buffer the same
+        for engine in LogicGateManager.ENGINES:
+            circuit.manager.engine = engine
+            for name, value in zip("abcd", (1, 0, 1, 1)):
+                circuit.manager.set_switch(name, value)
+            circuit.manager.step()
+            self.assertEqual([circuit.manager[name].outputs.pins['O'] for name in "xyz"], [0, 0, 1])
+
+    def test_made_up_names_do_not_collide(self):
+        circuit = importers.load_bench(io.StringIO(
+            "INPUT(a)\nINPUT(b)\nINPUT(c)\nOUTPUT(x)\nOUTPUT(x/1)\nx = XOR(a, b, c)\nx/1 = AND(a, b)\n"))
+
+        vectors, results = self.simulate(circuit)
+        self.assertEqual(results, [(a ^ b ^ c, a & b) for a, b, c in vectors])
+
+    def test_flip_flops(self):
+        # Two-bit counter: q0 toggles every clock and q1 toggles when q0 is set
+        circuit = importers.load_bench(io.StringIO(
+            "OUTPUT(q1)\nq0 = DFF(d0)\nq1 = DFF(d1)\nd0 = NOT(q0)\nd1 = XOR(q1, q0)\n"), "levelized")
+        self.assertEqual(circuit.latches, [importers.Latch("d0", "q0"), importers.Latch("d1", "q1")])
+
+        counts = []
+        for _ in range(5):
+            counts.append(circuit.manager["q1"].value * 2 + circuit.manager["q0"].value)
+            circuit.manager.step()
+            importers.advance_latches(circuit)
+        self.assertEqual(counts, [0, 1, 2, 3, 0])
+
+    def test_blif(self):
+        circuit = importers.load_blif(io.StringIO("""
+.model example   # comment
+.inputs a b \\
+    c
+.outputs x n s one zero
+.names a b x
+01 1
+10 1
+.names a n
+0 1
+.names a b c s
+1-0 1
+-11 1
+.names one
+1
+.names zero
+.latch s q 1
+.end
+"""))
+        self.assertEqual(circuit.inputs, ["a", "b", "c"])
+        self.assertEqual(circuit.latches, [importers.Latch("s", "q")])
+        self.assertEqual(circuit.manager["q"].value, 1)
+        self.assertEqual(circuit.manager["x"].op, "XOR")
+        self.assertEqual(circuit.manager["n"].op, "NOT")
+
+        vectors, results = self.simulate(circuit)
+        self.assertEqual(results, [(a ^ b, 1 - a, int(a and not c or b and c), 1, 0) for a, b, c in vectors])
+
+    def test_blif_off_set_covers(self):
+        circuit = importers.load_blif(io.StringIO(".inputs a b\n.outputs y z\n.names a b y\n11 0\n.names a b z\n00 0\n01 0\n"))
+
+        self.assertEqual(circuit.manager["y"].op, "NAND")
+        vectors, results = self.simulate(circuit)
+        self.assertEqual(results, [(1 - (a & b), a) for a, b in vectors])
+
+    def test_errors(self):
+        with self.assertRaises(importers.NetlistImportException) as context:
+            importers.load_bench(io.StringIO("INPUT(a)\nb = FOO(a)\n"))
+        self.assertEqual(context.exception.line, 2)
+        with self.assertRaises(importers.NetlistImportException):
+            importers.load_bench(io.StringIO("INPUT(a)\nb = AND(a, c)\n"))
+        with self.assertRaises(importers.NetlistImportException) as context:
+            importers.load_bench(io.StringIO("INPUT(a)\na = NOT(a)\n"))
+        self.assertEqual(context.exception.line, 2)
+        with self.assertRaises(importers.NetlistImportException):
+            importers.load_blif(io.StringIO(".inputs a\n.names a y\n1 1\n0 0\n"))
+        with self.assertRaises(importers.NetlistImportException):
+            importers.load_blif(io.StringIO(".inputs a\n.subckt adder a=a\n"))
+        with self.assertRaises(importers.NetlistImportException):
+            importers.load_netlist("circuit.v")
+
+    def test_add_netlist(self):
+        manager = create_switch_adder("compiled")
+        manager.step()
+        inverter = NOTGate("NOT", "NOT1")
+
+        manager.add_netlist([inverter], {"OR1": {"NOT1": [PinConnection('O', 'A')]}})
+        manager.set_switch("A", 1)
+        manager.set_switch("B", 1)
+        manager.step()
+        self.assertEqual(inverter.outputs.pins['O'], 0)
+        self.assertEqual(manager.sinks(), ["XOR2", "NOT1"])
+
+        with self.assertRaises(LogicGateManagerException):
+            manager.add_netlist([], {"OR1": {"MISSING": [PinConnection('O', 'A')]}})
+
+class TestSerialization(TestCase):
+    def check_restored(self, manager, restored):
+        self.assertEqual(restored.connections, manager.connections)
+        for name, gate in manager._gateKeeper.items():
+            copy = restored[name]
+            self.assertIs(type(copy), type(gate))
+            self.assertEqual((copy.type, copy.inputs.pins, copy.outputs.pins), (gate.type, gate.inputs.pins, gate.outputs.pins))
+            self.assertEqual(copy.inputs.setpins, dict.fromkeys(gate.inputs.pins, 0))
+
+        vectors = list(itertools.product((0, 1), repeat=3))
+        self.assertEqual(restored.simulate_batch(["A", "B", "C"], vectors), manager.simulate_batch(["A", "B", "C"], vectors))
+
+    def test_round_trip(self):
+        manager = create_switch_adder("event")
+        manager.set_switch("B", 1)
+        manager.add_gate(VCC("VCC", "Vcc ✓"))
+        manager.add_gate(NANDGate("NAND", "NAND1", inputs=['A', 'B', 'C']))
+        for pin in "ABC":
+            manager.add_connection(GatePin("Vcc ✓", 'O'), GatePin("NAND1", pin))
+
+        for restored in (serialization.loads(serialization.dumps(manager)),
+                         serialization.loads_json(serialization.dumps_json(manager))):
+            self.check_restored(manager, restored)
+            self.assertEqual(restored.engine, "event")
+            self.assertEqual(restored["B"].value, 1)
+            restored.step()
+            self.assertEqual((restored["XOR2"].outputs.pins['O'], restored["OR1"].outputs.pins['O']), (1, 0))
+            self.assertEqual(restored["NAND1"].outputs.pins['O'], 0)
+
+        # Connections with the same pins share one PinConnection
+        restored = serialization.loads(serialization.dumps(manager), engine="compiled")
+        self.assertEqual(restored.engine, "compiled")
+        self.assertIs(restored.connections["A"]["XOR1"][0], restored.connections["A"]["AND2"][0])
+
+    def test_files(self):
+        manager = create_switch_adder()
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("adder.circuit", "adder.json"):
+                path = os.path.join(directory, name)
+                serialization.save(manager, path)
+                self.check_restored(manager, serialization.load(path))
+
+            with open(os.path.join(directory, "adder.json")) as file:
+                self.assertEqual(json.load(file)["connections"]["C"], {"XOR2": [['O', 'B']], "AND1": [['O', 'B']]})
+
+    def test_bad_data(self):
+        data = serialization.dumps(create_switch_adder())
+
+        with self.assertRaises(serialization.SerializationException):
+            serialization.loads(b"not a circuit" * 4)
+        with self.assertRaises(serialization.SerializationException):
+            serialization.loads(data[:-20])
+        with self.assertRaises(serialization.SerializationException):
+            serialization.loads(data[:8] + struct.pack("<I", serialization.VERSION + 1) + data[12:])
+        with self.assertRaises(serialization.SerializationException):
+            serialization.loads(data[:12] + struct.pack("<I", 1 << 20) + data[16:])
+        with self.assertRaises(serialization.SerializationException):
+            serialization.loads_json('{"format": "digital_logic_simulator.circuit", "version": 1, "gates": [{"name": "A"}]}')
+        with self.assertRaises(serialization.SerializationException):
+            serialization.loads_json('[]')
+
+        class Buffer(ANDGate):
+            pass
+        manager = LogicGateManager()
+        manager.add_gate(Buffer("AND", "BUF1", inputs=['A']))
+        with self.assertRaises(serialization.SerializationException):
+            serialization.dumps(manager)
@@ -0,0 +1,300 @@
+"""
+Compact binary traces of recorded runs.  A TraceRecorder samples a selection of pins
+after every pulse, like the VcdRecorder, and writes the run as a series of segments.
+Each segment covers a range of cycles and holds the value every net had going into it
+as a bitmap, followed by the cycles each net changed on.  Pins only carry 0 or 1,
+so a change list is enough to know every value, and it is stored as varint-encoded
+deltas between consecutive changes.  Every segment ends with a table holding the
+offset, length and number of changes of every net's list, and the file ends with a
+footer listing the segments and the net names.
+
+A TraceReader memory-maps the file and only reads the footer up front.  Looking up the
+value of a net at a cycle binary searches the segments and decodes the change list of
+that one net in that one segment, so scrubbing through a trace never loads all of it.
+
+Layout, all integers little-endian:
+    header   magic b"LGTRACE1", net count (u32), reserved (u32)
+    segment  initial value bitmap, change lists, offsets (u64 per net),
+             lengths (u32 per net), change counts (u32 per net)
+    footer   segment count (u64), (start, end, bitmap offset, table offset) per segment
+             (4 x u64), length of the names (u64), names as JSON [[gate, pin], ...]
+    trailer  footer offset (u64), magic b"LGTRACE1"
+"""
+import bisect
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from gates.logic_gates import GatePin, LogicGateManager
+from gates.waveform import resolve_signals
+
+MAGIC = b"LGTRACE1"
+
+_HEADER = struct.Struct("<8sII")
+_SEGMENT = struct.Struct("<QQQQ")
+_COUNT = struct.Struct("<Q")
+_TRAILER = struct.Struct("<Q8s")
+
+"""
+Custom exception type for errors with traces
+"""
+class TraceException(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+"""
+Class that records pins of a LogicGateManager to a binary trace file.  signals is the
+same selection a VcdRecorder takes.  A segment is written whenever segment_cycles cycles
+or segment_changes changes have been recorded since the last one, which bounds the
+memory used while recording.
+"""
+class TraceRecorder:
+    def __init__(self, manager : LogicGateManager, path : str, signals : list = None,
+                 segment_cycles : int = 1 << 16, segment_changes : int = 1 << 20) -> None:
+        probes = resolve_signals(manager, signals)
+        self._manager = manager
+        self._probes = [(pins, pin) for _, pin, pins in probes]
+        self._names = [[gate, pin] for gate, pin, _ in probes]
+        self._segment_cycles = segment_cycles
+        self._segment_changes = segment_changes
+        self._segments = []
+
+        self._start = None
+        self._end = None
+        self._initial = None
+        self._last = None
+        self._changes = [[] for _ in self._probes]
+        self._pending = 0
+
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, len(self._probes), 0))
+        manager.add_pulse_hook(self._sample)
+
+    # Pulse hook noting the cycle of every pin that changed
+    def _sample(self, manager : LogicGateManager, cycle : int) -> None:
+        current = [pins[pin] for pins, pin in self._probes]
+
+        # A segment starts from the values the previous one ended on, so a change on its first
+        # cycle is still recorded as a change
+        if self._start is None:
+            self._start = cycle
+            self._initial = current if self._last is None else self._last
+        if self._last is not None and current != self._last:
+            for net, (value, last) in enumerate(zip(current, self._last)):
+                if value != last:
+                    self._changes[net].append(cycle)
+                    self._pending += 1
+
+        self._last = current
+        self._end = cycle + 1
+        if self._pending >= self._segment_changes or self._end - self._start >= self._segment_cycles:
+            self._write_segment()
+
+    # Writes the cycles recorded since the last segment as a new segment
+    def _write_segment(self) -> None:
+        if self._start is None:
+            return
+
+        bitmap = bytearray((len(self._probes) + 7) // 8)
+        for net, value in enumerate(self._initial):
+            if value:
+                bitmap[net >> 3] |= 1 << (net & 7)
+        bitmap_offset = self._file.tell()
+        self._file.write(bitmap)
+
+        offsets = array('Q')
+        lengths = array('I')
+        counts = array('I')
+        for changes in self._changes:
+            data = encode_deltas(changes, self._start)
+            offsets.append(self._file.tell())
+            lengths.append(len(data))
+            counts.append(len(changes))
+            self._file.write(data)
+            changes.clear()
+
+        table_offset = self._file.tell()
+        for table in (offsets, lengths, counts):
+            if sys.byteorder == "big":
+                table.byteswap()
+            self._file.write(table.tobytes())
+
+        self._segments.append((self._start, self._end, bitmap_offset, table_offset))
+        self._start = None
+        self._pending = 0
+
+    # Stops recording and writes the last segment and the footer
+    def close(self) -> None:
+        if self._manager is None:
+            return
+        self._manager.remove_pulse_hook(self._sample)
+        self._manager = None
+
+        self._write_segment()
+        footer = self._file.tell()
+        names = json.dumps(self._names).encode()
+        self._file.write(_COUNT.pack(len(self._segments)))
+        for segment in self._segments:
+            self._file.write(_SEGMENT.pack(*segment))
+        self._file.write(_COUNT.pack(len(names)))
+        self._file.write(names)
+        self._file.write(_TRAILER.pack(footer, MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+"""
+Class that reads a trace through a memory map.  Nets are addressed by their index, by
+a GatePin or by a gate name when only one pin of that gate was recorded.
+"""
+class TraceReader:
+    def __init__(self, path : str) -> None:
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise TraceException(f"{path} is not a trace file")
+
+        if len(self._map) < _HEADER.size + _TRAILER.size:
+            self.close()
+            raise TraceException(f"{path} is not a trace file")
+        magic, self._count, _ = _HEADER.unpack_from(self._map, 0)
+        footer, end_magic = _TRAILER.unpack_from(self._map, len(self._map) - _TRAILER.size)
+        if magic != MAGIC or end_magic != MAGIC:
+            self.close()
+            raise TraceException(f"{path} is not a trace file or was not closed")
+
+        segments, = _COUNT.unpack_from(self._map, footer)
+        position = footer + _COUNT.size
+        self._segments = [_SEGMENT.unpack_from(self._map, position + index * _SEGMENT.size) for index in range(segments)]
+        position += segments * _SEGMENT.size
+        length, = _COUNT.unpack_from(self._map, position)
+        position += _COUNT.size
+        self._nets = [GatePin(gate, pin) for gate, pin in json.loads(bytes(self._map[position:position + length]))]
+
+        self._starts = [segment[0] for segment in self._segments]
+        self._index = {net: index for index, net in enumerate(self._nets)}
+        self._gates = {}
+        for index, net in enumerate(self._nets):
+            self._gates.setdefault(net.gate, []).append(index)
+
+    @property
+    def nets(self) -> list:
+        return self._nets
+
+    # First cycle in the trace and one past the last one
+    @property
+    def cycles(self) -> range:
+        if not self._segments:
+            return range(0)
+        return range(self._segments[0][0], self._segments[-1][1])
+
+    # Returns the value of a net after the pulse of the given cycle
+    def value(self, net, cycle : int) -> int:
+        net = self._net(net)
+        segment = bisect.bisect_right(self._starts, cycle) - 1
+        if segment < 0 or cycle >= self._segments[segment][1]:
+            raise TraceException(f"Cycle {cycle} is not in the trace")
+
+        value = self._initial(segment, net)
+        for change in self._decode(segment, net):
+            if change > cycle:
+                break
+            value ^= 1
+        return value
+
+    # Returns the (cycle, value) of every change of a net in cycles [start, stop)
+    def changes(self, net, start : int, stop : int) -> list:
+        net = self._net(net)
+        changes = []
+        for segment in range(max(bisect.bisect_right(self._starts, start) - 1, 0), len(self._segments)):
+            first, end, _, _ = self._segments[segment]
+            if first >= stop:
+                break
+            if end <= start:
+                continue
+
+            value = self._initial(segment, net)
+            for cycle in self._decode(segment, net):
+                value ^= 1
+                if cycle >= stop:
+                    break
+                if cycle >= start:
+                    changes.append((cycle, value))
+        return changes
+
+    # Returns the number of times a net changed over the whole trace
+    def toggle_count(self, net) -> int:
+        net = self._net(net)
+        return sum(struct.unpack_from("<I", self._map, table + self._count * 12 + net * 4)[0]
+                   for _, _, _, table in self._segments)
+
+    def _net(self, net) -> int:
+        if isinstance(net, GatePin):
+            if net not in self._index:
+                raise TraceException(f"Pin {net.pin} of gate {net.gate} is not in the trace")
+            return self._index[net]
+        if isinstance(net, str):
+            if len(self._gates.get(net, ())) != 1:
+                raise TraceException(f"Gate {net} does not have exactly one pin in the trace")
+            return self._gates[net][0]
+        if not 0 <= net < self._count:
+            raise TraceException(f"Net {net} is not in the trace")
+        return net
+
+    def _initial(self, segment : int, net : int) -> int:
+        return (self._map[self._segments[segment][2] + (net >> 3)] >> (net & 7)) & 1
+
+    # Decodes the cycles a net changed on in a segment
+    def _decode(self, segment : int, net : int) -> list:
+        start, _, _, table = self._segments[segment]
+        offset, = struct.unpack_from("<Q", self._map, table + net * 8)
+        length, = struct.unpack_from("<I", self._map, table + self._count * 8 + net * 4)
+        return decode_deltas(self._map[offset:offset + length], start)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+# Encodes increasing cycles as LEB128 varints of the difference to the previous cycle, the first
+# one taken from start
+def encode_deltas(cycles : list, start : int) -> bytes:
+    data = bytearray()
+    previous = start
+    for cycle in cycles:
+        delta = cycle - previous
+        previous = cycle
+        while delta >= 0x80:
+            data.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return bytes(data)
+
+def decode_deltas(data : bytes, start : int) -> list:
+    cycles = []
+    cycle = start
+    delta = 0
+    shift = 0
+    for byte in data:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        cycle += delta
+        cycles.append(cycle)
+        delta = 0
+        shift = 0
+    return cycles
@@ -0,0 +1,151 @@
+"""
+Waveform recording.  A VcdRecorder is added to a LogicGateManager as a pulse hook and
+samples a selection of pins after every pulse, writing a standard Value Change Dump file
+that waveform viewers such as GTKWave can open.
+
+Only the pins whose value changed since the previous pulse are written, and pulses that
+change nothing write nothing at all.  Output goes through a buffer that is flushed to the
+file whenever it grows past buffer_size characters, so memory stays bounded no matter how
+many cycles are recorded.  The recorder keeps a reference to the pin dictionaries of the
+gates present when it was created, so gates added or replaced afterwards are not seen.
+"""
+import datetime
+
+from gates.logic_gates import GatePin, LogicGateManager, LogicGateManagerException
+
+# First printable character used in VCD identifier codes and how many there are
+_FIRST_CODE = 33
+_CODE_COUNT = 94
+
+"""
+Class that records pins of a LogicGateManager to a VCD file.  signals holds gate names,
+which record every output pin of the gate, and GatePins naming a single input or output
+pin.  It defaults to every output pin of every gate.  file is a path or an open text
+file; a file the recorder opened itself is closed by close().  Every pulse lasts period
+units of the timescale.
+"""
+class VcdRecorder:
+    def __init__(self, manager : LogicGateManager, file, signals : list = None, timescale : str = "1 ns",
+                 period : int = 1, buffer_size : int = 1 << 16) -> None:
+        self._manager = manager
+        self._period = period
+        self._buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+        self._last = None
+        self._cycle = None
+
+        self._probes = []
+        self._codes = []
+        scopes = {}
+        for gate, pin, pins in resolve_signals(manager, signals):
+            code = identifier(len(self._probes))
+            self._probes.append((pins, pin))
+            self._codes.append(code)
+            scopes.setdefault(gate, []).append((pin, code))
+
+        self._owned = isinstance(file, str)
+        self._file = open(file, 'w') if self._owned else file
+
+        header = ["$date\n", f"\t{datetime.datetime.now().isoformat(timespec='seconds')}\n", "$end\n",
+                  "$version\n", "\tdigital_logic_simulator\n", "$end\n",
+                  f"$timescale {timescale} $end\n", "$scope module circuit $end\n"]
+        for gate, pins in scopes.items():
+            header.append(f"$scope module {_reference(gate)} $end\n")
+            header.extend(f"$var wire 1 {code} {_reference(pin)} $end\n" for pin, code in pins)
+            header.append("$upscope $end\n")
+        header.append("$upscope $end\n$enddefinitions $end\n")
+        self._write(''.join(header))
+
+        manager.add_pulse_hook(self._sample)
+
+    # Pulse hook writing the pins that changed.  The first sample dumps every pin.
+    def _sample(self, manager : LogicGateManager, cycle : int) -> None:
+        self._cycle = cycle
+        current = [pins[pin] for pins, pin in self._probes]
+
+        if self._last is None:
+            lines = [f"#{cycle * self._period}\n$dumpvars\n"]
+            lines.extend(f"{value}{code}\n" for value, code in zip(current, self._codes))
+            lines.append("$end\n")
+        elif current != self._last:
+            lines = [f"#{cycle * self._period}\n"]
+            lines.extend(f"{value}{code}\n" for value, last, code in zip(current, self._last, self._codes) if value != last)
+        else:
+            return
+
+        self._last = current
+        self._write(''.join(lines))
+
+    def _write(self, text : str) -> None:
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    # Writes the buffered changes to the file
+    def flush(self) -> None:
+        self._file.write(''.join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+    # Stops recording and writes the end time of the last pulse, so viewers show its values for a
+    # whole period.  Closes the file if the recorder opened it.
+    def close(self) -> None:
+        if self._manager is None:
+            return
+        self._manager.remove_pulse_hook(self._sample)
+        self._manager = None
+
+        if self._cycle is not None:
+            self._write(f"#{(self._cycle + 1) * self._period}\n")
+        self.flush()
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+# Turns a signal selection into (gate, pin, pins) entries, pins being the dictionary the pin's
+# value is read from.  Gate names select every output pin of the gate and GatePins a single pin.
+def resolve_signals(manager : LogicGateManager, signals : list) -> list:
+    if signals is None:
+        signals = list(manager.connections)
+
+    probes = []
+    for signal in signals:
+        if isinstance(signal, GatePin):
+            gate = manager[signal.gate]
+            if gate is None:
+                raise LogicGateManagerException(f"A gate with the name {signal.gate} does not exist")
+            if signal.pin in gate.outputs.pins:
+                probes.append((signal.gate, signal.pin, gate.outputs.pins))
+            elif signal.pin in gate.inputs.pins:
+                probes.append((signal.gate, signal.pin, gate.inputs.pins))
+            else:
+                raise LogicGateManagerException(f"Gate {signal.gate} has no pin named {signal.pin}")
+        else:
+            gate = manager[signal]
+            if gate is None:
+                raise LogicGateManagerException(f"A gate with the name {signal} does not exist")
+            probes.extend((signal, pin, gate.outputs.pins) for pin in gate.outputs.pins)
+    return probes
+
+# Returns the VCD identifier code of the signal with the given index: !, ", #, ... then two characters
+def identifier(index : int) -> str:
+    code = chr(_FIRST_CODE + index % _CODE_COUNT)
+    index //= _CODE_COUNT
+    while index:
+        index -= 1
+        code += chr(_FIRST_CODE + index % _CODE_COUNT)
+        index //= _CODE_COUNT
+    return code
+
+# VCD references cannot contain whitespace
+def _reference(name : str) -> str:
+    return '_'.join(str(name).split()) or '_'
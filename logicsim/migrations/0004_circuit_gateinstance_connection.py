@@ -0,0 +1,62 @@
+# Generated by Django 4.0.3 on 2026-10-18 19:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logicsim', '0003_remove_logicgate_gate_id_logicgate_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Circuit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('engine', models.CharField(default='sweep', max_length=16)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GateInstance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=200)),
+                ('op', models.CharField(choices=[('AND', 'AND'), ('OR', 'OR'), ('XOR', 'XOR'), ('NOT', 'NOT'), ('NAND', 'NAND'), ('NOR', 'NOR'), ('XNOR', 'XNOR'), ('VCC', 'VCC'), ('GND', 'GND'), ('SWITCH', 'SWITCH')], max_length=8)),
+                ('gate_type', models.CharField(max_length=200)),
+                ('inputs', models.JSONField(default=list)),
+                ('outputs', models.JSONField(default=list)),
+                ('value', models.PositiveSmallIntegerField(default=0)),
+                ('circuit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gates', to='logicsim.circuit')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Connection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('output_pin', models.CharField(max_length=50)),
+                ('input_pin', models.CharField(max_length=50)),
+                ('circuit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connections', to='logicsim.circuit')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fanin', to='logicsim.gateinstance')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fanout', to='logicsim.gateinstance')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='gateinstance',
+            index=models.Index(fields=['circuit', 'position'], name='logicsim_ga_circuit_041f44_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='gateinstance',
+            constraint=models.UniqueConstraint(fields=('circuit', 'name'), name='unique_gate_name_per_circuit'),
+        ),
+        migrations.AddIndex(
+            model_name='connection',
+            index=models.Index(fields=['circuit', 'position'], name='logicsim_co_circuit_53f8e4_idx'),
+        ),
+    ]
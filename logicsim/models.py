@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+
+from gates import serialization
+from gates.logic_gates import LogicGateManager
 
 # Create your models here.
 
@@ -40,3 +43,111 @@ class LogicGate(models.Model):
     
 
 
+"""
+A whole circuit, stored as one row per gate (GateInstance) and one row per connection
+between two gate pins (Connection).  These map onto a LogicGateManager's gates and
+connection mapping: from_manager and store write a manager's circuit with a few bulk
+inserts inside one transaction, and to_manager reads it back with one query for the
+gates and one for the connections, however big the circuit is.
+"""
+class Circuit(models.Model):
+    name = models.CharField(max_length=200)
+    engine = models.CharField(max_length=16, default="sweep")
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    # Saves a new circuit holding the manager's gates and connections
+    @classmethod
+    def from_manager(cls, name : str, manager : LogicGateManager) -> "Circuit":
+        with transaction.atomic():
+            circuit = cls.objects.create(name=name, engine=manager.engine)
+            circuit._insert(manager)
+        return circuit
+
+    # Replaces the stored gates and connections with the manager's
+    def store(self, manager : LogicGateManager) -> None:
+        with transaction.atomic():
+            self.engine = manager.engine
+            self.save()
+            self.connections.all().delete()
+            self.gates.all().delete()
+            self._insert(manager)
+
+    # Bulk inserts the gates, then the connections between them
+    def _insert(self, manager : LogicGateManager) -> None:
+        records, connections = serialization.to_records(manager)
+        gates = GateInstance.objects.bulk_create(
+            GateInstance(circuit=self, position=position, name=record.name, op=record.op, gate_type=record.type,
+                         inputs=list(record.inputs), outputs=list(record.outputs), value=record.value)
+            for position, record in enumerate(records))
+
+        # Backends that cannot return the new keys from a bulk insert need them read back
+        if any(gate.pk is None for gate in gates):
+            keys = dict(self.gates.values_list('name', 'pk'))
+        else:
+            keys = {gate.name: gate.pk for gate in gates}
+
+        Connection.objects.bulk_create(
+            Connection(circuit=self, position=position, source_id=keys[record.source], output_pin=record.o_pin,
+                       destination_id=keys[record.gate], input_pin=record.i_pin)
+            for position, record in enumerate(connections))
+
+    # Rebuilds the stored circuit as a LogicGateManager with two queries
+    def to_manager(self, engine : str = None) -> LogicGateManager:
+        gates = list(self.gates.order_by('position').values_list('pk', 'name', 'op', 'gate_type', 'inputs', 'outputs', 'value'))
+        names = {gate[0]: gate[1] for gate in gates}
+        connections = self.connections.order_by('position').values_list('source_id', 'output_pin', 'destination_id', 'input_pin')
+
+        return serialization.from_records((gate[1:] for gate in gates),
+                                          ((names[source], o_pin, names[gate], i_pin) for source, o_pin, gate, i_pin in connections),
+                                          engine or self.engine)
+
+    def __str__(self):
+        return self.name
+
+"""
+A gate of a stored circuit.  position keeps the order the gates were added to the manager
+in, and inputs and outputs hold the names of the gate's pins.
+"""
+class GateInstance(models.Model):
+    op_choices = [(op, op) for op in ("AND", "OR", "XOR", "NOT", "NAND", "NOR", "XNOR", "VCC", "GND", "SWITCH")]
+
+    circuit = models.ForeignKey(Circuit, on_delete=models.CASCADE, related_name="gates")
+    position = models.PositiveIntegerField()
+    name = models.CharField(max_length=200)
+    op = models.CharField(max_length=8, choices=op_choices)
+    gate_type = models.CharField(max_length=200)
+    inputs = models.JSONField(default=list)
+    outputs = models.JSONField(default=list)
+    value = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['circuit', 'name'], name='unique_gate_name_per_circuit'),
+        ]
+        indexes = [
+            models.Index(fields=['circuit', 'position']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.op})"
+
+"""
+A connection from an output pin of one gate to an input pin of another, in the order it
+was added to the manager
+"""
+class Connection(models.Model):
+    circuit = models.ForeignKey(Circuit, on_delete=models.CASCADE, related_name="connections")
+    position = models.PositiveIntegerField()
+    source = models.ForeignKey(GateInstance, on_delete=models.CASCADE, related_name="fanout")
+    output_pin = models.CharField(max_length=50)
+    destination = models.ForeignKey(GateInstance, on_delete=models.CASCADE, related_name="fanin")
+    input_pin = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['circuit', 'position']),
+        ]
+
+    def __str__(self):
+        return f"{self.source_id}.{self.output_pin} -> {self.destination_id}.{self.input_pin}"
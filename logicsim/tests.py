@@ -7,7 +7,14 @@ import urllib.request
 from django.urls import reverse
 
 # Create your views here.
-from logicsim.models import LogicGate
+from django import test
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from gates import serialization
+from gates.logic_gates import ANDGate, GatePin, GND, LogicGateManager, NOTGate, Switch, VCC, XORGate
+from logicsim import views
+from logicsim.models import Circuit, LogicGate
 
 class logicsimTest(TestCase):
     def test_add_element(self):
@@ -113,3 +120,115 @@ class logicsimTest(TestCase):
         gate5.outputTable()
         gate5.delete()
 
+
+class CircuitTest(test.TestCase):
+    def create_manager(self):
+        manager = LogicGateManager(engine="levelized")
+        for gate in (Switch("SWITCH", "A", value=1), Switch("SWITCH", "B"), VCC("VCC", "VCC1"),
+                     XORGate("XOR", "XOR1"), ANDGate("AND", "AND1", inputs=['A', 'B', 'C'])):
+            manager.add_gate(gate)
+        manager.add_connection(GatePin("A", 'O'), GatePin("XOR1", 'A'))
+        manager.add_connection(GatePin("B", 'O'), GatePin("XOR1", 'B'))
+        manager.add_connection(GatePin("XOR1", 'O'), GatePin("AND1", 'A'))
+        manager.add_connection(GatePin("VCC1", 'O'), GatePin("AND1", 'B'))
+        manager.add_connection(GatePin("VCC1", 'O'), GatePin("AND1", 'C'))
+        return manager
+
+    def test_round_trip(self):
+        manager = self.create_manager()
+        circuit = Circuit.from_manager("example", manager)
+        circuit = Circuit.objects.get(pk=circuit.pk)
+
+        with self.assertNumQueries(2):
+            restored = circuit.to_manager()
+        self.assertEqual(restored.engine, "levelized")
+        self.assertEqual(list(restored.connections), list(manager.connections))
+        self.assertEqual(restored.connections, manager.connections)
+        self.assertEqual(restored["AND1"].inputs.pins, {'A': 0, 'B': 0, 'C': 0})
+        self.assertEqual(restored["A"].value, 1)
+
+        restored.step()
+        self.assertEqual(restored["AND1"].outputs.pins['O'], 1)
+
+    def test_bulk_queries(self):
+        # A chain of inverters: its rows are inserted in a few batches and loaded in a fixed number of queries
+        manager = LogicGateManager()
+        manager.add_gate(Switch("SWITCH", "IN"))
+        previous = "IN"
+        for index in range(500):
+            manager.add_gate(NOTGate("NOT", f"NOT{index}"))
+            manager.add_connection(GatePin(previous, 'O'), GatePin(f"NOT{index}", 'A'))
+            previous = f"NOT{index}"
+
+        with CaptureQueriesContext(connection) as queries:
+            circuit = Circuit.from_manager("chain", manager)
+        self.assertLess(len(queries), 20)
+        self.assertEqual(circuit.gates.count(), 501)
+        self.assertEqual(circuit.connections.count(), 500)
+
+        with self.assertNumQueries(3):
+            restored = Circuit.objects.get(pk=circuit.pk).to_manager()
+        self.assertEqual(restored.connections, manager.connections)
+
+    def test_store_replaces_circuit(self):
+        circuit = Circuit.from_manager("example", self.create_manager())
+        manager = LogicGateManager(engine="compiled")
+        manager.add_gate(GND("GND", "GND1"))
+
+        circuit.store(manager)
+
+        self.assertEqual(list(circuit.gates.values_list('name', flat=True)), ["GND1"])
+        self.assertEqual(circuit.connections.count(), 0)
+        self.assertEqual(Circuit.objects.get(pk=circuit.pk).to_manager().engine, "compiled")
+
+    def test_failed_save_is_rolled_back(self):
+        manager = self.create_manager()
+        manager.add_gate(type("Buffer", (ANDGate,), {})("AND", "BUF1"))
+
+        with self.assertRaises(serialization.SerializationException):
+            Circuit.from_manager("broken", manager)
+        self.assertFalse(Circuit.objects.exists())
+
+
+class IndexViewTest(test.TestCase):
+    def setUp(self):
+        cache.clear()
+        LogicGate.objects.bulk_create(LogicGate(gate_type="AND", image_url=f"{index}.png")
+                                      for index in range(views.INDEX_PAGE_SIZE + 5))
+        self.ids = list(LogicGate.objects.order_by('id').values_list('id', flat=True))
+
+    def test_pages(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual(len(response.context['page'].gates), views.INDEX_PAGE_SIZE)
+        after = self.ids[views.INDEX_PAGE_SIZE - 1]
+        self.assertContains(response, f"?after={after}")
+
+        response = self.client.get(reverse('index'), {'after': after})
+        self.assertEqual([gate.id for gate in response.context['page'].gates], self.ids[views.INDEX_PAGE_SIZE:])
+        self.assertIsNone(response.context['page'].next_after)
+        self.assertNotContains(response, "Next page")
+
+    def test_cached_page_skips_query(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('index'))
+
+    def test_changes_invalidate_page(self):
+        self.client.get(reverse('index'))
+        self.client.post(reverse('delete', kwargs={'id': self.ids[0]}))
+
+        response = self.client.get(reverse('index'))
+        self.assertNotContains(response, f"/delete/{self.ids[0]}\"")
+        self.assertContains(response, f"/delete/{self.ids[views.INDEX_PAGE_SIZE]}\"")
+
+    def test_conditional_get(self):
+        # The first response sets the CSRF cookie, which is part of the ETag
+        self.client.get(reverse('index'))
+        etag = self.client.get(reverse('index'))['ETag']
+        self.assertEqual(self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(reverse('add'), {'gate': "OR", 'input1': 1, 'input2': 0, 'image_url': ""})
+        response = self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
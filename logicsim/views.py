@@ -1,15 +1,93 @@
+import hashlib
+import time
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render
 from django.http import HttpResponse, HttpResponseRedirect
+from django.views.decorators.http import condition
 
 from django.urls import reverse
 
 # Create your views here.
 from logicsim.models import LogicGate
 
+# Gates shown on one page of the index, and how long a rendered page stays in the cache
+INDEX_PAGE_SIZE = 100
+INDEX_CACHE_TIMEOUT = 60 * 60
+
+# Cache key of the version of the gate table.  The cached pages and the ETags of the index include
+# it, so bumping it after every change retires all of them at once.
+INDEX_VERSION_KEY = "logicsim:index:version"
+
+# Returns the current version of the gate table.  It starts from the time so that a version lost
+# from the cache never comes back as one that pages were already cached under.
+def index_version() -> int:
+    version = cache.get(INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(INDEX_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(INDEX_VERSION_KEY)
+    return version
+
+# Called after every change to the gate table
+def invalidate_index() -> None:
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, time.time_ns(), None)
+
+"""
+One page of the index.  The gates are only fetched when the template first asks for them, which
+it does not when the page is already in the cache.  One gate more than fits is fetched to know
+whether there is a next page.
+"""
+class IndexPage:
+    def __init__(self, rows, size : int) -> None:
+        self._rows = rows
+        self._size = size
+
+    @cached_property
+    def _fetched(self) -> list:
+        return list(self._rows[:self._size + 1])
+
+    @property
+    def gates(self) -> list:
+        return self._fetched[:self._size]
+
+    # The id the next page starts after, None on the last page
+    @property
+    def next_after(self):
+        if len(self._fetched) <= self._size:
+            return None
+        return self._fetched[self._size - 1].id
+
+# Returns the id the requested page starts after, 0 for the first page
+def _index_after(request) -> int:
+    try:
+        return max(int(request.GET.get('after', 0)), 0)
+    except ValueError:
+        return 0
+
+# The ETag of an index page.  The page holds the CSRF token of the add form, so the token is part
+# of it too.
+def _index_etag(request) -> str:
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")
+    key = f"{index_version()}:{_index_after(request)}:{token}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+# Shows one page of gates.  Pages are keyed by the id of the last gate on the previous page rather
+# than an offset, so every page is a range scan of the primary key however deep it is.  The rows
+# are fetched lazily, so a cached page never touches the table.
+@condition(etag_func=_index_etag)
 def index(request):
-    logicsim = LogicGate.objects.filter()
+    after = _index_after(request)
+    rows = LogicGate.objects.only('id', 'gate_type', 'image_url').filter(id__gt=after).order_by('id')
     context = {
-        'logicsim':logicsim,
+        'page':IndexPage(rows, INDEX_PAGE_SIZE),
+        'after':after,
+        'version':index_version(),
+        'cache_timeout':INDEX_CACHE_TIMEOUT,
     }
     return render(request, 'logicsim/index.html', context=context)
 
@@ -23,6 +101,7 @@ def add(request):
     if(gate.input_a == "" or gate.input_b == ""):
         return HttpResponseRedirect(reverse('index'))
     gate.save()
+    invalidate_index()
     return HttpResponseRedirect(reverse('index'))
 
 def update(request, id):
@@ -33,6 +112,7 @@ def update(request, id):
         ob.input2 = request.POST['input2']
         ob.image_url = request.POST['image_url']
         ob.save()
+        invalidate_index()
         return HttpResponseRedirect(reverse('index'))
     else:   
         context = {
@@ -43,4 +123,5 @@ def update(request, id):
 def delete(request, id):
     ob = LogicGate.objects.get(id=id)
     ob.delete()
+    invalidate_index()
     return HttpResponseRedirect(reverse('index'))
\ No newline at end of file